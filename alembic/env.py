@@ -9,7 +9,8 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from discord_todo.config import settings
 from discord_todo.models.base import Base
 from discord_todo.models.mail import MailConnection, MailNotification  # noqa
-from discord_todo.models.task import Task  # noqa
+from discord_todo.models.outbox import OutboxMessage  # noqa
+from discord_todo.models.task import GuildTaskSequence, Task, TaskReminder  # noqa
 
 # Alembic Config オブジェクト
 config = context.config
@@ -21,8 +22,9 @@ if config.config_file_name is not None:
 # メタデータ対象の設定
 target_metadata = Base.metadata
 
-# 環境変数からデータベースURLを取得
-config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+# 環境変数からデータベースURLを取得（呼び出し側で指定済みの場合はそちらを使う）
+if not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,38 @@
+"""add mail subscription fields
+
+Revision ID: 2fcc6ced85a4
+Revises: e69e7e7e170c
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2fcc6ced85a4'
+down_revision: Union[str, None] = 'e69e7e7e170c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mailconnection', sa.Column('subscription_id', sa.String(length=255), nullable=True))
+    op.add_column('mailconnection', sa.Column('subscription_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('mailconnection', sa.Column('sync_requested_at', sa.DateTime(), nullable=True))
+    op.create_unique_constraint(op.f('uq_mailconnection_subscription_id'), 'mailconnection', ['subscription_id'])
+    op.create_index(op.f('ix_mailconnection_subscription_expires_at'), 'mailconnection', ['subscription_expires_at'], unique=False)
+    op.create_index('ix_mailconnection_sync_requested_at', 'mailconnection', ['sync_requested_at'], unique=False, postgresql_where=sa.text('sync_requested_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mailconnection_sync_requested_at', table_name='mailconnection', postgresql_where=sa.text('sync_requested_at IS NOT NULL'))
+    op.drop_index(op.f('ix_mailconnection_subscription_expires_at'), table_name='mailconnection')
+    op.drop_constraint(op.f('uq_mailconnection_subscription_id'), 'mailconnection', type_='unique')
+    op.drop_column('mailconnection', 'sync_requested_at')
+    op.drop_column('mailconnection', 'subscription_expires_at')
+    op.drop_column('mailconnection', 'subscription_id')
@@ -0,0 +1,43 @@
+"""add task list indexes
+
+Revision ID: 4c1d9a7e2b3f
+Revises: b02edeefd608
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1d9a7e2b3f'
+down_revision: Union[str, None] = 'b02edeefd608'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_task_guild_deadline', 'task', ['guild_id', 'deadline', 'id'], unique=False)
+    op.create_index('ix_task_guild_status_deadline', 'task', ['guild_id', 'status', 'deadline', 'id'], unique=False)
+    op.create_index(
+        'ix_task_pending_guild_assignee_deadline',
+        'task',
+        ['guild_id', 'assigned_to', 'deadline', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    # 複合インデックスの先頭列と重複する、または選択性の低い単一列インデックス
+    op.drop_index(op.f('ix_task_guild_id'), table_name='task')
+    op.drop_index(op.f('ix_task_status'), table_name='task')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_task_status'), 'task', ['status'], unique=False)
+    op.create_index(op.f('ix_task_guild_id'), 'task', ['guild_id'], unique=False)
+    op.drop_index('ix_task_pending_guild_assignee_deadline', table_name='task')
+    op.drop_index('ix_task_guild_status_deadline', table_name='task')
+    op.drop_index('ix_task_guild_deadline', table_name='task')
@@ -0,0 +1,41 @@
+"""add adaptive mail polling
+
+Revision ID: 710cc76f4310
+Revises: 2fcc6ced85a4
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '710cc76f4310'
+down_revision: Union[str, None] = '2fcc6ced85a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 既存の連携は次の確認ですぐにポーリングされる
+    op.add_column('mailconnection', sa.Column('next_poll_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")))
+    op.add_column('mailconnection', sa.Column('poll_interval_minutes', sa.Float(), nullable=False, server_default='30'))
+    op.add_column('mailconnection', sa.Column('empty_poll_streak', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('mailconnection', sa.Column('arrival_rate', sa.Float(), nullable=False, server_default='0'))
+    op.alter_column('mailconnection', 'next_poll_at', server_default=None)
+    op.alter_column('mailconnection', 'poll_interval_minutes', server_default=None)
+    op.alter_column('mailconnection', 'empty_poll_streak', server_default=None)
+    op.alter_column('mailconnection', 'arrival_rate', server_default=None)
+    op.create_index(op.f('ix_mailconnection_next_poll_at'), 'mailconnection', ['next_poll_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_mailconnection_next_poll_at'), table_name='mailconnection')
+    op.drop_column('mailconnection', 'arrival_rate')
+    op.drop_column('mailconnection', 'empty_poll_streak')
+    op.drop_column('mailconnection', 'poll_interval_minutes')
+    op.drop_column('mailconnection', 'next_poll_at')
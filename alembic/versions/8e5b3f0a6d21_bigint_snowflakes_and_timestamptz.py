@@ -0,0 +1,99 @@
+"""bigint snowflakes and timestamptz
+
+Revision ID: 8e5b3f0a6d21
+Revises: 4c1d9a7e2b3f
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e5b3f0a6d21'
+down_revision: Union[str, None] = '4c1d9a7e2b3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# DiscordのID（snowflake）を保存している列
+SNOWFLAKE_COLUMNS = {
+    'task': ['guild_id', 'channel_id', 'message_id', 'assigned_to'],
+    'mailconnection': ['guild_id', 'user_id'],
+    'mailnotification': ['discord_message_id'],
+}
+
+# これまで日本時間（naive）で保存していた列
+JST_COLUMNS = {
+    'task': ['deadline', 'created_at', 'updated_at'],
+    'taskreminder': ['due_at', 'sent_at', 'created_at', 'updated_at'],
+    'mailconnection': ['created_at', 'updated_at'],
+    'mailnotification': ['created_at', 'updated_at'],
+}
+
+# これまでUTC（naive）で保存していた列
+UTC_COLUMNS = {
+    'mailconnection': [
+        'token_expires_at',
+        'last_checked_at',
+        'last_received_at',
+        'subscription_expires_at',
+        'sync_requested_at',
+        'next_poll_at',
+        'retry_after',
+        'failure_notified_at',
+    ],
+    'mailnotification': ['received_at', 'notified_at'],
+}
+
+
+def _timestamp_columns():
+    for columns, tz in ((JST_COLUMNS, 'Asia/Tokyo'), (UTC_COLUMNS, 'UTC')):
+        for table, names in columns.items():
+            for name in names:
+                yield table, name, tz
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, names in SNOWFLAKE_COLUMNS.items():
+        for name in names:
+            using = f'{name}::bigint'
+            if (table, name) == ('task', 'message_id'):
+                # 旧コマンドが仮の値（数字以外）を残している場合は、一意になる負の値にする
+                using = "CASE WHEN message_id ~ '^[0-9]+$' THEN message_id::bigint ELSE -id END"
+            op.alter_column(
+                table, name,
+                existing_type=sa.String(length=255),
+                type_=sa.BigInteger(),
+                postgresql_using=using,
+            )
+
+    for table, name, tz in _timestamp_columns():
+        op.alter_column(
+            table, name,
+            existing_type=sa.DateTime(),
+            type_=sa.DateTime(timezone=True),
+            postgresql_using=f"{name} AT TIME ZONE '{tz}'",
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, name, tz in _timestamp_columns():
+        op.alter_column(
+            table, name,
+            existing_type=sa.DateTime(timezone=True),
+            type_=sa.DateTime(),
+            postgresql_using=f"{name} AT TIME ZONE '{tz}'",
+        )
+
+    for table, names in SNOWFLAKE_COLUMNS.items():
+        for name in names:
+            op.alter_column(
+                table, name,
+                existing_type=sa.BigInteger(),
+                type_=sa.String(length=255),
+                postgresql_using=f'{name}::text',
+            )
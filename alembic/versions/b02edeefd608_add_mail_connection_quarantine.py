@@ -0,0 +1,35 @@
+"""add mail connection quarantine
+
+Revision ID: b02edeefd608
+Revises: 710cc76f4310
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b02edeefd608'
+down_revision: Union[str, None] = '710cc76f4310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mailconnection', sa.Column('consecutive_failures', sa.Integer(), nullable=False, server_default='0'))
+    op.alter_column('mailconnection', 'consecutive_failures', server_default=None)
+    op.add_column('mailconnection', sa.Column('last_error_class', sa.String(length=100), nullable=True))
+    op.add_column('mailconnection', sa.Column('retry_after', sa.DateTime(), nullable=True))
+    op.add_column('mailconnection', sa.Column('failure_notified_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('mailconnection', 'failure_notified_at')
+    op.drop_column('mailconnection', 'retry_after')
+    op.drop_column('mailconnection', 'last_error_class')
+    op.drop_column('mailconnection', 'consecutive_failures')
@@ -0,0 +1,35 @@
+"""add mail digest settings
+
+Revision ID: d3f81b6c5a94
+Revises: c7a2e94d1f60
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f81b6c5a94'
+down_revision: Union[str, None] = 'c7a2e94d1f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mailconnection', sa.Column('digest_enabled', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('mailconnection', sa.Column('digest_immediate_high_importance', sa.Boolean(), nullable=False, server_default=sa.true()))
+    op.add_column('mailconnection', sa.Column('digest_immediate_senders', sa.JSON(), nullable=False, server_default='[]'))
+    op.alter_column('mailconnection', 'digest_enabled', server_default=None)
+    op.alter_column('mailconnection', 'digest_immediate_high_importance', server_default=None)
+    op.alter_column('mailconnection', 'digest_immediate_senders', server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('mailconnection', 'digest_immediate_senders')
+    op.drop_column('mailconnection', 'digest_immediate_high_importance')
+    op.drop_column('mailconnection', 'digest_enabled')
@@ -0,0 +1,59 @@
+"""add task guild seq
+
+Revision ID: e5b7c0d2a4f8
+Revises: d3f81b6c5a94
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7c0d2a4f8'
+down_revision: Union[str, None] = 'd3f81b6c5a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('guildtasksequence',
+    sa.Column('guild_id', sa.BigInteger(), nullable=False),
+    sa.Column('last_seq', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_guildtasksequence')),
+    sa.UniqueConstraint('guild_id', name=op.f('uq_guildtasksequence_guild_id'))
+    )
+
+    # 既存のタスクには作成順（ID順）に番号を振る
+    op.add_column('task', sa.Column('guild_seq', sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE task SET guild_seq = numbered.seq
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY guild_id ORDER BY id) AS seq
+            FROM task
+        ) AS numbered
+        WHERE task.id = numbered.id
+        """
+    )
+    op.alter_column('task', 'guild_seq', nullable=False)
+    op.create_unique_constraint('uq_task_guild_seq', 'task', ['guild_id', 'guild_seq'])
+    op.execute(
+        """
+        INSERT INTO guildtasksequence (guild_id, last_seq, created_at, updated_at)
+        SELECT guild_id, max(guild_seq), now(), now() FROM task GROUP BY guild_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_task_guild_seq', 'task', type_='unique')
+    op.drop_column('task', 'guild_seq')
+    op.drop_table('guildtasksequence')
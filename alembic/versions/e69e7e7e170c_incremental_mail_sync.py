@@ -0,0 +1,49 @@
+"""incremental mail sync
+
+Revision ID: e69e7e7e170c
+Revises: f52f4c49a254
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e69e7e7e170c'
+down_revision: Union[str, None] = 'f52f4c49a254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mailconnection', sa.Column('last_received_at', sa.DateTime(), nullable=True))
+
+    # メッセージIDの一意性をメールボックス単位にする
+    op.drop_constraint(op.f('uq_mailnotification_message_id'), 'mailnotification', type_='unique')
+    op.create_unique_constraint('uq_mailnotification_connection_message', 'mailnotification', ['connection_id', 'message_id'])
+    op.alter_column('mailnotification', 'discord_message_id',
+                    existing_type=sa.String(length=255),
+                    nullable=True)
+
+    # 連携解除時に通知履歴をDB側で削除する
+    op.drop_constraint(op.f('fk_mailnotification_connection_id_mailconnection'), 'mailnotification', type_='foreignkey')
+    op.create_foreign_key(op.f('fk_mailnotification_connection_id_mailconnection'), 'mailnotification', 'mailconnection', ['connection_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(op.f('fk_mailnotification_connection_id_mailconnection'), 'mailnotification', type_='foreignkey')
+    op.create_foreign_key(op.f('fk_mailnotification_connection_id_mailconnection'), 'mailnotification', 'mailconnection', ['connection_id'], ['id'])
+
+    op.execute("UPDATE mailnotification SET discord_message_id = '' WHERE discord_message_id IS NULL")
+    op.alter_column('mailnotification', 'discord_message_id',
+                    existing_type=sa.String(length=255),
+                    nullable=False)
+    op.drop_constraint('uq_mailnotification_connection_message', 'mailnotification', type_='unique')
+    op.create_unique_constraint(op.f('uq_mailnotification_message_id'), 'mailnotification', ['message_id'])
+
+    op.drop_column('mailconnection', 'last_received_at')
@@ -0,0 +1,63 @@
+"""add taskreminder table
+
+Revision ID: f52f4c49a254
+Revises: dbf0b23e247a
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f52f4c49a254'
+down_revision: Union[str, None] = 'dbf0b23e247a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('taskreminder',
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('offset_minutes', sa.Integer(), nullable=False),
+    sa.Column('due_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['task.id'], name=op.f('fk_taskreminder_task_id_task'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_taskreminder')),
+    sa.UniqueConstraint('task_id', 'offset_minutes', name='uq_taskreminder_task_offset')
+    )
+    op.create_index('ix_taskreminder_unsent_due_at', 'taskreminder', ['due_at'], unique=False, postgresql_where=sa.text('sent_at IS NULL'))
+
+    # JSON列の通知設定をバックフィル（通知済みのものは送信済みとして扱う）
+    op.execute(
+        """
+        INSERT INTO taskreminder (task_id, offset_minutes, due_at, sent_at, created_at, updated_at)
+        SELECT
+            task.id,
+            offsets.minutes,
+            date_trunc('minute', task.deadline - make_interval(mins => offsets.minutes)),
+            CASE
+                WHEN task.notified_times::jsonb @> to_jsonb(offsets.minutes)
+                THEN task.updated_at
+            END,
+            task.created_at,
+            task.updated_at
+        FROM task
+        CROSS JOIN LATERAL (
+            SELECT DISTINCT value::int AS minutes
+            FROM json_array_elements_text(task.notification_times)
+        ) AS offsets
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_taskreminder_unsent_due_at', table_name='taskreminder', postgresql_where=sa.text('sent_at IS NULL'))
+    op.drop_table('taskreminder')
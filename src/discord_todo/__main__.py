@@ -1,12 +1,35 @@
-import asyncio
+import argparse
 
 from .bot.bot import run_bot
 
 
 def main() -> None:
-    """メインエントリーポイント"""
-    asyncio.run(run_bot())
+    """メインエントリーポイント
+
+    python -m discord_todo [bot|api|all]
+    小規模な環境では all でAPIとBotを1つのプロセスにまとめ、DB接続などを共有する。
+    """
+    parser = argparse.ArgumentParser(prog="discord_todo")
+    parser.add_argument(
+        "target",
+        nargs="?",
+        choices=["bot", "api", "all"],
+        default="bot",
+        help="起動する対象（既定: bot）",
+    )
+    args = parser.parse_args()
+
+    if args.target == "bot":
+        run_bot()
+        return
+
+    from .runner import run_all, run_api
+
+    if args.target == "api":
+        run_api()
+    else:
+        run_all()
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,19 +1,24 @@
 from fastapi import APIRouter, Request, HTTPException, Depends, Query, Body
 import httpx
 import os
-from src.discord_todo.config import settings
+from ..config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from src.discord_todo.db.session import get_db
-from src.discord_todo.models.mail import MailConnection
+from ..db.notify import MAIL_CONNECTION_CHANGED, notify
+from ..db.session import get_db
+from ..models.base import utcnow
+from ..models.mail import MailConnection
+from ..utils.graph_client import GraphClient, GraphThrottledError, get_graph_client
+from ..utils.graph_subscription import ensure_subscription, push_enabled
+from ..utils.http_client import get_http_client
+from ..utils.token_manager import TokenManager, TokenRefreshError, get_token_manager, token_url
 from pydantic import BaseModel
-from datetime import datetime, timezone, timedelta
-import pytz
+from datetime import timedelta
 
 class MailCallbackRequest(BaseModel):
     code: str
-    guild_id: str
-    user_id: str
+    guild_id: int
+    user_id: int
 
 router = APIRouter()
 
@@ -21,6 +26,9 @@ router = APIRouter()
 async def mail_callback(
     body: MailCallbackRequest,
     db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_http_client),
+    token_manager: TokenManager = Depends(get_token_manager),
+    graph: GraphClient = Depends(get_graph_client),
 ):
     code = body.code
     guild_id = body.guild_id
@@ -28,39 +36,38 @@ async def mail_callback(
     if not code or not guild_id or not user_id:
         raise HTTPException(status_code=400, detail="code, guild_id, user_idは必須です")
 
-    token_url = f"https://login.microsoftonline.com/{settings.MICROSOFT_TENANT_ID}/oauth2/v2.0/token"
     data = {
         "client_id": settings.MICROSOFT_CLIENT_ID,
         "client_secret": settings.MICROSOFT_CLIENT_SECRET,
         "grant_type": "authorization_code",
         "code": code,
-        "redirect_uri": "http://localhost:8000/api/mail/callback",
+        "redirect_uri": settings.MICROSOFT_REDIRECT_URI,
         "scope": "offline_access Mail.Read User.Read",
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(token_url, data=data)
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"トークン取得失敗: {response.text}")
-        token_data = response.json()
-        access_token = token_data.get("access_token")
-        refresh_token = token_data.get("refresh_token")
-        expires_in = token_data.get("expires_in")
-        if not access_token or not refresh_token or not expires_in:
-            raise HTTPException(status_code=500, detail="トークン情報の取得に失敗しました")
-        # 有効期限を計算
-        token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-        # 有効期限をaware → naive 変換
-        if token_expires_at.tzinfo is not None:
-            token_expires_at = token_expires_at.replace(tzinfo=None)
-        # メールアドレス取得
-        headers = {"Authorization": f"Bearer {access_token}"}
-        me_resp = await client.get("https://graph.microsoft.com/v1.0/me", headers=headers)
-        if me_resp.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"メールアドレス取得失敗: {me_resp.text}")
-        me_data = me_resp.json()
-        email = me_data.get("mail") or me_data.get("userPrincipalName")
-        if not email:
-            raise HTTPException(status_code=500, detail="メールアドレスが取得できませんでした")
+    response = await client.post(token_url(), data=data)
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"トークン取得失敗: {response.text}")
+    token_data = response.json()
+    access_token = token_data.get("access_token")
+    refresh_token = token_data.get("refresh_token")
+    expires_in = token_data.get("expires_in")
+    if not access_token or not refresh_token or not expires_in:
+        raise HTTPException(status_code=500, detail="トークン情報の取得に失敗しました")
+    # 有効期限を計算
+    token_expires_at = utcnow() + timedelta(seconds=expires_in)
+    # メールアドレス取得
+    try:
+        me_resp = await graph.get(f"{settings.GRAPH_BASE_URL}/me", access_token)
+    except GraphThrottledError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))}
+        )
+    if me_resp.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"メールアドレス取得失敗: {me_resp.text}")
+    me_data = me_resp.json()
+    email = me_data.get("mail") or me_data.get("userPrincipalName")
+    if not email:
+        raise HTTPException(status_code=500, detail="メールアドレスが取得できませんでした")
     # DB保存（既存があれば更新）
     try:
         result = await db.execute(
@@ -75,6 +82,9 @@ async def mail_callback(
             connection.access_token = access_token
             connection.refresh_token = refresh_token
             connection.token_expires_at = token_expires_at
+            # 再連携したら隔離を解除し、すぐに同期させる
+            connection.clear_failures()
+            connection.next_poll_at = utcnow()
         else:
             connection = MailConnection(
                 guild_id=guild_id,
@@ -85,79 +95,51 @@ async def mail_callback(
                 token_expires_at=token_expires_at,
             )
             db.add(connection)
+        await db.flush()
+        # Botにトークンのキャッシュ破棄と初回同期を知らせる（コミット時に届く）
+        await notify(db, MAIL_CONNECTION_CHANGED, {"id": connection.id})
         await db.commit()
+        # 古いトークンのキャッシュを破棄
+        token_manager.invalidate(connection.id)
     except Exception as e:
         print(f"[ERROR] mailconnection保存時に例外発生: {e}")
         raise HTTPException(status_code=500, detail=f"mailconnection保存時に例外発生: {e}")
+    # 新着メールの変更通知を購読（失敗してもBot側の購読更新処理で再試行される）
+    if push_enabled():
+        try:
+            await ensure_subscription(connection, access_token, graph)
+            await db.commit()
+        except Exception as e:
+            print(f"[ERROR] 変更通知の購読に失敗: {e}")
     return {"message": "認証が完了し、連携情報を保存しました。Discordに戻ってください。"}
 
 @router.get("/api/mail/callback")
-async def mail_callback_get(request: Request, db: AsyncSession = Depends(get_db)):
+async def mail_callback_get(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_http_client),
+    token_manager: TokenManager = Depends(get_token_manager),
+    graph: GraphClient = Depends(get_graph_client),
+):
     code = request.query_params.get("code")
     state = request.query_params.get("state")
     if not code or not state:
         raise HTTPException(status_code=400, detail="認証コードまたはstateがありません")
     try:
         guild_id, user_id = state.split(":")
+        body = MailCallbackRequest(code=code, guild_id=guild_id, user_id=user_id)
     except Exception:
         raise HTTPException(status_code=400, detail="stateの形式が不正です")
-    body = MailCallbackRequest(code=code, guild_id=guild_id, user_id=user_id)
-    return await mail_callback(body, db)
-
-def to_jst(dt):
-    # aware/naive両対応でJSTに変換
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(pytz.timezone('Asia/Tokyo')).replace(tzinfo=None)
-
-async def ensure_valid_access_token(connection, db):
-    from src.discord_todo.config import settings
-    import httpx
-    from datetime import datetime, timedelta
-    import pytz
-    print(f"[DEBUG] トークン有効期限: {to_jst(connection.token_expires_at)}, 現在時刻: {to_jst(datetime.utcnow())}")
-    # 期限が5分未満ならリフレッシュ
-    if connection.token_expires_at - datetime.utcnow() < timedelta(minutes=5):
-        print("[DEBUG] トークン有効期限が近い/切れているためリフレッシュ処理を実行")
-        token_url = f"https://login.microsoftonline.com/{settings.MICROSOFT_TENANT_ID}/oauth2/v2.0/token"
-        data = {
-            "client_id": settings.MICROSOFT_CLIENT_ID,
-            "client_secret": settings.MICROSOFT_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": connection.refresh_token,
-            "redirect_uri": "http://localhost:8000/api/mail/callback",
-            "scope": "offline_access Mail.Read User.Read",
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data)
-            if response.status_code != 200:
-                print(f"[ERROR] トークンリフレッシュ失敗: {response.text}")
-                raise HTTPException(status_code=500, detail=f"トークンリフレッシュ失敗: {response.text}")
-            token_data = response.json()
-            access_token = token_data.get("access_token")
-            refresh_token = token_data.get("refresh_token")
-            expires_in = token_data.get("expires_in")
-            if not access_token or not refresh_token or not expires_in:
-                print("[ERROR] トークン情報の取得に失敗しました")
-                raise HTTPException(status_code=500, detail="トークン情報の取得に失敗しました")
-            connection.access_token = access_token
-            connection.refresh_token = refresh_token
-            # JSTで保存
-            token_expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
-            token_expires_at = to_jst(token_expires_at)
-            connection.token_expires_at = token_expires_at
-            await db.commit()
-            print(f"[DEBUG] トークンをリフレッシュしDBを更新しました。新しい有効期限: {token_expires_at}")
-    else:
-        print("[DEBUG] トークンはまだ有効です。リフレッシュ不要")
-    return connection.access_token
+    return await mail_callback(body, db, client, token_manager, graph)
 
 @router.get("/api/mail/list")
 async def get_mail_list(
-    guild_id: str = Query(..., description="DiscordのギルドID"),
-    user_id: str = Query(..., description="DiscordのユーザーID"),
+    guild_id: int = Query(..., description="DiscordのギルドID"),
+    user_id: int = Query(..., description="DiscordのユーザーID"),
     domain: str = Query(None, description="表示したいメールアドレスのドメイン（例: gmail.com）"),
     db: AsyncSession = Depends(get_db),
+    token_manager: TokenManager = Depends(get_token_manager),
+    graph: GraphClient = Depends(get_graph_client),
 ):
     # DBからMailConnectionを検索
     result = await db.execute(
@@ -171,15 +153,22 @@ async def get_mail_list(
         raise HTTPException(status_code=404, detail="メール連携情報が見つかりません。/mail-connectで連携してください。")
 
     # アクセストークンの有効期限をチェックし、自動リフレッシュ
-    access_token = await ensure_valid_access_token(connection, db)
-    url = "https://graph.microsoft.com/v1.0/me/messages"
-    headers = {"Authorization": f"Bearer {access_token}"}
+    try:
+        access_token = await token_manager.get_access_token(connection)
+    except TokenRefreshError as e:
+        print(f"[ERROR] {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    url = f"{settings.GRAPH_BASE_URL}/me/messages"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=f"メール取得に失敗しました: {response.text}")
-        mail_data = response.json()
+    try:
+        response = await graph.get(url, access_token)
+    except GraphThrottledError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))}
+        )
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"メール取得に失敗しました: {response.text}")
+    mail_data = response.json()
 
     # domainでフィルタ
     if domain:
@@ -0,0 +1,68 @@
+import logging
+import secrets
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db.notify import MAIL_SYNC_REQUESTED, notify
+from ..db.session import get_db
+from ..models.base import utcnow
+from ..models.mail import MailConnection
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 購読が失効・再認証待ちになったことを知らせるライフサイクル通知
+RESUBSCRIBE_EVENTS = {"reauthorizationRequired", "subscriptionRemoved"}
+
+
+@router.post("/api/mail/notifications")
+async def mail_notifications(request: Request, db: AsyncSession = Depends(get_db)):
+    """Graph変更通知の受信エンドポイント
+
+    購読作成時の検証リクエストにはvalidationTokenをそのまま返す。
+    通知を受けた連携には同期待ちの印を付け、実際の取得・投稿はBotが行う。
+    """
+    validation_token = request.query_params.get("validationToken")
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+
+    payload = await request.json()
+    subscription_ids = set()
+    resubscribe_ids = set()
+    for notification in payload.get("value", []):
+        client_state = notification.get("clientState") or ""
+        if not settings.MAIL_WEBHOOK_CLIENT_STATE or not secrets.compare_digest(
+            client_state, settings.MAIL_WEBHOOK_CLIENT_STATE
+        ):
+            logger.error(f"clientStateが一致しない通知を破棄: {notification.get('subscriptionId')}")
+            continue
+        subscription_ids.add(notification["subscriptionId"])
+        if notification.get("lifecycleEvent") in RESUBSCRIBE_EVENTS:
+            resubscribe_ids.add(notification["subscriptionId"])
+
+    now = utcnow()
+    if subscription_ids:
+        # 取りこぼし（missed）を含め、どの通知でも差分同期をかければ追いつける
+        await db.execute(
+            update(MailConnection)
+            .where(MailConnection.subscription_id.in_(subscription_ids))
+            .values(sync_requested_at=now)
+        )
+        # 印はDBに残し、Botにはすぐに取りに来るよう知らせる
+        await notify(db, MAIL_SYNC_REQUESTED, {})
+    if resubscribe_ids:
+        # 購読の期限を過去にして、Bot側の更新処理で作り直させる
+        await db.execute(
+            update(MailConnection)
+            .where(MailConnection.subscription_id.in_(resubscribe_ids))
+            .values(subscription_expires_at=now)
+        )
+    await db.commit()
+
+    # Graphには3秒以内に応答する必要がある
+    return Response(status_code=202)
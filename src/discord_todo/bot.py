@@ -22,6 +22,7 @@ class TodoBot(discord.Client):
         
         # 通知マネージャーを初期化
         self.notification_manager = NotificationManager(self)
+        self.notification_manager.start()
 
         # コマンドをグローバルに同期
         await self.tree.sync()
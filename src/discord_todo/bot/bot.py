@@ -1,13 +1,25 @@
 from typing import Optional
 
 import discord
+import httpx
 from discord import app_commands
 from discord.ext import commands
 from ..config import settings
 import logging
 import asyncio
 
+from ..db.leader import SCHEDULER_LOCK_NAME, LeaderElection
+from ..db.notify import MAIL_CONNECTION_CHANGED, MAIL_SYNC_REQUESTED, TASK_CHANGED, PgListener
 from ..tasks.notification import NotificationManager
+from ..tasks.outbox import OutboxDispatcher
+from ..tasks.task_writer import TaskWriter
+from ..utils.cache import GuildCache
+from ..utils.clients import SharedClients
+from ..utils.graph_client import GraphClient
+from ..utils.latency import LatencyTracker
+from ..utils.sharding import ShardScope
+from ..utils.task_index import TaskIndex
+from ..utils.token_manager import TokenManager
 
 # ロガーの設定
 logging.basicConfig(
@@ -16,27 +28,78 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def gateway_options(low_memory: bool) -> dict:
+    """ゲートウェイのintentとキャッシュの設定
+
+    スラッシュコマンドとチャンネルへの送信にはギルド情報だけあればよい。
+    メンバー一覧（大きなギルドでは最大のメモリ消費）とメッセージはキャッシュせず、
+    担当者は <@id> のメンションで表示する。
+    """
+    if low_memory:
+        return {
+            "intents": discord.Intents(guilds=True),
+            "member_cache_flags": discord.MemberCacheFlags.none(),
+            "chunk_guilds_at_startup": False,
+            "max_messages": None,
+        }
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    return {"intents": intents}
+
+
 class DiscordBot(commands.Bot):
     """タスク管理Bot"""
 
-    def __init__(self) -> None:
+    def __init__(self, clients: Optional[SharedClients] = None, **options) -> None:
         logger.info("Botの初期化を開始")
-        intents = discord.Intents.default()
-        intents.message_content = True
-        intents.members = True
-        
         super().__init__(
             command_prefix="!",
-            intents=intents,
             help_command=None,
+            **gateway_options(settings.DISCORD_LOW_MEMORY),
+            **options,
         )
         self.notification_manager: Optional[NotificationManager] = None
+        # Discordへの送信はアウトボックスを経由してディスパッチャーが行う
+        self.outbox: Optional[OutboxDispatcher] = None
+        # Microsoft Graph / OAuth 通信で共有するHTTPクライアント
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.token_manager: Optional[TokenManager] = None
+        # Graph APIへのリクエストはレート制限付きのクライアントを通す
+        self.graph_client: Optional[GraphClient] = None
+        # APIと同じプロセスで動かす場合は起動側から共有のクライアントを受け取る
+        self._clients = clients
+        self._owns_clients = clients is None
+        # ギルドごとのタスク一覧のキャッシュ（タスクの変更時に無効化する）
+        self.task_cache: GuildCache = GuildCache(
+            settings.TASK_CACHE_MAX_ENTRIES, settings.TASK_CACHE_TTL_SECONDS, "タスク一覧キャッシュ"
+        )
+        # タスク番号のオートコンプリート用のインデックス（ギルドごとに使う時にDBから読み込む）
+        self.task_index = TaskIndex(settings.TASK_INDEX_MAX_GUILDS, settings.TASK_INDEX_TTL_SECONDS)
+        # タスクの追加はまとめてDBに書き込む（コマンドへの応答はその前に返す）
+        self.task_writer = TaskWriter()
+        # スラッシュコマンドに応答するまでの時間（p50/p99をログに出す）
+        self.ack_latency = LatencyTracker("インタラクション応答時間")
+        # 他のプロセス（API・別のBot）での変更をLISTEN/NOTIFYで受け取る
+        self.db_listener: Optional[PgListener] = None
+        # 通知・メール同期のスケジューラーはリーダーのプロセスでだけ動かす
+        self.leader: Optional[LeaderElection] = None
+        # スケジューラーが処理するギルドの範囲（シャーディングしない場合はNone）
+        self.shard_scope: Optional[ShardScope] = None
         logger.info("Botの初期化完了")
 
     async def setup_hook(self) -> None:
         """Botの初期設定"""
         logger.info("setup_hook開始")
-        
+
+        if self._clients is None:
+            self._clients = SharedClients.create()
+        self.http_client = self._clients.http_client
+        self.token_manager = self._clients.token_manager
+        self.graph_client = self._clients.graph_client
+        self.outbox = OutboxDispatcher(self)
+
         # Cogの登録
         await self.load_extension("discord_todo.bot.cogs.task")
         logger.info("task cogを読み込みました")
@@ -47,6 +110,23 @@ class DiscordBot(commands.Bot):
         await self.load_extension("discord_todo.bot.cogs.mail_scheduler")
         logger.info("mail_scheduler cogを読み込みました")
 
+        # 通知マネージャーを初期化
+        self.notification_manager = NotificationManager(self)
+
+        self.db_listener = PgListener()
+        self.db_listener.subscribe(TASK_CHANGED, self.on_task_changed)
+        self.db_listener.subscribe(MAIL_CONNECTION_CHANGED, self.on_mail_connection_changed)
+        self.db_listener.subscribe(MAIL_SYNC_REQUESTED, self.on_mail_sync_requested)
+        self.db_listener.on_reconnect(self.on_db_listener_reconnect)
+        self.db_listener.start()
+
+        # 同じシャードを担当するレプリカの中から1つだけを選ぶ
+        lock_name = SCHEDULER_LOCK_NAME
+        if self.shard_scope:
+            lock_name = f"{lock_name}:{self.shard_scope.key}"
+        self.leader = LeaderElection(self.on_elected, self.on_demoted, lock_name)
+        self.leader.start()
+
         # スラッシュコマンドの同期（開発環境のみ）
         if settings.ENVIRONMENT == "development":
             logger.info("スラッシュコマンドの同期を開始します...")
@@ -74,9 +154,105 @@ class DiscordBot(commands.Bot):
         logger.info(f"{self.user} としてログインしました (ID: {self.user.id})")
         logger.info("------")
 
+    @property
+    def is_leader(self) -> bool:
+        return self.leader is not None and self.leader.is_leader
+
+    def mail_scheduler(self):
+        """メール同期のCog（リーダーでない場合はNone）"""
+        return self.get_cog("MailSchedulerCog") if self.is_leader else None
+
+    async def on_elected(self) -> None:
+        """リーダーになった時にスケジューラーを開始する"""
+        self.token_manager.start(self.shard_scope, self.on_token_refresh_failed)
+        self.notification_manager.start()
+        self.outbox.start()
+        scheduler = self.get_cog("MailSchedulerCog")
+        if scheduler:
+            scheduler.start_jobs()
+
+    async def on_token_refresh_failed(self, connection_id: int, error: Exception) -> None:
+        """先回り更新の失敗を同期の失敗として記録し、失敗が続く連携を隔離する"""
+        scheduler = self.get_cog("MailSchedulerCog")
+        if scheduler:
+            await scheduler.handle_sync_failure(connection_id, error)
+
+    async def on_demoted(self) -> None:
+        """リーダーを降りた時にスケジューラーを止める"""
+        scheduler = self.get_cog("MailSchedulerCog")
+        if scheduler:
+            scheduler.stop_jobs()
+        self.notification_manager.stop()
+        self.outbox.stop()
+        self.token_manager.stop()
+
+    async def on_task_changed(self, payload: dict) -> None:
+        """他のプロセスでタスクが追加・完了・削除された"""
+        self.task_cache.invalidate(payload["guild_id"])
+        await self.task_index.reload_task(payload["guild_id"], payload["guild_seq"])
+        if self.shard_scope and not self.shard_scope.owns(payload["guild_id"]):
+            return
+        if self.notification_manager:
+            await self.notification_manager.reload_task(payload["task_id"])
+
+    async def on_mail_connection_changed(self, payload: dict) -> None:
+        """APIでメール連携が作成・再認証された"""
+        if self.token_manager:
+            self.token_manager.invalidate(payload["id"])
+        scheduler = self.mail_scheduler()
+        if scheduler:
+            await scheduler.sync_now(payload["id"])
+
+    async def on_mail_sync_requested(self, payload: dict) -> None:
+        """APIがGraphの変更通知を受け、同期待ちの印を付けた"""
+        scheduler = self.mail_scheduler()
+        if scheduler:
+            await scheduler.fetch_requested_mails()
+
+    async def on_db_listener_reconnect(self) -> None:
+        """切断中に届かなかった変更に備えて、キャッシュと通知予定を取り直す"""
+        self.task_cache.clear()
+        self.task_index.clear()
+        if self.notification_manager and self.is_leader:
+            await self.notification_manager.seed()
+        await self.on_mail_sync_requested({})
+
+    async def close(self) -> None:
+        """Bot終了時の処理"""
+        if self.leader:
+            await self.leader.stop()
+        await self.task_writer.close()
+        if self.db_listener:
+            await self.db_listener.stop()
+        if self.notification_manager:
+            self.notification_manager.cog_unload()
+        await super().close()
+        if self._owns_clients and self._clients:
+            await self._clients.aclose()
+
+class ShardedDiscordBot(DiscordBot, commands.AutoShardedBot):
+    """複数のシャードでゲートウェイに接続するBot
+
+    スケジューラーは担当シャードのギルドだけを処理する。
+    """
+
+    def __init__(self, scope: ShardScope, clients: Optional[SharedClients] = None) -> None:
+        super().__init__(clients, shard_count=scope.shard_count, shard_ids=list(scope.shard_ids))
+        self.shard_scope = scope
+
+
+def create_bot(clients: Optional[SharedClients] = None) -> DiscordBot:
+    """設定に応じて通常のBotかシャーディングするBotを作成"""
+    scope = ShardScope.from_settings()
+    if scope is None:
+        return DiscordBot(clients)
+    logger.info(f"シャード {list(scope.shard_ids)} / {scope.shard_count} で起動します")
+    return ShardedDiscordBot(scope, clients)
+
+
 async def start_bot():
     """Botを起動（非同期版）"""
-    bot = DiscordBot()
+    bot = create_bot()
     try:
         async with bot:
             await bot.start(settings.DISCORD_TOKEN)
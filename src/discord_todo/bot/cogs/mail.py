@@ -1,51 +1,19 @@
-from datetime import datetime, timedelta, timezone
+import logging
 import urllib.parse
+from typing import Optional
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 from sqlalchemy import select
-import httpx
 
 from ...db.session import AsyncSessionLocal
 from ...models.mail import MailConnection
+from ...utils.date_parser import format_jst
+from ...utils.graph_subscription import delete_subscription
 from ...config import settings
 
-
-async def ensure_valid_access_token(connection: MailConnection, session) -> str:
-    """アクセストークンの有効性を確認し、必要に応じて更新する"""
-    # 期限が5分未満ならリフレッシュ
-    if connection.token_expires_at - datetime.now(timezone.utc) < timedelta(minutes=5):
-        token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
-        data = {
-            "client_id": settings.MICROSOFT_CLIENT_ID,
-            "client_secret": settings.MICROSOFT_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": connection.refresh_token,
-            "redirect_uri": "http://localhost:8000/api/mail/callback",
-            "scope": "openid profile offline_access Mail.Read User.Read",
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data)
-            if response.status_code != 200:
-                raise Exception(f"トークンリフレッシュ失敗: {response.text}")
-            
-            token_data = response.json()
-            access_token = token_data.get("access_token")
-            refresh_token = token_data.get("refresh_token")
-            expires_in = token_data.get("expires_in")
-            
-            if not access_token or not refresh_token or not expires_in:
-                raise Exception("トークン情報の取得に失敗しました")
-            
-            # トークン情報を更新
-            connection.access_token = access_token
-            connection.refresh_token = refresh_token
-            connection.token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-            await session.commit()
-    
-    return connection.access_token
+logger = logging.getLogger(__name__)
 
 
 class MailCog(commands.Cog):
@@ -59,13 +27,11 @@ class MailCog(commands.Cog):
         """Outlook認証用のURLを案内するコマンド"""
         client_id = settings.MICROSOFT_CLIENT_ID
         tenant_id = "common"
-        redirect_uri = "http://localhost:8000/api/mail/callback"
+        redirect_uri = settings.MICROSOFT_REDIRECT_URI
         scope = "openid profile offline_access Mail.Read User.Read"
         response_type = "code"
         prompt = "consent"  # 明示的な同意を要求
-        guild_id = str(interaction.guild_id)
-        user_id = str(interaction.user.id)
-        state = f"{guild_id}:{user_id}"
+        state = f"{interaction.guild_id}:{interaction.user.id}"
         params = {
             "client_id": client_id,
             "response_type": response_type,
@@ -77,7 +43,7 @@ class MailCog(commands.Cog):
             "domain_hint": "ed.ritsumei.ac.jp",
             "login_hint": f"rp0139rh@ed.ritsumei.ac.jp",  # ログインヒントを追加
         }
-        url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/authorize?{urllib.parse.urlencode(params)}"
+        url = f"{settings.MICROSOFT_LOGIN_BASE_URL}/{tenant_id}/oauth2/v2.0/authorize?{urllib.parse.urlencode(params)}"
 
         embed = discord.Embed(
             title="Outlook連携の認証",
@@ -108,8 +74,8 @@ class MailCog(commands.Cog):
         async with AsyncSessionLocal() as session:
             result = await session.execute(
                 select(MailConnection).where(
-                    MailConnection.guild_id == str(interaction.guild_id),
-                    MailConnection.user_id == str(interaction.user.id),
+                    MailConnection.guild_id == interaction.guild_id,
+                    MailConnection.user_id == interaction.user.id,
                 )
             )
             connection = result.scalar_one_or_none()
@@ -128,55 +94,137 @@ class MailCog(commands.Cog):
         embed.add_field(name="連携メールアドレス", value=connection.email, inline=True)
         embed.add_field(
             name="最終チェック日時",
-            value=connection.last_checked_at.strftime("%Y-%m-%d %H:%M")
+            value=format_jst(connection.last_checked_at)
             if connection.last_checked_at
             else "未チェック",
             inline=True,
         )
         embed.add_field(
             name="トークン有効期限",
-            value=connection.token_expires_at.strftime("%Y-%m-%d %H:%M"),
+            value=format_jst(connection.token_expires_at),
             inline=True,
         )
 
-        # トークンの有効期限が近い場合は警告
-        if connection.token_expires_at - datetime.now(timezone.utc) < timedelta(days=7):
+        embed.add_field(
+            name="ダイジェスト",
+            value=format_digest_settings(connection),
+            inline=False,
+        )
+
+        # 同期に失敗し続けて隔離されている場合
+        if connection.retry_after:
             embed.add_field(
-                name="⚠️ 警告",
-                value="トークンの有効期限が近づいています。`/mail-connect`で再認証してください。",
+                name="⚠️ メール取得エラー",
+                value=f"{connection.consecutive_failures}回続けて失敗しています"
+                f"（{connection.last_error_class}）。"
+                f"次回の再試行: {format_jst(connection.retry_after)}",
                 inline=False,
             )
 
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
+    @app_commands.command(name="mail-digest", description="メール通知のダイジェストを設定")
+    @app_commands.describe(
+        enabled="1回の同期で届いたメールを1通にまとめて通知する場合はTrue",
+        high_importance_immediate="重要度の高いメールはまとめずにすぐ通知する場合はTrue",
+        immediate_senders="まとめずにすぐ通知する送信者（カンマ区切り。@example.com でドメイン指定、- で解除）",
+    )
+    async def mail_digest(
+        self,
+        interaction: discord.Interaction,
+        enabled: bool,
+        high_importance_immediate: Optional[bool] = None,
+        immediate_senders: Optional[str] = None,
+    ) -> None:
+        """メール通知のダイジェストを設定するコマンド"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(MailConnection).where(
+                    MailConnection.guild_id == interaction.guild_id,
+                    MailConnection.user_id == interaction.user.id,
+                )
+            )
+            connection = result.scalar_one_or_none()
+
+            if not connection:
+                await interaction.response.send_message(
+                    "メール連携が設定されていません。`/mail-connect`コマンドで設定してください。",
+                    ephemeral=True,
+                )
+                return
+
+            connection.digest_enabled = enabled
+            if high_importance_immediate is not None:
+                connection.digest_immediate_high_importance = high_importance_immediate
+            if immediate_senders is not None:
+                connection.digest_immediate_senders = parse_senders(immediate_senders)
+            await session.commit()
+
+        await interaction.response.send_message(
+            f"ダイジェストの設定を更新しました。\n{format_digest_settings(connection)}",
+            ephemeral=True,
+        )
+
     @app_commands.command(name="mail-disconnect", description="メール連携を解除")
     async def mail_disconnect(self, interaction: discord.Interaction) -> None:
         """メール連携を解除するコマンド"""
+        # 購読の解除（トークンの更新を含む）は3秒を超えることがあるため先に応答する
+        await interaction.response.defer(ephemeral=True)
+
         async with AsyncSessionLocal() as session:
             result = await session.execute(
                 select(MailConnection).where(
-                    MailConnection.guild_id == str(interaction.guild_id),
-                    MailConnection.user_id == str(interaction.user.id),
+                    MailConnection.guild_id == interaction.guild_id,
+                    MailConnection.user_id == interaction.user.id,
                 )
             )
             connection = result.scalar_one_or_none()
 
             if not connection:
-                await interaction.response.send_message(
+                await interaction.followup.send(
                     "メール連携が設定されていません。",
                     ephemeral=True
                 )
                 return
 
+            # 変更通知の購読を解除（失敗しても購読は期限切れで消える）
+            if connection.subscription_id:
+                try:
+                    access_token = await self.bot.token_manager.get_access_token(connection)
+                    await delete_subscription(connection, access_token, self.bot.graph_client)
+                except Exception as e:
+                    logger.error(f"変更通知の購読解除に失敗: {e}")
+
             await session.delete(connection)
             await session.commit()
 
-        await interaction.response.send_message(
+        self.bot.token_manager.invalidate(connection.id)
+
+        await interaction.followup.send(
             "メール連携を解除しました。",
             ephemeral=True
         )
 
 
+def parse_senders(text: str) -> list[str]:
+    """カンマ区切りの送信者の指定を一覧にする（- の場合は空）"""
+    if text.strip() == "-":
+        return []
+    return [sender.strip().lower() for sender in text.split(",") if sender.strip()]
+
+
+def format_digest_settings(connection: MailConnection) -> str:
+    """ダイジェストの設定を表示用の文字列にする"""
+    if not connection.digest_enabled:
+        return "無効（メールごとに通知）"
+    lines = ["有効（同期ごとにまとめて通知）"]
+    if connection.digest_immediate_high_importance:
+        lines.append("重要度の高いメールはすぐに通知")
+    if connection.digest_immediate_senders:
+        lines.append(f"すぐに通知する送信者: {', '.join(connection.digest_immediate_senders)}")
+    return "\n".join(lines)
+
+
 async def setup(bot: commands.Bot) -> None:
     """コグのセットアップ"""
     await bot.add_cog(MailCog(bot)) 
\ No newline at end of file
@@ -1,21 +1,41 @@
-from datetime import datetime, timezone
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
 import discord
 from discord.ext import commands
 from discord import app_commands
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy import select
+from sqlalchemy import Select, Update, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from ...db.session import AsyncSessionLocal
-from ...models.mail import MailConnection
+from ...models.base import utcnow
+from ...models.mail import MailConnection, MailNotification
+from ...models.outbox import OutboxPriority
 from ...config import settings
-import httpx
-import pytz
+from ...tasks.outbox import OutgoingMessage, enqueue
+from ...utils.graph_client import GraphRequestError, GraphThrottledError
+from ...utils.date_parser import format_jst
+from ...utils.digest import DigestEntry, pack_digest
+from ...utils.graph_subscription import ensure_subscription, push_enabled
+from ...utils.poll_interval import PollState, failure_backoff_minutes, next_poll_state
+from ...utils.sharding import ShardScope
+from ...utils.token_manager import TokenRefreshError
+
+logger = logging.getLogger(__name__)
 
-def to_utc(dt):
-    """日時をUTCのタイムゾーン付きに変換"""
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+GRAPH_MESSAGES_URL = f"{settings.GRAPH_BASE_URL}/me/messages"
+MESSAGE_FIELDS = "subject,from,receivedDateTime,importance,id"
+# 差分取得で1ページあたりに取得する件数と、1回の同期で辿る最大ページ数
+MAX_PAGE_SIZE = 50
+MAX_SYNC_PAGES = 20
+# 変更通知の購読の期限を確認する間隔
+SUBSCRIPTION_CHECK_MINUTES = 30
 
 class MailSchedulerCog(commands.Cog):
     """メール取得の定期実行を管理するCog"""
@@ -23,14 +43,43 @@ class MailSchedulerCog(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.scheduler = AsyncIOScheduler()
-        # 30分ごとにメール取得を実行
+        # ポーリング時刻を迎えた連携のメール取得（間隔は連携ごとに到着率で調整）
         self.scheduler.add_job(
-            self.fetch_all_mails,
-            IntervalTrigger(minutes=30),
-            name="fetch_all_mails",
+            self.fetch_due_mails,
+            IntervalTrigger(seconds=settings.MAIL_POLL_TICK_SECONDS),
+            name="fetch_due_mails",
             replace_existing=True,
+            coalesce=True,
         )
-        self.scheduler.start()
+        if push_enabled():
+            # 変更通知を受けた連携の同期
+            self.scheduler.add_job(
+                self.fetch_requested_mails,
+                IntervalTrigger(seconds=settings.MAIL_PUSH_CHECK_SECONDS),
+                name="fetch_requested_mails",
+                replace_existing=True,
+                coalesce=True,
+            )
+            # 変更通知の購読の作成・更新
+            self.scheduler.add_job(
+                self.renew_subscriptions,
+                IntervalTrigger(minutes=SUBSCRIPTION_CHECK_MINUTES),
+                name="renew_subscriptions",
+                replace_existing=True,
+            )
+        # ジョブはリーダーのプロセスでだけ動かす（start_jobs / stop_jobs）
+        self.scheduler.start(paused=True)
+
+    def start_jobs(self) -> None:
+        """定期ジョブを開始する（リーダーになった時）"""
+        # 停止中に過ぎた分を待たずに、まず1回ずつ実行する
+        for job in self.scheduler.get_jobs():
+            job.modify(next_run_time=datetime.now())
+        self.scheduler.resume()
+
+    def stop_jobs(self) -> None:
+        """定期ジョブを止める（リーダーを降りた時。実行中の処理は最後まで行う）"""
+        self.scheduler.pause()
 
     @app_commands.command(name="mail-test", description="メール取得のテストを実行します")
     @app_commands.describe(
@@ -51,8 +100,8 @@ class MailSchedulerCog(commands.Cog):
                 # ユーザーの連携情報を取得
                 result = await session.execute(
                     select(MailConnection).where(
-                        MailConnection.guild_id == str(interaction.guild_id),
-                        MailConnection.user_id == str(interaction.user.id),
+                        MailConnection.guild_id == interaction.guild_id,
+                        MailConnection.user_id == interaction.user.id,
                     )
                 )
                 connection = result.scalar_one_or_none()
@@ -100,28 +149,153 @@ class MailSchedulerCog(commands.Cog):
                 ephemeral=True
             )
 
-    async def fetch_all_mails(self):
-        """全ユーザーのメールを取得"""
+    async def fetch_due_mails(self):
+        """ポーリング時刻を迎えた連携のメールを取得"""
+        await self.run_sync_pass(
+            iter_due_connection_ids(
+                utcnow(), settings.MAIL_SYNC_CHUNK_SIZE, self.bot.shard_scope
+            ),
+            "定期",
+        )
+
+    async def fetch_requested_mails(self):
+        """変更通知を受けた連携のメールを取得"""
+        await self.run_sync_pass(
+            claim_requested_connection_ids(self.bot.shard_scope), "変更通知"
+        )
+
+    async def sync_now(self, connection_id: int):
+        """連携のメールをすぐに取得する（再連携の通知を受けた時）"""
+        async def one_chunk():
+            yield [connection_id]
+
+        await self.run_sync_pass(one_chunk(), "即時")
+
+    async def renew_subscriptions(self):
+        """期限が近い、または未作成の変更通知の購読を作成・更新する"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                subscriptions_due_query(utcnow(), self.bot.shard_scope)
+            )
+            connection_ids = list(result.scalars().all())
+
+        for connection_id in connection_ids:
+            try:
+                async with AsyncSessionLocal() as session:
+                    connection = await session.get(MailConnection, connection_id)
+                    if not connection:
+                        continue
+                    access_token = await self.bot.token_manager.get_access_token(connection)
+                    await ensure_subscription(connection, access_token, self.bot.graph_client)
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"連携 {connection_id} の変更通知の購読に失敗: {e}")
+
+    async def run_sync_pass(self, id_chunks: AsyncIterator[list[int]], label: str):
+        """連携ごとに独立したセッションで並行してメールを取得する"""
+        started = time.perf_counter()
+        stats: Counter[str] = Counter()
+        semaphore = asyncio.Semaphore(max(1, settings.MAIL_SYNC_CONCURRENCY))
+        running: set[asyncio.Task] = set()
         try:
-            async with AsyncSessionLocal() as session:
-                # 有効な連携を全て取得
-                current_time = to_utc(datetime.now())
-                result = await session.execute(
-                    select(MailConnection).where(
-                        MailConnection.token_expires_at > current_time
+            async for connection_ids in id_chunks:
+                for connection_id in connection_ids:
+                    # 同時実行数の上限に達していたら空きが出るまで待つ
+                    await semaphore.acquire()
+                    task = asyncio.create_task(
+                        self.sync_connection(connection_id, semaphore, stats)
                     )
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+        except Exception as e:
+            logger.error(f"メール{label}取得処理でエラー発生: {e}")
+        finally:
+            # 個別の同期は例外を外に出さないので、ここでは完了を待つだけ
+            if running:
+                await asyncio.gather(*running)
+            elapsed = time.perf_counter() - started
+            if stats:
+                graph_stats = self.bot.graph_client.stats()
+                logger.info(
+                    f"メール{label}取得完了: {elapsed:.2f}秒 "
+                    f"(連携 {sum(stats.values())}件, 成功 {stats['ok']}件, "
+                    f"失敗 {stats['error']}件, タイムアウト {stats['timeout']}件, "
+                    f"スロットリング {stats['throttled']}件, "
+                    f"同時実行数 {settings.MAIL_SYNC_CONCURRENCY}) "
+                    f"Graph累計: 429/503 {graph_stats['throttled']}回, "
+                    f"再試行 {graph_stats['retries']}回, 待機中 {graph_stats['queue_depth']}件"
                 )
-                connections = result.scalars().all()
 
-                for connection in connections:
-                    try:
-                        await self.fetch_user_mails(connection, session)
-                    except Exception as e:
-                        print(f"[ERROR] ユーザー {connection.user_id} のメール取得に失敗: {e}")
-                        continue
+    async def sync_connection(
+        self, connection_id: int, semaphore: asyncio.Semaphore, stats: Counter
+    ) -> None:
+        """連携1件分の同期（短命なセッションとタイムアウト付き）"""
+        try:
+            async with AsyncSessionLocal() as session:
+                connection = await session.get(MailConnection, connection_id)
+                if not connection:
+                    return
+                await asyncio.wait_for(
+                    self.fetch_user_mails(connection, session),
+                    timeout=settings.MAIL_SYNC_TIMEOUT_SECONDS,
+                )
+            stats["ok"] += 1
+        except asyncio.TimeoutError as e:
+            stats["timeout"] += 1
+            logger.error(f"連携 {connection_id} のメール取得がタイムアウトしました")
+            await self.handle_sync_failure(connection_id, e)
+        except GraphThrottledError as e:
+            # Retry-Afterが長い連携はその場で待たず、指定の時間だけ先送りする
+            stats["throttled"] += 1
+            logger.info(f"連携 {connection_id} はスロットリング中: {e}")
+            await postpone_poll(connection_id, e.retry_after / 60)
+        except Exception as e:
+            stats["error"] += 1
+            logger.error(f"連携 {connection_id} のメール取得に失敗: {e}")
+            await self.handle_sync_failure(connection_id, e)
+        finally:
+            semaphore.release()
 
+    async def handle_sync_failure(self, connection_id: int, error: Exception) -> None:
+        """失敗を記録して連携を隔離し、続けて失敗した場合は1度だけユーザーに知らせる"""
+        target = await record_sync_failure(connection_id, error)
+        if target is None:
+            return
+        guild_id, user_id, notified_at = target
+        channel_id = self.mail_channel_id(guild_id)
+        if channel_id is None:
+            logger.error(f"連携 {connection_id} の停止を通知できません: {guild_id}")
+            return
+        if isinstance(error, TokenRefreshError):
+            message = (
+                f"<@{user_id}>さん、メール連携の認証が切れたため、メール通知を停止しています。"
+                "`/mail-connect`で再連携してください。"
+            )
+        else:
+            message = (
+                f"<@{user_id}>さん、メールの取得でエラーが続いているため、"
+                "メール通知を一時的に停止しています。時間をおいて自動で再試行します。"
+            )
+        try:
+            async with AsyncSessionLocal() as session:
+                await enqueue(session, [OutgoingMessage(
+                    guild_id=guild_id,
+                    channel_id=channel_id,
+                    priority=OutboxPriority.MAIL,
+                    idempotency_key=f"mail-paused:{connection_id}:{notified_at.timestamp():.0f}",
+                    content=message,
+                )])
+                await session.commit()
+            self.bot.outbox.wake()
         except Exception as e:
-            print(f"[ERROR] メール一括取得処理でエラー発生: {e}")
+            logger.error(f"連携 {connection_id} の停止の通知に失敗: {e}")
+
+    def mail_channel_id(self, guild_id: int) -> Optional[int]:
+        """メール通知を送るチャンネル（ギルドのシステムチャンネル）"""
+        guild = self.bot.get_guild(guild_id)
+        if not guild or not guild.system_channel:
+            return None
+        return guild.system_channel.id
 
     async def fetch_user_mails(
         self,
@@ -130,86 +304,382 @@ class MailSchedulerCog(commands.Cog):
         limit: int = 10,
         skip_notification: bool = False
     ):
-        """個別ユーザーのメール取得処理"""
-        from ..cogs.mail import ensure_valid_access_token
-
+        """個別ユーザーのメール取得処理（前回の取得位置以降の新着メールのみ）"""
         try:
-            # トークンの有効性確認と更新
-            access_token = await ensure_valid_access_token(connection, session)
-            
-            # Microsoft Graph APIでメール取得
-            url = "https://graph.microsoft.com/v1.0/me/messages"
-            headers = {"Authorization": f"Bearer {access_token}"}
+            # 有効なトークンを取得（通常はキャッシュ済み）
+            access_token = await self.bot.token_manager.get_access_token(connection)
+
+            mails = await self.fetch_new_messages(connection, access_token, limit)
+            logger.debug(f"取得したメール数: {len(mails)}")
+            if skip_notification:
+                # 取得のみの場合は取得位置を進めない
+                return mails
+
+            # 未通知のメールだけを記録し、同じトランザクションで通知をアウトボックスに登録する
+            new_mails = await record_seen_mails(session, connection, mails)
+            if new_mails:
+                channel_id = self.mail_channel_id(connection.guild_id)
+                if channel_id is None:
+                    logger.error(f"System channel not found in guild: {connection.guild_id}")
+                else:
+                    await enqueue(session, build_mail_messages(connection, channel_id, new_mails))
+            if mails:
+                connection.last_received_at = max(parse_received_at(mail) for mail in mails)
+            # 次のポーリング時刻と最終チェック時刻を更新
+            now = utcnow()
+            schedule_next_poll(connection, len(new_mails), now)
+            connection.last_checked_at = now
+            if connection.consecutive_failures:
+                connection.clear_failures()
+            await session.commit()
+
+            if new_mails:
+                self.bot.outbox.wake()
+            return new_mails
+
+        except Exception as e:
+            logger.error(f"メール取得処理でエラー発生: {e}")
+            raise
+
+    async def fetch_new_messages(
+        self, connection: MailConnection, access_token: str, limit: int
+    ) -> list[dict]:
+        """前回の取得位置以降のメールをGraph APIから受信日時順に取得する"""
+        if connection.last_received_at is None:
+            # 初回は最新のメールだけを取得し、そこを取得位置にする
+            first_sync = True
             params = {
                 "$top": min(50, limit),  # 最大50件まで
                 "$orderby": "receivedDateTime desc",
-                "$select": "subject,from,receivedDateTime,id"
+                "$select": MESSAGE_FIELDS,
+            }
+        else:
+            # 同時刻のメールを取りこぼさないよう ge で取得し、重複は記録時に除外する
+            first_sync = False
+            since = connection.last_received_at.astimezone(timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+            params = {
+                "$top": MAX_PAGE_SIZE,
+                "$orderby": "receivedDateTime asc",
+                "$filter": f"receivedDateTime ge {since}",
+                "$select": MESSAGE_FIELDS,
             }
 
-            print(f"[DEBUG] メール取得APIを呼び出し: {url}")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, params=params)
-                print(f"[DEBUG] API応答ステータス: {response.status_code}")
-                
-                if response.status_code != 200:
-                    print(f"[ERROR] メール取得APIでエラー: {response.text}")
-                    return []
+        mails: list[dict] = []
+        url = GRAPH_MESSAGES_URL
+        for _ in range(MAX_SYNC_PAGES):
+            # スロットリング時の待機・再試行はGraphクライアントが行う
+            response = await self.bot.graph_client.get(url, access_token, params=params)
+            if response.status_code != 200:
+                # 同期の失敗として扱い、取得位置・最終チェック時刻は進めない
+                raise GraphRequestError(response.status_code, response.text)
 
-                mails = response.json().get("value", [])
-                print(f"[DEBUG] 取得したメール数: {len(mails)}")
-                
-                if not skip_notification:
-                    # 取得したメールをDiscordに通知
-                    guild = self.bot.get_guild(int(connection.guild_id))
-                    if not guild:
-                        print(f"[ERROR] Guild not found: {connection.guild_id}")
-                        return mails
-
-                    for mail in mails:
-                        await self.notify_mail(guild, connection, mail)
-
-            # 最終チェック時刻を更新
-            connection.last_checked_at = to_utc(datetime.now())
-            await session.commit()
+            data = response.json()
+            mails.extend(data.get("value", []))
+            # 次ページのURLにはクエリパラメータが含まれている
+            url = data.get("@odata.nextLink")
+            params = None
+            if first_sync or not url:
+                break
 
-            return mails
+        return mails
 
-        except Exception as e:
-            print(f"[ERROR] メール取得処理でエラー発生: {e}")
-            raise
 
-    async def notify_mail(self, guild: discord.Guild, connection: MailConnection, mail: dict):
-        """メールをDiscordに通知"""
-        try:
-            # システムチャンネルに通知
-            channel = guild.system_channel
-            if not channel:
-                print(f"[ERROR] System channel not found in guild: {guild.id}")
-                return
-
-            # Embedの作成
-            embed = discord.Embed(
-                title=mail["subject"],
-                color=discord.Color.blue(),
-                timestamp=datetime.fromisoformat(mail["receivedDateTime"].replace("Z", "+00:00"))
+async def iter_due_connection_ids(
+    now: datetime, chunk_size: int, scope: Optional[ShardScope] = None
+) -> AsyncIterator[list[int]]:
+    """ポーリング時刻を迎えた連携のIDを主キー順に一定件数ずつ読み込む
+
+    アクセストークンの期限切れはトークンマネージャーが更新するので、ここでは除外しない。
+    """
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                due_connections_query(now, last_id, scope).limit(chunk_size)
             )
-            
-            sender = mail["from"]["emailAddress"]
-            embed.add_field(
-                name="送信者",
-                value=f"{sender.get('name', 'Unknown')} ({sender.get('address', 'No address')})",
-                inline=False
+            connection_ids = list(result.scalars().all())
+        if not connection_ids:
+            return
+        yield connection_ids
+        last_id = connection_ids[-1]
+
+
+def due_connections_query(
+    now: datetime, after_id: int = 0, scope: Optional[ShardScope] = None
+) -> Select:
+    """ポーリング時刻を迎えた連携のIDを取得するクエリ（隔離中の連携は除く）"""
+    query = (
+        select(MailConnection.id)
+        .where(
+            MailConnection.next_poll_at <= now,
+            MailConnection.available_at(now),
+            MailConnection.id > after_id,
+        )
+        .order_by(MailConnection.id)
+    )
+    if scope:
+        query = query.where(scope.clause(MailConnection.guild_id))
+    return query
+
+
+def schedule_next_poll(connection: MailConnection, new_mail_count: int, now: datetime) -> None:
+    """取得結果から次のポーリング時刻を決める（コミットは呼び出し側で行う）"""
+    elapsed_minutes = (
+        (now - connection.last_checked_at).total_seconds() / 60
+        if connection.last_checked_at
+        else connection.poll_interval_minutes
+    )
+    # 変更通知で新着が届く連携は、取りこぼし確認の間隔までポーリングを減らせる
+    max_minutes = (
+        settings.MAIL_RECONCILE_INTERVAL_MINUTES
+        if push_enabled() and connection.subscription_id
+        else settings.MAIL_POLL_MAX_MINUTES
+    )
+    state = next_poll_state(
+        PollState(
+            connection.poll_interval_minutes,
+            connection.empty_poll_streak,
+            connection.arrival_rate,
+        ),
+        new_mail_count,
+        elapsed_minutes,
+        settings.MAIL_POLL_MIN_MINUTES,
+        max_minutes,
+    )
+    connection.poll_interval_minutes = state.interval_minutes
+    connection.empty_poll_streak = state.empty_streak
+    connection.arrival_rate = state.arrival_rate
+    connection.next_poll_at = now + timedelta(minutes=state.interval_minutes)
+
+
+async def postpone_poll(connection_id: int, minutes: float) -> None:
+    """スロットリングされた連携を、失敗として数えずに指定の時間だけ先送りする"""
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(MailConnection)
+                .where(MailConnection.id == connection_id)
+                .values(next_poll_at=utcnow() + timedelta(minutes=minutes))
             )
+            await session.commit()
+    except Exception as e:
+        logger.error(f"連携 {connection_id} のポーリング時刻の更新に失敗: {e}")
+
 
-            print(f"[DEBUG] 通知を送信: {mail['subject']}")
-            # 通知を送信
-            await channel.send(
-                f"<@{connection.user_id}>さん宛のメールが届きました：",
-                embed=embed
+async def record_sync_failure(
+    connection_id: int, error: Exception
+) -> tuple[int, int, datetime] | None:
+    """同期の失敗を記録し、連続失敗回数に応じた時刻まで連携を隔離する
+
+    ユーザーに知らせるべき場合（初めて閾値に達した時）だけ(guild_id, user_id, 記録日時)を返す。
+    """
+    now = utcnow()
+    try:
+        async with AsyncSessionLocal() as session:
+            connection = await session.get(MailConnection, connection_id, with_for_update=True)
+            if connection is None:
+                return None
+            connection.consecutive_failures += 1
+            connection.last_error_class = type(error).__name__[:100]
+            connection.retry_after = now + timedelta(
+                minutes=failure_backoff_minutes(
+                    connection.consecutive_failures,
+                    settings.MAIL_FAILURE_BACKOFF_BASE_MINUTES,
+                    settings.MAIL_FAILURE_BACKOFF_MAX_MINUTES,
+                )
             )
+            connection.next_poll_at = connection.retry_after
+            should_notify = (
+                connection.consecutive_failures >= settings.MAIL_FAILURE_NOTIFY_THRESHOLD
+                and connection.failure_notified_at is None
+            )
+            if should_notify:
+                connection.failure_notified_at = now
+            await session.commit()
+    except Exception as e:
+        logger.error(f"連携 {connection_id} の失敗の記録に失敗: {e}")
+        return None
+
+    logger.info(
+        f"連携 {connection_id} を{connection.retry_after:%Y-%m-%d %H:%M}まで隔離 "
+        f"(連続失敗 {connection.consecutive_failures}回, {connection.last_error_class})"
+    )
+    if should_notify:
+        return connection.guild_id, connection.user_id, now
+    return None
+
+
+async def claim_requested_connection_ids(
+    scope: Optional[ShardScope] = None,
+) -> AsyncIterator[list[int]]:
+    """同期待ちの印が付いた連携を取り出す（印は1回のUPDATEでまとめて外す）
+
+    隔離中の連携の印は残し、隔離が明けてから同期する。
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(claim_requested_query(utcnow(), scope))
+        connection_ids = list(result.scalars().all())
+        await session.commit()
+    if connection_ids:
+        yield connection_ids
+
+
+def claim_requested_query(now: datetime, scope: Optional[ShardScope] = None) -> Update:
+    """同期待ちの印を外し、その連携のIDを返すUPDATE"""
+    query = (
+        update(MailConnection)
+        .where(
+            MailConnection.sync_requested_at.is_not(None),
+            MailConnection.available_at(now),
+        )
+        .values(sync_requested_at=None)
+        .returning(MailConnection.id)
+    )
+    if scope:
+        query = query.where(scope.clause(MailConnection.guild_id))
+    return query
+
+
+def subscriptions_due_query(now: datetime, scope: Optional[ShardScope] = None) -> Select:
+    """変更通知の購読が未作成、または期限が近い連携のIDを取得するクエリ"""
+    threshold = now + timedelta(minutes=settings.MAIL_SUBSCRIPTION_RENEW_AHEAD_MINUTES)
+    query = select(MailConnection.id).where(
+        or_(
+            MailConnection.subscription_id.is_(None),
+            MailConnection.subscription_expires_at < threshold,
+        ),
+        MailConnection.available_at(now),
+    )
+    if scope:
+        query = query.where(scope.clause(MailConnection.guild_id))
+    return query
+
+
+def parse_received_at(mail: dict) -> datetime:
+    """GraphのreceivedDateTimeをタイムゾーン付きのdatetimeに変換"""
+    return datetime.fromisoformat(mail["receivedDateTime"].replace("Z", "+00:00"))
+
+
+def build_mail_messages(
+    connection: MailConnection, channel_id: int, mails: list[dict]
+) -> list[OutgoingMessage]:
+    """新着メールの通知を作る（ダイジェストが有効なら、すぐに送るもの以外を1通にまとめる）"""
+    if not connection.digest_enabled:
+        return [build_mail_message(connection, channel_id, mail) for mail in mails]
+
+    immediate = [mail for mail in mails if is_immediate_mail(connection, mail)]
+    digested = [mail for mail in mails if not is_immediate_mail(connection, mail)]
+    messages = [build_mail_message(connection, channel_id, mail) for mail in immediate]
+    if len(digested) == 1:
+        messages.append(build_mail_message(connection, channel_id, digested[0]))
+    elif digested:
+        messages.extend(build_mail_digest(connection, channel_id, digested))
+    return messages
+
+
+def is_immediate_mail(connection: MailConnection, mail: dict) -> bool:
+    """ダイジェストにまとめず、すぐに通知するメールか"""
+    if connection.digest_immediate_high_importance and mail.get("importance") == "high":
+        return True
+    address = (mail.get("from", {}).get("emailAddress", {}).get("address") or "").lower()
+    for sender in connection.digest_immediate_senders:
+        sender = sender.lower()
+        if address == sender or (sender.startswith("@") and address.endswith(sender)):
+            return True
+    return False
+
+
+def build_mail_digest(
+    connection: MailConnection, channel_id: int, mails: list[dict]
+) -> list[OutgoingMessage]:
+    """1回の同期で届いたメールを、送信者と件名の一覧にまとめる"""
+    entries = []
+    for mail in sorted(mails, key=parse_received_at):
+        sender = mail.get("from", {}).get("emailAddress", {})
+        entries.append(DigestEntry(
+            name=mail.get("subject") or "（件名なし）",
+            value=f"{sender.get('name', 'Unknown')} <{sender.get('address', '')}>"
+            f" ・ {format_jst(parse_received_at(mail))}",
+        ))
+    pages = pack_digest(
+        f"新着メール（{len(mails)}件）",
+        entries,
+        color=discord.Color.blue(),
+        header=f"<@{connection.user_id}>さん宛のメールが{len(mails)}件届きました：",
+    )
+    ids = ",".join(sorted(mail["id"] for mail in mails))
+    digest = hashlib.sha256(ids.encode()).hexdigest()[:32]
+    return [
+        OutgoingMessage(
+            guild_id=connection.guild_id,
+            channel_id=channel_id,
+            priority=OutboxPriority.MAIL,
+            idempotency_key=f"mail-digest:{connection.id}:{digest}:{number}",
+            content=page.content,
+            embeds=page.embeds,
+        )
+        for number, page in enumerate(pages)
+    ]
+
+
+def build_mail_message(connection: MailConnection, channel_id: int, mail: dict) -> OutgoingMessage:
+    """新着メールの通知をアウトボックスに登録する形にする"""
+    embed = discord.Embed(
+        title=mail["subject"],
+        color=discord.Color.blue(),
+        timestamp=parse_received_at(mail),
+    )
+    sender = mail["from"]["emailAddress"]
+    embed.add_field(
+        name="送信者",
+        value=f"{sender.get('name', 'Unknown')} ({sender.get('address', 'No address')})",
+        inline=False
+    )
+    # GraphのメッセージIDは長いため、ハッシュにしてキーに使う
+    digest = hashlib.sha256(mail["id"].encode()).hexdigest()[:32]
+    return OutgoingMessage(
+        guild_id=connection.guild_id,
+        channel_id=channel_id,
+        priority=OutboxPriority.MAIL,
+        idempotency_key=f"mail:{connection.id}:{digest}",
+        content=f"<@{connection.user_id}>さん宛のメールが届きました：",
+        embeds=[embed],
+    )
+
+
+async def record_seen_mails(session, connection: MailConnection, mails: list[dict]) -> list[dict]:
+    """取得したメールを通知履歴に一括登録し、初めて見たメールだけを返す"""
+    if not mails:
+        return []
+
+    rows = {}
+    for mail in mails:
+        sender = mail.get("from", {}).get("emailAddress", {})
+        rows[mail["id"]] = {
+            "connection_id": connection.id,
+            "message_id": mail["id"],
+            "subject": (mail.get("subject") or "")[:255],
+            "sender": (sender.get("address") or "")[:255],
+            "received_at": parse_received_at(mail),
+        }
+
+    result = await session.execute(
+        insert(MailNotification)
+        .values(list(rows.values()))
+        .on_conflict_do_nothing(index_elements=["connection_id", "message_id"])
+        .returning(MailNotification.message_id)
+    )
+    inserted = set(result.scalars().all())
+    new_mails = []
+    for mail in mails:
+        # ページ境界で同じメールが重複して返ることがあるため1件だけ残す
+        if mail["id"] in inserted:
+            inserted.discard(mail["id"])
+            new_mails.append(mail)
+    return new_mails
 
-        except Exception as e:
-            print(f"[ERROR] Discord通知でエラー発生: {e}")
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(MailSchedulerCog(bot)) 
\ No newline at end of file
@@ -1,15 +1,59 @@
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Sequence
 
 import discord
 from discord import app_commands
 from discord.ext import commands
-from sqlalchemy import select
+from sqlalchemy import Select, literal, select, tuple_
 
+from ...db.notify import TASK_CHANGED, notify
 from ...db.session import AsyncSessionLocal
-from ...models.task import ImportanceLevel, Task, TaskStatus
+from ...models.base import utcnow
+from ...models.task import ImportanceLevel, Task, TaskReminder, TaskStatus
+from ...utils.cache import GuildCache
+from ...utils.date_parser import format_jst, parse_datetime
+from ...utils.task_index import IndexedTask
 from ...config import settings
 
+# 1ページに表示するタスク数（1メッセージのEmbedは合計6000文字まで）
+TASK_PAGE_SIZE = 5
+# 一覧で表示する詳細の最大文字数
+SUMMARY_PREVIEW_LENGTH = 300
+# ページ送りボタンの有効時間（秒）
+TASK_LIST_TIMEOUT_SECONDS = 300
+
+TaskCursor = tuple[datetime, int]
+
+
+@dataclass(frozen=True)
+class TaskSummary:
+    """一覧表示に使うタスクの射影（セッションから切り離してキャッシュできる）"""
+
+    id: int
+    short_id: str
+    title: str
+    summary: Optional[str]
+    assigned_to: int
+    importance: ImportanceLevel
+    status: TaskStatus
+    created_at: datetime
+    deadline: datetime
+
+    @classmethod
+    def from_task(cls, task: Task) -> "TaskSummary":
+        return cls(
+            id=task.id,
+            short_id=task.short_id,
+            title=task.title,
+            summary=task.summary,
+            assigned_to=task.assigned_to,
+            importance=task.importance,
+            status=task.status,
+            created_at=task.created_at,
+            deadline=task.deadline,
+        )
+
 
 class TaskCog(commands.Cog):
     """タスク管理コグ"""
@@ -38,7 +82,8 @@ class TaskCog(commands.Cog):
     ) -> None:
         """新しいタスクを追加するコマンド"""
         try:
-            deadline_dt = datetime.strptime(deadline, "%Y-%m-%d %H:%M")
+            # 締切は日本時間として解釈する
+            deadline_dt = parse_datetime(deadline)
         except ValueError:
             await interaction.response.send_message(
                 "締め切りの形式が正しくありません。YYYY-MM-DD HH:MM形式で入力してください。",
@@ -73,21 +118,20 @@ class TaskCog(commands.Cog):
                 )
                 return
 
-        async with AsyncSessionLocal() as session:
-            task = Task(
-                guild_id=str(interaction.guild_id),
-                channel_id=str(interaction.channel_id),
-                message_id=str(interaction.id),
-                title=title,
-                assigned_to=str(assigned_to.id),
-                deadline=deadline_dt,
-                importance=importance,
-                summary=summary,
-                notification_times=notification_minutes,
-            )
-            session.add(task)
-            await session.commit()
+        task = Task(
+            guild_id=interaction.guild_id,
+            channel_id=interaction.channel_id,
+            message_id=interaction.id,
+            title=title,
+            assigned_to=assigned_to.id,
+            deadline=deadline_dt,
+            importance=importance,
+            summary=summary,
+            notification_times=notification_minutes,
+            reminders=TaskReminder.for_task(deadline_dt, notification_minutes),
+        )
 
+        # 入力は検証済みなので先に応答し、保存はその後で行う（DBの遅延で3秒の期限を過ぎないように）
         embed = discord.Embed(
             title="新しいタスク",
             description=title,
@@ -102,6 +146,30 @@ class TaskCog(commands.Cog):
             embed.add_field(name="通知設定", value=notification_str, inline=False)
 
         await interaction.response.send_message(embed=embed)
+        self.bot.ack_latency.record(interaction)
+
+        try:
+            await self.bot.task_writer.add(task)
+        except Exception as e:
+            print(f"[ERROR] タスクの保存に失敗: {e}")
+            # 保存されなかったタスクの告知をチャンネルに残さない
+            await reply_error(
+                interaction, f"タスク「{title}」を保存できませんでした。もう一度追加してください。"
+            )
+            return
+
+        # 採番されたタスク番号を表示に加える
+        embed.insert_field_at(0, name="ID", value=task.short_id, inline=True)
+        try:
+            await interaction.edit_original_response(embed=embed)
+        except discord.HTTPException as e:
+            print(f"[ERROR] タスク番号の表示に失敗: {e}")
+
+        # 通知予定に登録
+        self.bot.task_cache.invalidate(task.guild_id)
+        self.bot.task_index.upsert(task)
+        if self.bot.notification_manager:
+            self.bot.notification_manager.schedule_task(task)
 
     @app_commands.command(name="task-list", description="タスク一覧を表示")
     @app_commands.describe(
@@ -114,101 +182,72 @@ class TaskCog(commands.Cog):
         status: Optional[TaskStatus] = None,
         assigned_to: Optional[discord.Member] = None,
     ) -> None:
-        """タスク一覧を表示するコマンド"""
-        async with AsyncSessionLocal() as session:
-            query = select(Task).where(Task.guild_id == str(interaction.guild_id))
-
-            if status:
-                query = query.where(Task.status == status)
-            if assigned_to:
-                query = query.where(Task.assigned_to == str(assigned_to.id))
-
-            result = await session.execute(query)
-            tasks = result.scalars().all()
-
+        """タスク一覧を締切順に1ページずつ表示するコマンド"""
+        view = TaskListView(
+            cache=self.bot.task_cache,
+            owner_id=interaction.user.id,
+            guild_id=interaction.guild_id,
+            status=status,
+            assigned_to=assigned_to.id if assigned_to else None,
+        )
+        tasks = await view.load_page()
         if not tasks:
             await interaction.response.send_message(
                 "タスクが見つかりませんでした。", ephemeral=True
             )
             return
 
-        embeds = []
-        for task in tasks:
-            embed = discord.Embed(
-                title=f"({task.short_id}) {task.title}",
-                description=task.summary if task.summary else "詳細なし",
-                color=discord.Color.blue(),
-            )
-            assigned_member = interaction.guild.get_member(int(task.assigned_to))
-            
-            # 担当者・重要度を横並び
-            embed.add_field(
-                name="担当者",
-                value=assigned_member.mention if assigned_member else '不明',
-                inline=True,
-            )
-            embed.add_field(
-                name="重要度",
-                value=task.importance.value,
-                inline=True,
-            )
-            # 空白フィールドで改行を強制（2列で折り返し）
-            embed.add_field(name="\u200b", value="\u200b", inline=False)
-
-            # 作成日・締切日を横並び
-            embed.add_field(
-                name="作成日",
-                value=task.created_at.strftime('%Y-%m-%d %H:%M'),
-                inline=True,
-            )
-            embed.add_field(
-                name="締切日",
-                value=task.deadline.strftime('%Y-%m-%d %H:%M'),
-                inline=True,
-            )
-            embed.add_field(name="\u200b", value="\u200b", inline=False)
-
-            # ステータスは1行で
-            embed.add_field(
-                name="ステータス",
-                value=task.status.value,
-                inline=False,
-            )
-            embeds.append(embed)
-
-        await interaction.response.send_message(embeds=embeds[:10])
+        await interaction.response.send_message(**view.render(tasks))
+        self.bot.ack_latency.record(interaction)
+        view.message = await interaction.original_response()
 
     @app_commands.command(name="task-complete", description="タスクを完了にする")
-    @app_commands.describe(task_id="完了にするタスクのID")
+    @app_commands.describe(task_id="完了にするタスクの番号（#の後の数字）")
     async def complete_task(
         self,
         interaction: discord.Interaction,
         task_id: int,
     ) -> None:
         """タスクを完了にするコマンド"""
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(Task).where(
-                    Task.id == task_id,
-                    Task.guild_id == str(interaction.guild_id),
-                )
-            )
-            task = result.scalar_one_or_none()
+        # DBの処理を待たずに応答し、結果はフォローアップで返す
+        await interaction.response.defer(thinking=True)
+        self.bot.ack_latency.record(interaction)
 
-            if not task:
-                await interaction.response.send_message(
-                    "指定されたタスクが見つかりませんでした。", ephemeral=True
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Task).where(
+                        Task.guild_id == interaction.guild_id,
+                        Task.guild_seq == task_id,
+                    )
                 )
-                return
+                task = result.scalar_one_or_none()
 
-            if task.assigned_to != str(interaction.user.id):
-                await interaction.response.send_message(
-                    "このタスクの担当者ではありません。", ephemeral=True
+                if not task:
+                    await reply_error(interaction, "指定されたタスクが見つかりませんでした。")
+                    return
+
+                if task.assigned_to != interaction.user.id:
+                    await reply_error(interaction, "このタスクの担当者ではありません。")
+                    return
+
+                task.status = TaskStatus.COMPLETED
+                await notify(
+                    session,
+                    TASK_CHANGED,
+                    {"guild_id": task.guild_id, "task_id": task.id, "guild_seq": task.guild_seq},
                 )
-                return
+                await session.commit()
+        except Exception as e:
+            print(f"[ERROR] タスクの完了に失敗: {e}")
+            await reply_error(interaction, "タスクを完了にできませんでした。もう一度お試しください。")
+            return
 
-            task.status = TaskStatus.COMPLETED
-            await session.commit()
+        self.bot.task_cache.invalidate(task.guild_id)
+        self.bot.task_index.upsert(task)
+
+        if self.bot.notification_manager:
+            self.bot.notification_manager.unschedule_task(task.id)
 
         embed = discord.Embed(
             title="タスク完了",
@@ -217,61 +256,287 @@ class TaskCog(commands.Cog):
         )
         embed.add_field(name="完了者", value=interaction.user.mention, inline=True)
         embed.add_field(
-            name="完了日時", value=datetime.utcnow().strftime("%Y-%m-%d %H:%M"), inline=True
+            name="完了日時", value=format_jst(utcnow()), inline=True
         )
 
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="task-delete", description="タスクを削除します")
-    @app_commands.describe(task_id="削除するタスクのID")
+    @app_commands.describe(task_id="削除するタスクの番号（#の後の数字）")
     async def delete_task(
         self,
         interaction: discord.Interaction,
         task_id: int,
     ) -> None:
         """タスクを削除するコマンド"""
-        async with AsyncSessionLocal() as session:
-            # タスクの存在確認
-            result = await session.execute(
-                select(Task).where(
-                    Task.id == task_id,
-                    Task.guild_id == str(interaction.guild_id),
-                )
-            )
-            task = result.scalar_one_or_none()
+        # DBの処理を待たずに応答し、結果はフォローアップで返す
+        await interaction.response.defer(thinking=True)
+        self.bot.ack_latency.record(interaction)
 
-            if not task:
-                await interaction.response.send_message(
-                    "指定されたタスクが見つかりませんでした。", ephemeral=True
+        try:
+            async with AsyncSessionLocal() as session:
+                # タスクの存在確認
+                result = await session.execute(
+                    select(Task).where(
+                        Task.guild_id == interaction.guild_id,
+                        Task.guild_seq == task_id,
+                    )
                 )
-                return
-
-            # 権限チェック（タスクの担当者またはサーバー管理者のみ削除可能）
-            if not (
-                str(interaction.user.id) == task.assigned_to
-                or interaction.user.guild_permissions.administrator
-            ):
-                await interaction.response.send_message(
-                    "このタスクを削除する権限がありません。タスクの担当者またはサーバー管理者のみが削除できます。",
-                    ephemeral=True,
+                task = result.scalar_one_or_none()
+
+                if not task:
+                    await reply_error(interaction, "指定されたタスクが見つかりませんでした。")
+                    return
+
+                # 権限チェック（タスクの担当者またはサーバー管理者のみ削除可能）
+                if not (
+                    interaction.user.id == task.assigned_to
+                    or interaction.user.guild_permissions.administrator
+                ):
+                    await reply_error(
+                        interaction,
+                        "このタスクを削除する権限がありません。タスクの担当者またはサーバー管理者のみが削除できます。",
+                    )
+                    return
+
+                # タスクの削除
+                await session.delete(task)
+                await notify(
+                    session,
+                    TASK_CHANGED,
+                    {"guild_id": task.guild_id, "task_id": task.id, "guild_seq": task.guild_seq},
                 )
-                return
+                await session.commit()
+        except Exception as e:
+            print(f"[ERROR] タスクの削除に失敗: {e}")
+            await reply_error(interaction, "タスクを削除できませんでした。もう一度お試しください。")
+            return
 
-            # タスクの削除
-            await session.delete(task)
-            await session.commit()
+        self.bot.task_cache.invalidate(task.guild_id)
+        self.bot.task_index.remove(task.guild_id, task.guild_seq)
+        if self.bot.notification_manager:
+            self.bot.notification_manager.unschedule_task(task.id)
 
-            embed = discord.Embed(
-                title="タスク削除",
-                description=f"タスク「{task.title}」を削除しました。",
-                color=discord.Color.red(),
-            )
-            embed.add_field(name="削除者", value=interaction.user.mention, inline=True)
-            embed.add_field(
-                name="削除日時", value=datetime.utcnow().strftime("%Y-%m-%d %H:%M"), inline=True
+        embed = discord.Embed(
+            title="タスク削除",
+            description=f"タスク「{task.title}」を削除しました。",
+            color=discord.Color.red(),
+        )
+        embed.add_field(name="削除者", value=interaction.user.mention, inline=True)
+        embed.add_field(
+            name="削除日時", value=format_jst(utcnow()), inline=True
+        )
+
+        await interaction.followup.send(embed=embed)
+
+    @complete_task.autocomplete("task_id")
+    async def complete_task_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[app_commands.Choice[int]]:
+        """未完了のタスクを番号・タイトルで補完する"""
+        tasks = await self.bot.task_index.search(
+            interaction.guild_id, current, status=TaskStatus.PENDING
+        )
+        return [task_choice(task) for task in tasks]
+
+    @delete_task.autocomplete("task_id")
+    async def delete_task_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[app_commands.Choice[int]]:
+        """タスクを番号・タイトルで補完する"""
+        tasks = await self.bot.task_index.search(interaction.guild_id, current)
+        return [task_choice(task) for task in tasks]
+
+
+def task_choice(task: IndexedTask) -> app_commands.Choice[int]:
+    """オートコンプリートの候補（表示名は100文字まで）"""
+    name = f"#{task.guild_seq} {task.title}（締切 {format_jst(task.deadline)}）"
+    return app_commands.Choice(name=name[:100], value=task.guild_seq)
+
+
+async def reply_error(interaction: discord.Interaction, message: str) -> None:
+    """送信済み・defer済みの応答を取り消し、エラーを本人にだけ表示する"""
+    try:
+        await interaction.delete_original_response()
+    except discord.HTTPException:
+        pass
+    await interaction.followup.send(message, ephemeral=True)
+
+
+class TaskListView(discord.ui.View):
+    """タスク一覧のページ送り（締切・IDのカーソルで前後のページを取得する）"""
+
+    def __init__(
+        self,
+        cache: GuildCache[tuple[TaskSummary, ...]],
+        owner_id: int,
+        guild_id: int,
+        status: Optional[TaskStatus] = None,
+        assigned_to: Optional[int] = None,
+    ) -> None:
+        super().__init__(timeout=TASK_LIST_TIMEOUT_SECONDS)
+        self.cache = cache
+        self.owner_id = owner_id
+        self.guild_id = guild_id
+        self.status = status
+        self.assigned_to = assigned_to
+        self.message: Optional[discord.Message] = None
+        self.page = 1
+        # 表示中のページの先頭と末尾のカーソル
+        self.first: Optional[TaskCursor] = None
+        self.last: Optional[TaskCursor] = None
+        self.has_prev = False
+        self.has_next = False
+
+    async def load_page(
+        self, after: Optional[TaskCursor] = None, before: Optional[TaskCursor] = None
+    ) -> list[TaskSummary]:
+        """カーソルの前後のページを取得し、前後のページの有無を更新する
+
+        ギルドのタスクが変わるまでは、同じページをキャッシュから返す。
+        """
+        key = (self.status, self.assigned_to, after, before)
+        tasks = self.cache.get(self.guild_id, key)
+        if tasks is None:
+            version = self.cache.version(self.guild_id)
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    task_page_query(
+                        self.guild_id,
+                        status=self.status,
+                        assigned_to=self.assigned_to,
+                        after=after,
+                        before=before,
+                        limit=TASK_PAGE_SIZE + 1,
+                    )
+                )
+                tasks = tuple(TaskSummary.from_task(task) for task in result.scalars())
+            self.cache.set(self.guild_id, key, tasks, version)
+        tasks = list(tasks)
+
+        # 1件多く取得して、その先のページがあるかを判定する
+        has_more = len(tasks) > TASK_PAGE_SIZE
+        tasks = tasks[:TASK_PAGE_SIZE]
+        if before is not None:
+            tasks.reverse()
+            self.has_prev, self.has_next = has_more, True
+        else:
+            self.has_prev, self.has_next = after is not None, has_more
+
+        if tasks:
+            self.first = (tasks[0].deadline, tasks[0].id)
+            self.last = (tasks[-1].deadline, tasks[-1].id)
+        self.prev_page.disabled = not self.has_prev
+        self.next_page.disabled = not self.has_next
+        return tasks
+
+    def render(self, tasks: Sequence[TaskSummary]) -> dict:
+        """ページの内容をsend_message/edit_messageの引数にする"""
+        return {
+            "content": f"タスク一覧（{self.page}ページ目）",
+            "embeds": [build_task_embed(task) for task in tasks],
+            "view": self,
+        }
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message(
+                "一覧を表示したユーザーのみページを切り替えられます。", ephemeral=True
             )
+            return False
+        return True
+
+    async def show(self, interaction: discord.Interaction, tasks: list[TaskSummary]) -> None:
+        if not tasks:
+            # 表示中にタスクが削除された場合など（表示中のページはそのまま残す）
+            await interaction.response.edit_message(content="これ以上タスクはありません。", view=self)
+            return
+        await interaction.response.edit_message(**self.render(tasks))
+
+    @discord.ui.button(label="前へ", style=discord.ButtonStyle.secondary, disabled=True)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        tasks = await self.load_page(before=self.first)
+        if tasks:
+            self.page = max(1, self.page - 1)
+        await self.show(interaction, tasks)
+
+    @discord.ui.button(label="次へ", style=discord.ButtonStyle.primary, disabled=True)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        tasks = await self.load_page(after=self.last)
+        if tasks:
+            self.page += 1
+        await self.show(interaction, tasks)
+
+    async def on_timeout(self) -> None:
+        """有効時間が過ぎたらボタンを無効にする"""
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+def task_page_query(
+    guild_id: int,
+    *,
+    status: Optional[TaskStatus] = None,
+    assigned_to: Optional[int] = None,
+    after: Optional[TaskCursor] = None,
+    before: Optional[TaskCursor] = None,
+    limit: int = TASK_PAGE_SIZE,
+) -> Select:
+    """(締切, ID)をカーソルにしたタスク一覧の1ページ分のクエリ
+
+    afterを指定するとその次から締切順に、beforeを指定するとその手前から逆順に取得する。
+    """
+    query = select(Task).where(Task.guild_id == guild_id)
+    if status:
+        # 部分インデックス（status = 'PENDING'）を汎用プランでも使えるよう、値はSQLに埋め込む
+        query = query.where(Task.status == literal(status, Task.status.type, literal_execute=True))
+    if assigned_to:
+        query = query.where(Task.assigned_to == assigned_to)
+
+    if before is not None:
+        return (
+            query.where(tuple_(Task.deadline, Task.id) < tuple_(*before))
+            .order_by(Task.deadline.desc(), Task.id.desc())
+            .limit(limit)
+        )
+    if after is not None:
+        query = query.where(tuple_(Task.deadline, Task.id) > tuple_(*after))
+    return query.order_by(Task.deadline, Task.id).limit(limit)
+
+
+def build_task_embed(task: TaskSummary) -> discord.Embed:
+    """一覧に表示するタスク1件分のEmbed"""
+    summary = task.summary or "詳細なし"
+    if len(summary) > SUMMARY_PREVIEW_LENGTH:
+        summary = summary[: SUMMARY_PREVIEW_LENGTH - 1] + "…"
+    embed = discord.Embed(
+        title=f"({task.short_id}) {task.title}",
+        description=summary,
+        color=discord.Color.blue(),
+    )
+    # 担当者・重要度を横並び（メンションはメンバーキャッシュなしで表示できる）
+    embed.add_field(name="担当者", value=f"<@{task.assigned_to}>", inline=True)
+    embed.add_field(name="重要度", value=task.importance.value, inline=True)
+    # 空白フィールドで改行を強制（2列で折り返し）
+    embed.add_field(name="\u200b", value="\u200b", inline=False)
+
+    # 作成日・締切日を横並び
+    embed.add_field(
+        name="作成日", value=format_jst(task.created_at), inline=True
+    )
+    embed.add_field(
+        name="締切日", value=format_jst(task.deadline), inline=True
+    )
+    embed.add_field(name="\u200b", value="\u200b", inline=False)
 
-            await interaction.response.send_message(embed=embed)
+    # ステータスは1行で
+    embed.add_field(name="ステータス", value=task.status.value, inline=False)
+    return embed
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -7,8 +7,10 @@ from discord import app_commands
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import ImportanceLevel, Task, TaskStatus
-from ..utils.date_parser import parse_datetime
+from ..models import ImportanceLevel, Task, TaskReminder, TaskStatus
+from ..models.base import utcnow
+from ..tasks.task_writer import assign_guild_seqs
+from ..utils.date_parser import format_jst, parse_datetime
 from ..utils.notification import parse_notification_time
 
 
@@ -60,20 +62,22 @@ async def task_add(
         )
         return
 
-    user_id = user_id_match.group(1)
+    user_id = int(user_id_match.group(1))
 
     async with AsyncSession() as session:
         task = Task(
-            guild_id=str(interaction.guild_id),
-            channel_id=str(interaction.channel_id),
-            message_id="temporary",  # 後で更新
+            guild_id=interaction.guild_id,
+            channel_id=interaction.channel_id,
+            message_id=interaction.id,  # 送信後にメッセージIDで更新
             title=title,
             assigned_to=user_id,
             deadline=deadline_dt,
             importance=importance,
             summary=summary,
             notification_times=notification_minutes,
+            reminders=TaskReminder.for_task(deadline_dt, notification_minutes),
         )
+        await assign_guild_seqs(session, [task])
         session.add(task)
         await session.flush()  # IDを生成するためにflush
 
@@ -93,13 +97,13 @@ async def task_add(
         embed = discord.Embed(
             title="タスクが追加されました",
             color=discord.Color.green(),
-            timestamp=datetime.now(),
+            timestamp=utcnow(),
         )
         embed.add_field(name="ID", value=task.short_id, inline=True)
         embed.add_field(name="タイトル", value=title, inline=True)
         embed.add_field(name="担当者", value=assigned_to, inline=True)
         embed.add_field(
-            name="締切", value=deadline_dt.strftime("%Y-%m-%d %H:%M"), inline=True
+            name="締切", value=format_jst(deadline_dt), inline=True
         )
         embed.add_field(name="重要度", value=importance.value, inline=True)
         if summary:
@@ -112,5 +116,5 @@ async def task_add(
         message = await interaction.original_response()
         
         # メッセージIDを更新
-        task.message_id = str(message.id)
+        task.message_id = message.id
         await session.commit() 
\ No newline at end of file
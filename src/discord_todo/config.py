@@ -15,14 +15,93 @@ class Settings(BaseSettings):
     DISCORD_CLIENT_ID: str | None = None
     DISCORD_CLIENT_SECRET: str | None = None
     DISCORD_DEVELOPMENT_GUILD_ID: int | None = None
+    # スラッシュコマンドに必要な最小限のintentで動かし、メンバー・メッセージをキャッシュしない
+    DISCORD_LOW_MEMORY: bool = False
+    # シャーディング設定（総数を設定した場合のみAutoShardedBotで起動する）
+    DISCORD_SHARD_COUNT: int | None = None
+    DISCORD_SHARD_IDS: list[int] | None = None  # このプロセスが担当するシャード。例: [0,1]（未設定なら全て）
 
     # データベース設定
     DATABASE_URL: str
+    DATABASE_POOL_SIZE: int = 5  # APIとBotを1プロセスで動かす場合は両方で共有する
+    DATABASE_MAX_OVERFLOW: int = 10
 
     # Microsoft Graph API設定
     MICROSOFT_CLIENT_ID: str | None = None
     MICROSOFT_CLIENT_SECRET: str | None = None
     MICROSOFT_TENANT_ID: str | None = None
+    MICROSOFT_REDIRECT_URI: str = "http://localhost:8000/api/mail/callback"
+    # ローカルの偽Graphサーバーで動かす場合に差し替える
+    MICROSOFT_LOGIN_BASE_URL: str = "https://login.microsoftonline.com"
+    GRAPH_BASE_URL: str = "https://graph.microsoft.com/v1.0"
+
+    # HTTPクライアント設定（Microsoft Graph / OAuth）
+    HTTP_HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    HTTP_TIMEOUT_SECONDS: float = 30.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 10.0
+
+    # タスク一覧のキャッシュ設定
+    TASK_CACHE_MAX_ENTRIES: int = 2048  # キャッシュするページ数の上限（古いものから破棄）
+    TASK_CACHE_TTL_SECONDS: float = 300.0  # キャッシュの有効期限
+    # タスク番号のオートコンプリート用インデックス（ギルド単位で保持する）
+    TASK_INDEX_MAX_GUILDS: int = 256  # 保持するギルド数の上限（使われていないものから破棄）
+    TASK_INDEX_TTL_SECONDS: float = 1800.0  # 読み込み直すまでの時間
+    # タスク追加のまとめ書き（この時間内の追加を1つのトランザクションで書き込む）
+    TASK_WRITE_BATCH_SECONDS: float = 0.05
+    TASK_WRITE_BATCH_SIZE: int = 100
+
+    # Graph APIのレート制限（アプリ全体・テナントごとのトークンバケット）
+    GRAPH_APP_RATE_PER_SECOND: float = 20.0  # アプリ全体の送信レート（件/秒）
+    GRAPH_APP_BURST: int = 40  # 同バースト上限
+    GRAPH_TENANT_RATE_PER_SECOND: float = 4.0  # テナントごとの送信レート（件/秒）
+    GRAPH_TENANT_BURST: int = 8  # 同バースト上限
+    GRAPH_MAX_RETRIES: int = 4  # 429/503を受けた時の再試行回数
+    GRAPH_BACKOFF_BASE_SECONDS: float = 1.0  # Retry-Afterがない時のバックオフの基準
+    GRAPH_BACKOFF_MAX_SECONDS: float = 30.0  # 同上限
+    GRAPH_MAX_RETRY_AFTER_SECONDS: float = 30.0  # これより長い待機はその場で待たずに次回へ回す
+
+    # メール同期設定
+    MAIL_SYNC_CONCURRENCY: int = 8  # 同時に同期する連携数（1なら逐次処理）
+    MAIL_SYNC_TIMEOUT_SECONDS: float = 60.0  # 連携1件あたりの同期タイムアウト
+    MAIL_SYNC_CHUNK_SIZE: int = 100  # 連携一覧を読み込む単位
+
+    MAIL_TOKEN_REFRESH_AHEAD_MINUTES: int = 10  # 期限のこの時間前にトークンを先回り更新
+    MAIL_TOKEN_SWEEP_INTERVAL_SECONDS: float = 60.0  # 先回り更新の確認間隔
+    MAIL_POLL_INTERVAL_MINUTES: float = 30.0  # 新規連携の最初のポーリング間隔
+    MAIL_POLL_MIN_MINUTES: float = 2.0  # 到着率に応じたポーリング間隔の下限
+    MAIL_POLL_MAX_MINUTES: float = 120.0  # 同上限（変更通知が有効な連携は確認間隔が上限）
+    MAIL_POLL_TICK_SECONDS: float = 60.0  # ポーリング時刻を迎えた連携を確認する間隔
+    MAIL_FAILURE_BACKOFF_BASE_MINUTES: float = 5.0  # 同期失敗時の再試行待ちの基準（失敗ごとに倍）
+    MAIL_FAILURE_BACKOFF_MAX_MINUTES: float = 1440.0  # 同上限
+    MAIL_FAILURE_NOTIFY_THRESHOLD: int = 3  # この回数続けて失敗したらユーザーに1度だけ知らせる
+
+    # Graph変更通知（プッシュ）設定。Webhook URLを設定した場合のみ有効
+    MAIL_WEBHOOK_URL: str | None = None  # 例: https://example.com/api/mail/notifications
+    MAIL_WEBHOOK_CLIENT_STATE: str | None = None  # 通知の送信元確認に使う秘密値
+    MAIL_SUBSCRIPTION_LIFETIME_MINUTES: int = 4200  # メッセージの購読は最大4230分
+    MAIL_SUBSCRIPTION_RENEW_AHEAD_MINUTES: int = 720  # 期限のこの時間前に購読を更新
+    MAIL_RECONCILE_INTERVAL_MINUTES: float = 360.0  # プッシュ有効時の取りこぼし確認の間隔
+    MAIL_PUSH_CHECK_SECONDS: float = 300.0  # 同期待ちの印の取りこぼし確認の間隔（通常はNOTIFYで即時）
+
+    # Discordへの送信（アウトボックス）設定
+    OUTBOX_WORKERS: int = 4  # 並行して送信するワーカー数
+    OUTBOX_POLL_SECONDS: float = 5.0  # 登録の知らせがない時に送信待ちを確認する間隔
+    OUTBOX_LEASE_SECONDS: float = 60.0  # 取り出した行の処理の期限（過ぎると再び送信される）
+    OUTBOX_MAX_ATTEMPTS: int = 8  # 送信を諦めるまでの試行回数
+    OUTBOX_RETRY_BASE_SECONDS: float = 5.0  # 再試行の待ち時間の基準（失敗ごとに倍）
+    OUTBOX_RETRY_MAX_SECONDS: float = 600.0  # 同上限
+    OUTBOX_CHANNEL_RATE_PER_SECOND: float = 1.0  # チャンネルごとの送信レート（Discordは5件/5秒）
+    OUTBOX_CHANNEL_BURST: int = 5
+
+    # 同じチャンネルで同時に期限を迎えた通知がこの件数以上なら1通にまとめる（0でまとめない）
+    REMINDER_DIGEST_THRESHOLD: int = 3
+
+    # リーダー選出設定（スケジューラーは1つのプロセスでだけ動かす）
+    LEADER_RETRY_SECONDS: float = 5.0  # リーダーでないプロセスがロックを取り直す間隔
+    LEADER_CHECK_SECONDS: float = 5.0  # リーダーがロック用の接続を確認する間隔
 
     # FastAPI設定
     API_HOST: str = "0.0.0.0"
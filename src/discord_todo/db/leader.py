@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import asyncpg
+
+from ..config import settings
+from .session import engine
+
+logger = logging.getLogger(__name__)
+
+# アドバイザリロックの名前（hashtextで数値のキーにする）
+SCHEDULER_LOCK_NAME = "discord_todo:schedulers"
+
+
+class LeaderElection:
+    """PostgreSQLのアドバイザリロックで、スケジューラーを動かすプロセスを1つに選ぶクラス
+
+    専用の接続でセッション単位のロックを取り、取れたプロセスがリーダーになる。
+    リーダーのプロセスが落ちると接続ごとロックが解放され、他のレプリカが
+    LEADER_RETRY_SECONDS 以内に引き継ぐ。リーダー側は接続を定期的に確認し、
+    確認できなくなったら（ロックを失った可能性があるので）すぐにリーダーを降りる。
+    """
+
+    def __init__(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        lock_name: str = SCHEDULER_LOCK_NAME,
+    ) -> None:
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.lock_name = lock_name
+        self.is_leader = False
+        self._runner: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _run(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                while not await connection.fetchval(
+                    "SELECT pg_try_advisory_lock(hashtext($1))", self.lock_name
+                ):
+                    await asyncio.sleep(settings.LEADER_RETRY_SECONDS)
+
+                await self._set_leader(True)
+                while True:
+                    await asyncio.sleep(settings.LEADER_CHECK_SECONDS)
+                    # 接続が生きていればロックも保持している
+                    await connection.fetchval("SELECT 1", timeout=settings.LEADER_CHECK_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"リーダー選出の接続でエラー発生: {e}")
+            finally:
+                await self._set_leader(False)
+                if connection is not None and not connection.is_closed():
+                    # 接続を閉じればロックも解放される
+                    connection.terminate()
+            await asyncio.sleep(settings.LEADER_RETRY_SECONDS)
+
+    async def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        if is_leader:
+            logger.info("リーダーになりました。スケジューラーを開始します")
+            await self.on_elected()
+        else:
+            logger.warning("リーダーを降りました。スケジューラーを停止します")
+            await self.on_demoted()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .session import engine
+
+logger = logging.getLogger(__name__)
+
+# 通知チャンネル
+TASK_CHANGED = "task_changed"
+MAIL_CONNECTION_CHANGED = "mail_connection_changed"
+MAIL_SYNC_REQUESTED = "mail_sync_requested"
+
+# このプロセスが送った通知を見分けるための識別子
+ORIGIN = uuid.uuid4().hex
+# 送信したプロセスが変更時にすでに反映しているチャンネル（自プロセスからの通知は無視する）
+# メール連携の通知はAPIからBotへ送るもので、両方を1プロセスで動かす場合も受け取る必要がある
+SELF_APPLIED_CHANNELS = frozenset({TASK_CHANGED})
+# 接続が切れた時の再接続の待ち時間（秒）
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+async def notify(session: AsyncSession, channel: str, payload: dict[str, Any]) -> None:
+    """変更を他のプロセスへ通知する
+
+    NOTIFYはトランザクションに含まれ、コミットされた時にだけ届く。
+    """
+    message = json.dumps({**payload, "origin": ORIGIN})
+    await session.execute(select(func.pg_notify(channel, message)))
+
+
+class PgListener:
+    """PostgreSQLのLISTENで他のプロセスからの変更通知を受け取るクラス
+
+    専用の接続を1本使い、切断されたら再接続する。切断中の通知は届かないため、
+    再接続時には on_reconnect のハンドラで状態を取り直す。
+    自プロセスが送った SELF_APPLIED_CHANNELS の通知は（変更時にすでに反映済みなので）無視する。
+    """
+
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[Handler]] = {}
+        self._reconnect_handlers: list[Callable[[], Awaitable[None]]] = []
+        self._runner: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """チャンネルの通知を受け取るハンドラを登録する"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, handler: Callable[[], Awaitable[None]]) -> None:
+        """再接続した時に呼ぶハンドラを登録する"""
+        self._reconnect_handlers.append(handler)
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _run(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = RECONNECT_DELAY_SECONDS
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda *_, closed=closed: closed.set())
+                for channel in self._handlers:
+                    await connection.add_listener(channel, self._on_notification)
+                logger.info(f"変更通知の受信を開始: {', '.join(self._handlers)}")
+                delay = RECONNECT_DELAY_SECONDS
+
+                if connected_before:
+                    # 切断中に届かなかった変更を取り直す
+                    for handler in self._reconnect_handlers:
+                        self._dispatch(handler())
+                connected_before = True
+                await closed.wait()
+                logger.warning("変更通知の接続が切断されました")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"変更通知の接続でエラー発生: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def _on_notification(self, connection, pid: int, channel: str, message: str) -> None:
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            logger.error(f"不正な変更通知を破棄: {channel} {message}")
+            return
+        if channel in SELF_APPLIED_CHANNELS and payload.get("origin") == ORIGIN:
+            return
+        for handler in self._handlers.get(channel, []):
+            self._dispatch(handler(payload))
+
+    def _dispatch(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"変更通知の処理でエラー発生: {task.exception()}")
@@ -1,10 +1,38 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from .api.mail_callback import router as mail_callback_router
+from .api.mail_webhook import router as mail_webhook_router
+from .utils.clients import SharedClients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """アプリの起動・終了時に共有リソースを用意・解放する
+
+    Botと同じプロセスで動かす場合は、起動側が app.state.clients に
+    共有のクライアントを設定しておく（その場合の解放は起動側が行う）。
+    """
+    clients = getattr(app.state, "clients", None)
+    owns_clients = clients is None
+    if owns_clients:
+        # 先回り更新はBot側で行うので、APIでは必要になった時だけ更新する
+        clients = SharedClients.create()
+    app.state.http_client = clients.http_client
+    app.state.token_manager = clients.token_manager
+    app.state.graph_client = clients.graph_client
+    try:
+        yield
+    finally:
+        if owns_clients:
+            await clients.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # ルーターを組み込む
 app.include_router(mail_callback_router)
+app.include_router(mail_webhook_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1 +1,2 @@
-from .task import ImportanceLevel, Task, TaskStatus 
\ No newline at end of file
+from .outbox import OutboxMessage, OutboxPriority
+from .task import GuildTaskSequence, ImportanceLevel, Task, TaskReminder, TaskStatus
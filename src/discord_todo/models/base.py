@@ -1,7 +1,7 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from sqlalchemy import MetaData
+from sqlalchemy import DateTime, MetaData
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -17,15 +17,21 @@ convention = {
 metadata = MetaData(naming_convention=convention)
 
 
-def get_jst_now() -> datetime:
-    """現在のJST時刻を取得"""
-    return datetime.utcnow() + timedelta(hours=9)
+# 締切の入力と表示に使う日本時間（DBにはタイムゾーン付きで保存する）
+JST = timezone(timedelta(hours=9), "JST")
+
+
+def utcnow() -> datetime:
+    """現在時刻をUTC（タイムゾーン付き）で取得"""
+    return datetime.now(timezone.utc)
 
 
 class Base(DeclarativeBase):
     """全モデルの基底クラス"""
 
     metadata = metadata
+    # 日時はすべてtimestamptzで保存する
+    type_annotation_map = {datetime: DateTime(timezone=True)}
 
     @declared_attr.directive
     def __tablename__(cls) -> str:
@@ -33,10 +39,8 @@ class Base(DeclarativeBase):
         return cls.__name__.lower()
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    created_at: Mapped[datetime] = mapped_column(default=get_jst_now)
-    updated_at: Mapped[datetime] = mapped_column(
-        default=get_jst_now, onupdate=get_jst_now
-    )
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
 
     def dict(self) -> dict[str, Any]:
         """モデルをディクショナリに変換"""
@@ -1,42 +1,94 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, String, Text, UniqueConstraint
+from sqlalchemy import JSON, BigInteger, ColumnElement, ForeignKey, Index, String, Text, UniqueConstraint, or_, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from .base import Base
+from .base import Base, utcnow
 
 
 class MailConnection(Base):
     """メール連携設定モデル"""
 
-    guild_id: Mapped[str] = mapped_column(String(255), nullable=False)
-    user_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     email: Mapped[str] = mapped_column(String(255), nullable=False)
     access_token: Mapped[str] = mapped_column(Text, nullable=False)
     refresh_token: Mapped[str] = mapped_column(Text, nullable=False)
     token_expires_at: Mapped[datetime] = mapped_column(nullable=False, index=True)
     last_checked_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # 差分取得の位置（取得済みメールの最新の受信日時）
+    last_received_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # Graph変更通知の購読
+    subscription_id: Mapped[str | None] = mapped_column(String(255), nullable=True, unique=True)
+    subscription_expires_at: Mapped[datetime | None] = mapped_column(nullable=True, index=True)
+    # 変更通知を受けて、同期を待っている日時
+    sync_requested_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # 到着率に応じたポーリングのスケジュール
+    next_poll_at: Mapped[datetime] = mapped_column(
+        nullable=False, default=utcnow, index=True
+    )
+    poll_interval_minutes: Mapped[float] = mapped_column(nullable=False, default=30.0)
+    empty_poll_streak: Mapped[int] = mapped_column(nullable=False, default=0)
+    arrival_rate: Mapped[float] = mapped_column(nullable=False, default=0.0)  # 件/時
+    # 同期の連続失敗と隔離（retry_afterまでは同期・トークン更新の対象外）
+    consecutive_failures: Mapped[int] = mapped_column(nullable=False, default=0)
+    last_error_class: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    retry_after: Mapped[datetime | None] = mapped_column(nullable=True)
+    failure_notified_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # ダイジェスト（1回の同期で届いたメールを1通にまとめて通知する）の設定
+    digest_enabled: Mapped[bool] = mapped_column(nullable=False, default=False)
+    # ダイジェスト中でも重要度の高いメールはすぐに個別に通知する
+    digest_immediate_high_importance: Mapped[bool] = mapped_column(nullable=False, default=True)
+    # ダイジェスト中でもすぐに通知する送信者（アドレス、または @example.com のようなドメイン）
+    digest_immediate_senders: Mapped[list[str]] = mapped_column(JSON, nullable=False, default=list)
 
     # リレーションシップ
     notifications: Mapped[list["MailNotification"]] = relationship(
-        back_populates="connection", cascade="all, delete-orphan"
+        back_populates="connection", cascade="all, delete-orphan", passive_deletes=True
     )
 
+    @classmethod
+    def available_at(cls, now: datetime) -> ColumnElement[bool]:
+        """隔離されていない（または隔離期間を過ぎた）連携を表す条件"""
+        return or_(cls.retry_after.is_(None), cls.retry_after <= now)
+
+    def clear_failures(self) -> None:
+        """同期の成功・再連携時に失敗の記録と隔離を解除する"""
+        self.consecutive_failures = 0
+        self.last_error_class = None
+        self.retry_after = None
+        self.failure_notified_at = None
+
     __table_args__ = (
         UniqueConstraint("guild_id", "user_id", name="uq_mail_connection_guild_user"),
+        # 同期待ちの連携だけを引くための部分インデックス
+        Index(
+            "ix_mailconnection_sync_requested_at",
+            "sync_requested_at",
+            postgresql_where=text("sync_requested_at IS NOT NULL"),
+        ),
     )
 
 
 class MailNotification(Base):
     """メール通知履歴モデル"""
 
-    connection_id: Mapped[int] = mapped_column(ForeignKey("mailconnection.id"), nullable=False)
-    message_id: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    connection_id: Mapped[int] = mapped_column(
+        ForeignKey("mailconnection.id", ondelete="CASCADE"), nullable=False
+    )
+    message_id: Mapped[str] = mapped_column(String(255), nullable=False)
     subject: Mapped[str] = mapped_column(String(255), nullable=False)
     sender: Mapped[str] = mapped_column(String(255), nullable=False)
     received_at: Mapped[datetime] = mapped_column(nullable=False, index=True)
-    notified_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
-    discord_message_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    notified_at: Mapped[datetime] = mapped_column(default=utcnow)
+    discord_message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     # リレーションシップ
-    connection: Mapped[MailConnection] = relationship(back_populates="notifications") 
\ No newline at end of file
+    connection: Mapped[MailConnection] = relationship(back_populates="notifications")
+
+    __table_args__ = (
+        # GraphのメッセージIDはメールボックスごとに一意
+        UniqueConstraint(
+            "connection_id", "message_id", name="uq_mailnotification_connection_message"
+        ),
+    ) 
\ No newline at end of file
@@ -0,0 +1,47 @@
+from datetime import datetime
+from enum import IntEnum
+
+from sqlalchemy import JSON, BigInteger, Index, SmallInteger, String, Text, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, utcnow
+
+
+class OutboxPriority(IntEnum):
+    """送信の優先度（小さいほど先に送る）"""
+
+    REMINDER = 0
+    MAIL = 10
+
+
+class OutboxMessage(Base):
+    """Discordへ送るメッセージの送信待ち（アウトボックス）モデル
+
+    状態の変更と同じトランザクションで登録し、ディスパッチャーが送信する。
+    """
+
+    guild_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    channel_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    priority: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    # 同じ送信を二重に登録しないためのキー（例: reminder:123）
+    idempotency_key: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    # {"content": ..., "embeds": [Embed.to_dict(), ...]}
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # 次に送信を試みる日時（取り出し中は処理の期限として使う）
+    next_attempt_at: Mapped[datetime] = mapped_column(nullable=False, default=utcnow)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    # 再試行しても送れない（チャンネルが見つからない・権限がないなど）
+    failed_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        # 送信待ちの行だけを優先度順に引くための部分インデックス
+        Index(
+            "ix_outboxmessage_due",
+            "priority",
+            "next_attempt_at",
+            "id",
+            postgresql_where=text("sent_at IS NULL AND failed_at IS NULL"),
+        ),
+    )
@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import List
 
-from sqlalchemy import String, Text, JSON
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, ForeignKey, Index, String, Text, JSON, UniqueConstraint, text
+from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
 
@@ -26,28 +27,99 @@ class TaskStatus(str, Enum):
 class Task(Base):
     """タスクモデル"""
 
-    guild_id: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
-    channel_id: Mapped[str] = mapped_column(String(255), nullable=False)
-    message_id: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    # DiscordのID（snowflake）はBIGINTで保存する
+    guild_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # ギルド内の通し番号（コマンドで指定・表示するタスクの番号）
+    guild_seq: Mapped[int] = mapped_column(nullable=False)
+    channel_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    message_id: Mapped[int] = mapped_column(BigInteger, nullable=False, unique=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
-    assigned_to: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    assigned_to: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
     deadline: Mapped[datetime] = mapped_column(nullable=False, index=True)
     importance: Mapped[ImportanceLevel] = mapped_column(default=ImportanceLevel.MEDIUM)
-    status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING, index=True)
+    status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING)
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
     pdf_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
     
     # 通知設定（分単位で保存）
+    # MutableListにしておくと、append等のインプレース変更も更新として検出される
     notification_times: Mapped[List[int]] = mapped_column(
-        JSON, nullable=False, default=list
+        MutableList.as_mutable(JSON), nullable=False, default=list
     )
     # 通知済みの時間（分単位で保存）
+    # 旧形式。通知の送信状態は TaskReminder.sent_at で管理する
     notified_times: Mapped[List[int]] = mapped_column(
-        JSON, nullable=False, default=list
+        MutableList.as_mutable(JSON), nullable=False, default=list
+    )
+
+    reminders: Mapped[list["TaskReminder"]] = relationship(
+        back_populates="task",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        UniqueConstraint("guild_id", "guild_seq", name="uq_task_guild_seq"),
+        # タスク一覧（締切・IDのカーソル）の絞り込みごとの複合インデックス
+        Index("ix_task_guild_deadline", "guild_id", "deadline", "id"),
+        Index("ix_task_guild_status_deadline", "guild_id", "status", "deadline", "id"),
+        # 担当者ごとの未完了タスクだけを引くための部分インデックス
+        Index(
+            "ix_task_pending_guild_assignee_deadline",
+            "guild_id",
+            "assigned_to",
+            "deadline",
+            "id",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
     )
 
     @property
     def short_id(self) -> str:
-        """3文字のショートID"""
-        # IDを36進数に変換して3文字に制限
-        return hex(self.id)[2:].zfill(3)[-3:] 
\ No newline at end of file
+        """表示用のタスク番号（ギルド内の通し番号）"""
+        return f"#{self.guild_seq}"
+
+
+class GuildTaskSequence(Base):
+    """ギルドごとのタスク番号の払い出し状況"""
+
+    guild_id: Mapped[int] = mapped_column(BigInteger, nullable=False, unique=True)
+    last_seq: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class TaskReminder(Base):
+    """タスク通知予定モデル（タスク×通知タイミングごとに1行）"""
+
+    task_id: Mapped[int] = mapped_column(
+        ForeignKey("task.id", ondelete="CASCADE"), nullable=False
+    )
+    offset_minutes: Mapped[int] = mapped_column(nullable=False)
+    due_at: Mapped[datetime] = mapped_column(nullable=False)
+    sent_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    # リレーションシップ
+    task: Mapped[Task] = relationship(back_populates="reminders")
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "offset_minutes", name="uq_taskreminder_task_offset"),
+        # 未送信の通知だけを通知時刻順に引くための部分インデックス
+        Index(
+            "ix_taskreminder_unsent_due_at",
+            "due_at",
+            postgresql_where=text("sent_at IS NULL"),
+        ),
+    )
+
+    @staticmethod
+    def due_at_for(deadline: datetime, minutes: int) -> datetime:
+        """締切と通知タイミング（分）から通知時刻を分単位で求める"""
+        notify_at = deadline - timedelta(minutes=minutes)
+        return notify_at.replace(second=0, microsecond=0)
+
+    @classmethod
+    def for_task(cls, deadline: datetime, notification_times: List[int]) -> list["TaskReminder"]:
+        """通知タイミングの一覧から通知予定を作成する"""
+        return [
+            cls(offset_minutes=minutes, due_at=cls.due_at_for(deadline, minutes))
+            for minutes in sorted(set(notification_times), reverse=True)
+        ]
@@ -0,0 +1,81 @@
+import asyncio
+import contextlib
+import logging
+import signal
+
+import uvicorn
+
+from .bot.bot import create_bot
+from .config import settings
+from .db.session import engine
+from .main import app
+from .utils.clients import SharedClients
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddedServer(uvicorn.Server):
+    """他の処理と同じイベントループで動かすuvicornサーバー
+
+    シグナルは起動側でまとめて受け取り、Botと揃えて停止するため、
+    uvicorn自身にはシグナルハンドラを設定させない。
+    """
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+def run_api() -> None:
+    """APIだけを起動する（Botと分けて動かす場合）"""
+    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
+
+
+async def serve_all() -> None:
+    """APIとBotを1つのイベントループで起動する
+
+    DBの接続プール・HTTPクライアント・トークンのキャッシュを共有する。
+    どちらかが停止した場合やシグナルを受けた場合は、もう一方も停止させる。
+    """
+    clients = SharedClients.create()
+    app.state.clients = clients
+    server = EmbeddedServer(
+        uvicorn.Config(app, host=settings.API_HOST, port=settings.API_PORT, log_config=None)
+    )
+    bot = create_bot(clients)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        async with bot:
+            api_task = asyncio.create_task(server.serve(), name="api")
+            bot_task = asyncio.create_task(bot.start(settings.DISCORD_TOKEN), name="bot")
+            stop_task = asyncio.create_task(stop.wait(), name="signal")
+            done, _ = await asyncio.wait(
+                {api_task, bot_task, stop_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            logger.info(f"停止を開始します（契機: {', '.join(t.get_name() for t in done)}）")
+
+            # 新しいリクエストの受付を止めてから、Botを閉じる
+            server.should_exit = True
+            await bot.close()
+            stop_task.cancel()
+            results = await asyncio.gather(api_task, bot_task, return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                raise errors[0]
+    finally:
+        await clients.aclose()
+        await engine.dispose()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+
+
+def run_all() -> None:
+    """APIとBotを1つのプロセスで起動する（同期版）"""
+    asyncio.run(serve_all())
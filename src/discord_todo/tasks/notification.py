@@ -1,88 +1,360 @@
+import asyncio
+import hashlib
+import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import discord
-from discord.ext import tasks
-from sqlalchemy import select
+from sqlalchemy import Select, select, update
+from sqlalchemy.orm import selectinload
+from ..config import settings
 from ..db.session import AsyncSessionLocal
 
-from ..models import Task, TaskStatus
+from ..models import OutboxPriority, Task, TaskReminder, TaskStatus
+from ..models.base import utcnow
+from ..utils.date_parser import format_jst
+from ..utils.digest import DigestEntry, pack_digest
+from ..utils.sharding import ShardScope
+from .outbox import OutgoingMessage, enqueue
+from .reminder_queue import ReminderQueue
+
+logger = logging.getLogger(__name__)
+
+# 次の通知まで間が空いていても、時計のずれを拾うためにこの間隔で起き直す
+MAX_SLEEP_SECONDS = 3600
+# 通知時刻からこれ以上遅れた通知（停止中・フェイルオーバー中に過ぎたものなど）は、遅れた旨を添えて送る
+REMINDER_GRACE = timedelta(hours=1)
+# 送信済みの記録を1つのUPDATEにまとめる件数
+REMINDER_WRITE_CHUNK_SIZE = 500
 
 
 class NotificationManager:
-    """タスク通知を管理するクラス"""
+    """タスク通知を管理するクラス
+
+    通知予定をメモリ上の優先度付きキューに保持し、次の通知時刻ちょうどに起きて送信する。
+    キューは開始時に未送信の通知予定から1回だけ読み込み、以降はタスクの追加・完了・削除時に更新する。
+    送信はリーダーのプロセスだけが行うため、start() / stop() で送信ループを開始・停止する。
+    """
 
     def __init__(self, bot: discord.Client):
-        print("NotificationManager初期化")  # デバッグ用
         self.bot = bot
-        self.check_notifications.start()
+        self.queue = ReminderQueue()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """送信ループを開始する（開始時に通知予定を読み込み直す）"""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """送信ループを停止する"""
+        if self._runner:
+            self._runner.cancel()
+            self._runner = None
 
     def cog_unload(self):
-        self.check_notifications.cancel()
+        self.stop()
+
+    def schedule_task(self, task: Task) -> None:
+        """タスクの通知予定をキューに登録する（追加・更新時）"""
+        if task.status != TaskStatus.PENDING:
+            self.unschedule_task(task.id)
+            return
+        current_next = self.queue.next_due()
+        self.queue.schedule(
+            task.id,
+            [
+                (reminder.offset_minutes, reminder.due_at)
+                for reminder in task.reminders
+                if reminder.sent_at is None
+            ],
+            not_before=utcnow().replace(second=0, microsecond=0),
+        )
+        next_due = self.queue.next_due()
+        if next_due is not None and (current_next is None or next_due < current_next):
+            self._wakeup.set()
+
+    def unschedule_task(self, task_id: int) -> None:
+        """タスクの通知予定をキューから外す（完了・削除時）"""
+        self.queue.unschedule(task_id)
+
+    @property
+    def scope(self) -> Optional[ShardScope]:
+        """担当するシャードの範囲（シャーディングしない場合はNone）"""
+        return getattr(self.bot, "shard_scope", None)
+
+    async def reload_task(self, task_id: int) -> None:
+        """他のプロセスで変更されたタスクの通知予定をDBから読み直す"""
+        async with AsyncSessionLocal() as session:
+            task = await session.get(Task, task_id, options=[selectinload(Task.reminders)])
+        if task is None:
+            self.unschedule_task(task_id)
+        else:
+            self.schedule_task(task)
+
+    async def seed(self) -> None:
+        """起動時に未送信の通知予定を読み込む（それより古いものは起動直後の通知チェックで処理する）"""
+        not_before = utcnow() - REMINDER_GRACE
+        reminders_by_task: Dict[int, List[Tuple[int, datetime]]] = {}
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(pending_reminders_query(not_before, self.scope))
+            for task_id, minutes, due_at in result:
+                reminders_by_task.setdefault(task_id, []).append((minutes, due_at))
+
+        for task_id, reminders in reminders_by_task.items():
+            self.queue.schedule(task_id, reminders)
+        logger.info(f"通知予定を{len(self.queue)}件読み込みました")
 
-    @tasks.loop(hours=1)  # 1時間ごとにチェック
-    async def check_notifications(self):
+    async def _run(self) -> None:
+        """次の通知時刻まで待機し、期限を迎えた通知を送るループ"""
+        await self.bot.wait_until_ready()
+        await self.seed()
+        # 停止中に通知時刻を過ぎた通知（キューには読み込まない古いものも含む）を先に送る
         try:
-            print("通知チェック開始")  # デバッグ用
-            now = datetime.now()
-            # 現在時刻を時間単位に丸める（分以下を0にする）
-            now = now.replace(minute=0, second=0, microsecond=0)
-
-            async with AsyncSessionLocal() as session:
-                # 未完了のタスクを取得
-                query = select(Task).where(
-                    Task.status == TaskStatus.PENDING,
-                )
-                result = await session.execute(query)
-                tasks: List[Task] = result.scalars().all()
-
-                for task in tasks:
-                    print(f"タスク: {task.title}, 通知タイミング: {task.notification_times}, 通知済: {task.notified_times}")  # デバッグ用
-                    for minutes in task.notification_times:
-                        notify_at = task.deadline - timedelta(minutes=minutes)
-                        # 通知時刻を時間単位に丸める
-                        notify_at = notify_at.replace(minute=0, second=0, microsecond=0)
-                        print(f"通知予定時刻: {notify_at}, 現在時刻: {now}")  # デバッグ用
-
-                        # 通知時刻が現在時刻と一致し、まだ通知していない場合
-                        if notify_at == now and minutes not in task.notified_times:
-                            print("通知送信処理に入る")  # デバッグ用
-                            # 通知を送信
-                            channel = self.bot.get_channel(int(task.channel_id))
-                            if channel:
-                                time_str = (
-                                    f"{minutes // 1440}日"
-                                    if minutes >= 1440
-                                    else f"{minutes // 60}時間"
-                                )
-                                
-                                embed = discord.Embed(
-                                    title="タスク通知",
-                                    description=f"タスク「{task.title}」の期限まであと{time_str}です",
-                                    color=discord.Color.yellow(),
-                                )
-                                embed.add_field(name="ID", value=task.short_id, inline=True)
-                                embed.add_field(
-                                    name="担当者", value=f"<@{task.assigned_to}>", inline=True
-                                )
-                                embed.add_field(
-                                    name="締切",
-                                    value=task.deadline.strftime("%Y-%m-%d %H:%M"),
-                                    inline=True,
-                                )
-                                
-                                await channel.send(
-                                    content=f"<@{task.assigned_to}>",
-                                    embed=embed,
-                                )
-                                print("通知送信完了")  # デバッグ用
-                                # 通知済みとしてマーク
-                                task.notified_times.append(minutes)
-                                await session.commit()
+            await self.check_notifications()
         except Exception as e:
-            print(f"通知チェックで例外発生: {e}")
+            logger.error(f"通知チェックで例外発生: {e}")
+        while True:
+            # 待機中に登録された、より早い通知で起こしてもらう
+            self._wakeup.clear()
+            next_due = self.queue.next_due()
+            timeout = MAX_SLEEP_SECONDS
+            if next_due is not None:
+                timeout = min(timeout, (next_due - utcnow()).total_seconds())
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                await self.check_notifications()
+            except Exception as e:
+                logger.error(f"通知チェックで例外発生: {e}")
+
+    async def check_notifications(self) -> None:
+        """通知時刻を迎えた未送信の通知をアウトボックスに登録する
+
+        送信はアウトボックスのディスパッチャーが行う。登録と送信済みの記録は
+        同じトランザクションで行うため、途中で停止しても通知が失われたり重複したりしない。
+        """
+        now = utcnow()
+        # キューは起床時刻の管理にだけ使い、送信対象はDBの未送信行から決める
+        self.queue.pop_due(now)
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(due_reminders_query(now, self.scope))
+            rows = result.all()
+            reminder_ids = [reminder.id for reminder, _ in rows]
+            sendable, skipped = select_reminders_to_send(rows, now)
+            if skipped:
+                # 送らない通知も送信済みにし、次回以降に拾い直さないようにする
+                logger.warning(
+                    f"遅れた通知{len(skipped)}件を送らずに送信済みにしました"
+                    f"（締切を過ぎた、または同じタスクの新しい通知で代わりに送る）"
+                )
+            by_channel: Dict[int, List[Tuple[TaskReminder, Task]]] = {}
+            for reminder, task in sendable:
+                by_channel.setdefault(task.channel_id, []).append((reminder, task))
+
+            messages: List[OutgoingMessage] = []
+            for rows in by_channel.values():
+                # 同じチャンネルで一度に期限を迎えた通知が多い場合は、まとめて送る
+                threshold = settings.REMINDER_DIGEST_THRESHOLD
+                if threshold and len(rows) >= threshold:
+                    messages.extend(build_reminder_digest(rows, now))
+                else:
+                    messages.extend(
+                        build_reminder_message(task, reminder, now) for reminder, task in rows
+                    )
+            await enqueue(session, messages)
+            await mark_reminders_sent(session, reminder_ids, now)
+
+        outbox = getattr(self.bot, "outbox", None)
+        if reminder_ids and outbox:
+            outbox.wake()
+
+
+def is_late(reminder: TaskReminder, now: datetime) -> bool:
+    """通知時刻から REMINDER_GRACE 以上遅れているか"""
+    return reminder.due_at < now - REMINDER_GRACE
+
+
+def select_reminders_to_send(
+    rows: List[Tuple[TaskReminder, Task]], now: datetime
+) -> Tuple[List[Tuple[TaskReminder, Task]], List[Tuple[TaskReminder, Task]]]:
+    """期限を迎えた通知を、送るものと送らないものに分ける
+
+    遅れた通知は、締切をすでに過ぎていれば送らない。締切前なら遅れた旨を添えて送るが、
+    同じタスクの遅れた通知が複数あれば最も締切に近いもの（通知タイミングの短いもの）だけを送る。
+    """
+    sendable: List[Tuple[TaskReminder, Task]] = []
+    skipped: List[Tuple[TaskReminder, Task]] = []
+    latest_late: Dict[int, Tuple[TaskReminder, Task]] = {}
+    for reminder, task in rows:
+        if not is_late(reminder, now):
+            sendable.append((reminder, task))
+        elif task.deadline <= now:
+            skipped.append((reminder, task))
+        else:
+            current = latest_late.get(task.id)
+            if current is None or reminder.offset_minutes < current[0].offset_minutes:
+                if current is not None:
+                    skipped.append(current)
+                latest_late[task.id] = (reminder, task)
+            else:
+                skipped.append((reminder, task))
+    sendable.extend(latest_late.values())
+    return sendable, skipped
+
+
+def remaining_minutes(task: Task, reminder: TaskReminder, now: datetime) -> int:
+    """通知に表示する締切までの時間（遅れて送る場合は実際の残り時間）"""
+    if is_late(reminder, now):
+        return max(0, int((task.deadline - now).total_seconds() // 60))
+    return reminder.offset_minutes
+
+
+def late_note(reminder: TaskReminder, now: datetime) -> str:
+    """遅れて送る通知に添える注記（遅れていなければ空）"""
+    if not is_late(reminder, now):
+        return ""
+    return f"（{format_jst(reminder.due_at)} の通知を遅れて送信しています）"
+
+
+def build_reminder_message(task: Task, reminder: TaskReminder, now: datetime) -> OutgoingMessage:
+    """通知をアウトボックスに登録する形にする"""
+    embed = build_reminder_embed(task, remaining_minutes(task, reminder, now))
+    note = late_note(reminder, now)
+    if note:
+        embed.set_footer(text=note)
+    return OutgoingMessage(
+        guild_id=task.guild_id,
+        channel_id=task.channel_id,
+        priority=OutboxPriority.REMINDER,
+        idempotency_key=f"reminder:{reminder.id}",
+        content=f"<@{task.assigned_to}>",
+        embeds=[embed],
+    )
+
+
+def build_reminder_digest(
+    rows: List[Tuple[TaskReminder, Task]], now: datetime
+) -> List[OutgoingMessage]:
+    """同じチャンネルの通知を、できるだけ少ないメッセージにまとめる（担当者のメンションは1回ずつ）"""
+    rows = sorted(rows, key=lambda row: (row[1].deadline, row[1].id))
+    entries = [
+        DigestEntry(
+            name=f"{task.short_id} {task.title}",
+            value=(
+                f"担当: <@{task.assigned_to}> / 締切: {format_jst(task.deadline)}"
+                f" / あと{format_remaining(remaining_minutes(task, reminder, now))}"
+                f"{late_note(reminder, now)}"
+            ),
+            mentions=(task.assigned_to,),
+        )
+        for reminder, task in rows
+    ]
+    pages = pack_digest(
+        f"タスク通知（{len(rows)}件）",
+        entries,
+        color=discord.Color.yellow(),
+        header="期限が近いタスクがあります",
+    )
+    # 含まれる通知の組み合わせからキーを作る（再実行しても同じキーになる）
+    reminder_ids = ",".join(
+        str(reminder.id) for reminder, _ in sorted(rows, key=lambda row: row[0].id)
+    )
+    digest = hashlib.sha256(reminder_ids.encode()).hexdigest()[:32]
+    task = rows[0][1]
+    return [
+        OutgoingMessage(
+            guild_id=task.guild_id,
+            channel_id=task.channel_id,
+            priority=OutboxPriority.REMINDER,
+            idempotency_key=f"reminder-digest:{digest}:{number}",
+            content=page.content,
+            embeds=page.embeds,
+        )
+        for number, page in enumerate(pages)
+    ]
+
+
+async def mark_reminders_sent(session, reminder_ids: List[int], sent_at: datetime) -> None:
+    """送信済み（アウトボックスに登録済み）の通知をまとめて記録する
+
+    一定件数ごとに1つのUPDATEを発行し、コミットは最後に1回だけ行う。
+    """
+    if not reminder_ids:
+        return
+    for start in range(0, len(reminder_ids), REMINDER_WRITE_CHUNK_SIZE):
+        chunk = reminder_ids[start:start + REMINDER_WRITE_CHUNK_SIZE]
+        await session.execute(
+            update(TaskReminder)
+            .where(TaskReminder.id.in_(chunk), TaskReminder.sent_at.is_(None))
+            .values(sent_at=sent_at)
+        )
+    await session.commit()
+
+
+def pending_reminders_query(
+    not_before: datetime, scope: Optional[ShardScope] = None
+) -> Select:
+    """起動時にキューへ読み込む、未送信の通知予定を取得するクエリ"""
+    query = (
+        select(TaskReminder.task_id, TaskReminder.offset_minutes, TaskReminder.due_at)
+        .join(Task)
+        .where(
+            TaskReminder.sent_at.is_(None),
+            TaskReminder.due_at >= not_before,
+            Task.status == TaskStatus.PENDING,
+        )
+    )
+    if scope:
+        query = query.where(scope.clause(Task.guild_id))
+    return query
+
+
+def due_reminders_query(now: datetime, scope: Optional[ShardScope] = None) -> Select:
+    """通知時刻を迎えた未送信の通知と、そのタスクを取得するクエリ"""
+    query = (
+        select(TaskReminder, Task)
+        .join(Task, TaskReminder.task_id == Task.id)
+        .where(
+            TaskReminder.sent_at.is_(None),
+            TaskReminder.due_at <= now,
+            Task.status == TaskStatus.PENDING,
+        )
+        .order_by(TaskReminder.due_at)
+    )
+    if scope:
+        query = query.where(scope.clause(Task.guild_id))
+    return query
+
+
+def build_reminder_embed(task: Task, minutes: int) -> discord.Embed:
+    """通知用のEmbedを作成する"""
+    time_str = format_remaining(minutes)
+    embed = discord.Embed(
+        title="タスク通知",
+        description=f"タスク「{task.title}」の期限まであと{time_str}です",
+        color=discord.Color.yellow(),
+    )
+    embed.add_field(name="ID", value=task.short_id, inline=True)
+    embed.add_field(name="担当者", value=f"<@{task.assigned_to}>", inline=True)
+    embed.add_field(
+        name="締切",
+        value=format_jst(task.deadline),
+        inline=True,
+    )
+    return embed
+
 
-    @check_notifications.before_loop
-    async def before_check_notifications(self):
-        """Botの準備が完了するまで待機"""
-        await self.bot.wait_until_ready() 
\ No newline at end of file
+def format_remaining(minutes: int) -> str:
+    """通知タイミング（分）を表示用の文字列にする"""
+    if minutes >= 1440:
+        return f"{minutes // 1440}日"
+    if minutes >= 60:
+        return f"{minutes // 60}時間"
+    return f"{minutes}分"
@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import logging
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+import discord
+from sqlalchemy import Update, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from ..config import settings
+from ..db.session import AsyncSessionLocal
+from ..models.base import utcnow
+from ..models.outbox import OutboxMessage, OutboxPriority
+from ..utils.graph_client import TokenBucket
+from ..utils.sharding import ShardScope
+
+logger = logging.getLogger(__name__)
+
+# 送信済み・送信失敗の行を消す間隔と保持期間
+PURGE_INTERVAL = timedelta(hours=1)
+RETENTION = timedelta(days=7)
+# 送信件数などの指標をログへ出力する間隔
+STATS_LOG_INTERVAL = timedelta(minutes=10)
+# Discordのnonceの最大長
+NONCE_MAX_LENGTH = 25
+
+
+@dataclass
+class OutgoingMessage:
+    """アウトボックスに登録するメッセージ"""
+
+    guild_id: int
+    channel_id: int
+    priority: OutboxPriority
+    idempotency_key: str
+    content: Optional[str] = None
+    embeds: list[discord.Embed] = field(default_factory=list)
+
+    def row(self) -> dict:
+        return {
+            "guild_id": self.guild_id,
+            "channel_id": self.channel_id,
+            "priority": int(self.priority),
+            "idempotency_key": self.idempotency_key,
+            "payload": {
+                "content": self.content,
+                "embeds": [embed.to_dict() for embed in self.embeds],
+            },
+        }
+
+
+async def enqueue(session, messages: Sequence[OutgoingMessage]) -> None:
+    """メッセージをアウトボックスに登録する（コミットは呼び出し側の状態の変更と一緒に行う）
+
+    同じキーのメッセージがすでにあれば登録しない。
+    """
+    if not messages:
+        return
+    await session.execute(
+        insert(OutboxMessage)
+        .values([message.row() for message in messages])
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+
+
+def claim_outbox_query(
+    now: datetime, limit: int, scope: Optional[ShardScope] = None
+) -> Update:
+    """送信待ちの行を優先度順に取り出すUPDATE
+
+    他のプロセスが取り出し中の行は飛ばし、取り出した行は処理の期限まで他から見えなくする。
+    期限までに結果が記録されなければ（プロセスの停止など）、再び取り出される。
+    """
+    due = (
+        select(OutboxMessage.id)
+        .where(
+            OutboxMessage.sent_at.is_(None),
+            OutboxMessage.failed_at.is_(None),
+            OutboxMessage.next_attempt_at <= now,
+        )
+        .order_by(OutboxMessage.priority, OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if scope:
+        due = due.where(scope.clause(OutboxMessage.guild_id))
+    return (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due.scalar_subquery()))
+        .values(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+            attempts=OutboxMessage.attempts + 1,
+        )
+        .returning(OutboxMessage)
+    )
+
+
+def message_nonce(idempotency_key: str) -> str:
+    """冪等キーから決まるDiscordのnonce（同じnonceの再送はDiscordが重複として扱う）"""
+    return hashlib.sha256(idempotency_key.encode()).hexdigest()[:NONCE_MAX_LENGTH]
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """送信に失敗した時の再試行までの秒数（指数バックオフ、full jitter）"""
+    ceiling = min(
+        settings.OUTBOX_RETRY_MAX_SECONDS,
+        settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1),
+    )
+    return max(1.0, random.uniform(0, ceiling))
+
+
+class OutboxDispatcher:
+    """アウトボックスのメッセージをDiscordへ送るワーカーの集まり
+
+    取り出し役がDBから送信待ちの行を優先度順に取り出し、ワーカーが並行して送信する。
+    チャンネルごとにレート制限のバケットを持ち、上限に達したチャンネルの行は
+    ワーカーを塞がずにメモリ上で後回しにする（処理の期限を過ぎる待ちの場合だけDBに戻す）。
+    送信はリーダーのプロセスだけが行う。
+
+    配信は少なくとも1回（at-least-once）。送信後、結果を記録する前にプロセスが止まると、
+    処理の期限後に同じ行が再び送られる。冪等キーから作ったnonceを付けて送るため、
+    数分以内の再送はDiscordが重複として捨てるが、それより後の再送は重複しうる。
+    """
+
+    def __init__(self, bot: discord.Client) -> None:
+        self.bot = bot
+        self._queue: asyncio.PriorityQueue[tuple[int, int, OutboxMessage]] = asyncio.PriorityQueue()
+        self._wakeup = asyncio.Event()
+        self._buckets: dict[int, TokenBucket] = {}
+        self._runners: list[asyncio.Task] = []
+        # チャンネルの上限で後回しにし、待ち行列へ戻すのを待っている行
+        self._delayed: set[asyncio.TimerHandle] = set()
+        self._in_flight = 0
+        self._last_purge = 0.0
+        self._last_stats_log = 0.0
+        self._logged_stats: Counter[str] = Counter()
+        self.stats: Counter[str] = Counter()
+
+    @property
+    def scope(self) -> Optional[ShardScope]:
+        return getattr(self.bot, "shard_scope", None)
+
+    def start(self) -> None:
+        if self._runners:
+            return
+        self._runners.append(asyncio.create_task(self._claim_loop()))
+        for _ in range(max(1, settings.OUTBOX_WORKERS)):
+            self._runners.append(asyncio.create_task(self._worker()))
+
+    def stop(self) -> None:
+        """ワーカーを止める（取り出し済みで未送信の行は処理の期限後に再び送られる）"""
+        for runner in self._runners:
+            runner.cancel()
+        self._runners = []
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed = set()
+        self._queue = asyncio.PriorityQueue()
+        self._in_flight = 0
+
+    def wake(self) -> None:
+        """新しいメッセージが登録されたことを知らせる（コミット後に呼ぶ）"""
+        self._wakeup.set()
+
+    async def _claim_loop(self) -> None:
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            claimed = 0
+            try:
+                capacity = (
+                    settings.OUTBOX_WORKERS * 2
+                    - self._queue.qsize()
+                    - self._in_flight
+                    - len(self._delayed)
+                )
+                if capacity > 0:
+                    claimed = await self._claim(capacity)
+                await self._purge_if_due()
+                self._log_stats_if_due()
+            except Exception as e:
+                logger.error(f"アウトボックスの取り出しでエラー発生: {e}")
+            if claimed:
+                # 取り出せた場合は、空きがあるうちに続けて取り出す
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, limit: int) -> int:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(claim_outbox_query(utcnow(), limit, self.scope))
+            messages = list(result.scalars().all())
+            await session.commit()
+        for message in messages:
+            self._queue.put_nowait((message.priority, message.id, message))
+        return len(messages)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, message = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self.deliver(message)
+            except Exception as e:
+                logger.error(f"アウトボックス {message.id} の処理でエラー発生: {e}")
+            finally:
+                self._in_flight -= 1
+                self._wakeup.set()
+
+    def _bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = TokenBucket(
+                settings.OUTBOX_CHANNEL_RATE_PER_SECOND, settings.OUTBOX_CHANNEL_BURST
+            )
+            self._buckets[channel_id] = bucket
+        return bucket
+
+    async def deliver(self, message: OutboxMessage) -> None:
+        """1件送信し、結果を記録する"""
+        bucket = self._bucket(message.channel_id)
+        wait = bucket.try_acquire()
+        if wait > 0:
+            # チャンネルの上限に達している。試行回数には数えずに後回しにする
+            self.stats["deferred"] += 1
+            lease_left = (message.next_attempt_at - utcnow()).total_seconds()
+            if wait < lease_left:
+                # 処理の期限内に送れるなら、DBに戻さずメモリ上で待つ
+                self._requeue_later(message, wait)
+            else:
+                await self._record(message.id, next_attempt_in=wait, attempts=message.attempts - 1)
+            return
+
+        channel = self.bot.get_channel(message.channel_id)
+        if channel is None:
+            await self._record(message.id, failed=True, error="チャンネルが見つかりません")
+            return
+
+        embeds = [discord.Embed.from_dict(embed) for embed in message.payload.get("embeds", [])]
+        try:
+            await channel.send(
+                content=message.payload.get("content"),
+                embeds=embeds,
+                nonce=message_nonce(message.idempotency_key),
+            )
+        except (discord.Forbidden, discord.NotFound) as e:
+            await self._record(message.id, failed=True, error=str(e))
+            return
+        except Exception as e:
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                # チャンネルのレート制限を受けたら、そのチャンネルへの送信を一時停止する
+                bucket.throttle(settings.OUTBOX_RETRY_BASE_SECONDS)
+            if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                await self._record(message.id, failed=True, error=str(e))
+            else:
+                self.stats["retried"] += 1
+                await self._record(
+                    message.id, next_attempt_in=retry_delay_seconds(message.attempts), error=str(e)
+                )
+            return
+
+        self.stats["sent"] += 1
+        await self._record(message.id, sent=True)
+
+    def _requeue_later(self, message: OutboxMessage, delay: float) -> None:
+        """チャンネルのトークンが補充される頃に、行を待ち行列へ戻す"""
+
+        def requeue() -> None:
+            self._delayed.discard(handle)
+            self._queue.put_nowait((message.priority, message.id, message))
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._delayed.add(handle)
+
+    async def _record(
+        self,
+        message_id: int,
+        *,
+        sent: bool = False,
+        failed: bool = False,
+        next_attempt_in: float = 0.0,
+        attempts: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        now = utcnow()
+        values: dict = {"last_error": error}
+        if sent:
+            values["sent_at"] = now
+        elif failed:
+            self.stats["failed"] += 1
+            values["failed_at"] = now
+            logger.warning(f"アウトボックス {message_id} の送信を諦めました: {error}")
+        else:
+            values["next_attempt_at"] = now + timedelta(seconds=next_attempt_in)
+        if attempts is not None:
+            values["attempts"] = attempts
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values)
+            )
+            await session.commit()
+
+    def _log_stats_if_due(self) -> None:
+        """前回から送信・再試行などがあれば、累計と待ち行列の状態をログに出す"""
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time - self._last_stats_log < STATS_LOG_INTERVAL.total_seconds():
+            return
+        self._last_stats_log = loop_time
+        if self.stats == self._logged_stats:
+            return
+        self._logged_stats = self.stats.copy()
+        logger.info(
+            f"アウトボックス: 送信 {self.stats['sent']}件, 再試行 {self.stats['retried']}件, "
+            f"後回し {self.stats['deferred']}件, 失敗 {self.stats['failed']}件 "
+            f"(待機中 {self._queue.qsize()}件, 送信中 {self._in_flight}件)"
+        )
+
+    async def _purge_if_due(self) -> None:
+        """保持期間を過ぎた送信済み・送信失敗の行を消す"""
+        loop_time = asyncio.get_running_loop().time()
+        if loop_time - self._last_purge < PURGE_INTERVAL.total_seconds():
+            return
+        self._last_purge = loop_time
+        cutoff = utcnow() - RETENTION
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(OutboxMessage).where(
+                    or_(OutboxMessage.sent_at < cutoff, OutboxMessage.failed_at < cutoff)
+                )
+            )
+            await session.commit()
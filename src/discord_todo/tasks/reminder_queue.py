@@ -0,0 +1,101 @@
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+
+@dataclass(order=True)
+class ReminderEntry:
+    """ヒープに積む通知予定（通知時刻順に並ぶ）"""
+
+    notify_at: datetime
+    task_id: int
+    minutes: int
+    generation: int = field(compare=False)
+
+
+class ReminderQueue:
+    """次に来る通知時刻を管理する優先度付きキュー
+
+    タスクの更新・削除時はヒープを作り直さず、世代番号で古いエントリを無効化する。
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[ReminderEntry] = []
+        # task_id -> (世代番号, ヒープ内に残っている有効エントリ数)
+        self._tasks: dict[int, Tuple[int, int]] = {}
+        self._live_entries = 0
+        self._next_generation = 0
+
+    def __len__(self) -> int:
+        return self._live_entries
+
+    def schedule(
+        self,
+        task_id: int,
+        reminders: Iterable[Tuple[int, datetime]],
+        not_before: Optional[datetime] = None,
+    ) -> None:
+        """タスクの通知予定（通知タイミング, 通知時刻）を登録する（既存の予定は置き換える）"""
+        self.unschedule(task_id)
+        self._next_generation += 1
+        generation = self._next_generation
+        scheduled = 0
+        for minutes, notify_at in reminders:
+            if not_before is not None and notify_at < not_before:
+                continue
+            heapq.heappush(
+                self._heap, ReminderEntry(notify_at, task_id, minutes, generation)
+            )
+            scheduled += 1
+
+        if scheduled:
+            self._tasks[task_id] = (generation, scheduled)
+            self._live_entries += scheduled
+
+    def unschedule(self, task_id: int) -> None:
+        """タスクの通知予定を取り消す"""
+        removed = self._tasks.pop(task_id, None)
+        if removed is None:
+            return
+        self._live_entries -= removed[1]
+        self._compact()
+
+    def next_due(self) -> Optional[datetime]:
+        """次の通知時刻（予定がなければNone）"""
+        self._drop_stale_head()
+        return self._heap[0].notify_at if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[ReminderEntry]:
+        """現在時刻までに通知時刻を迎えたエントリを取り出す"""
+        due: List[ReminderEntry] = []
+        while True:
+            self._drop_stale_head()
+            if not self._heap or self._heap[0].notify_at > now:
+                break
+            entry = heapq.heappop(self._heap)
+            self._consume(entry)
+            due.append(entry)
+        return due
+
+    def _is_live(self, entry: ReminderEntry) -> bool:
+        state = self._tasks.get(entry.task_id)
+        return state is not None and state[0] == entry.generation
+
+    def _consume(self, entry: ReminderEntry) -> None:
+        generation, remaining = self._tasks[entry.task_id]
+        self._live_entries -= 1
+        if remaining <= 1:
+            del self._tasks[entry.task_id]
+        else:
+            self._tasks[entry.task_id] = (generation, remaining - 1)
+
+    def _drop_stale_head(self) -> None:
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self) -> None:
+        # 無効なエントリが半分を超えたらヒープを作り直す
+        if len(self._heap) > 64 and len(self._heap) > 2 * self._live_entries:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db.notify import TASK_CHANGED, notify
+from ..db.session import AsyncSessionLocal
+from ..models.base import utcnow
+from ..models.task import GuildTaskSequence, Task
+
+logger = logging.getLogger(__name__)
+
+
+async def assign_guild_seqs(session: AsyncSession, tasks: Sequence[Task]) -> None:
+    """追加するタスクにギルド内の通し番号を振る（コミットは呼び出し側で行う）
+
+    番号はギルドごとの行を1回のUPSERTで進めて払い出すため、
+    複数のプロセスが同時に追加しても重複しない（行ロックはコミットまで保持される）。
+    """
+    by_guild: dict[int, list[Task]] = {}
+    for task in tasks:
+        by_guild.setdefault(task.guild_id, []).append(task)
+    # ギルドの順番を揃えてデッドロックを避ける
+    for guild_id in sorted(by_guild):
+        guild_tasks = by_guild[guild_id]
+        count = len(guild_tasks)
+        last_seq = await session.scalar(
+            insert(GuildTaskSequence)
+            .values(guild_id=guild_id, last_seq=count)
+            .on_conflict_do_update(
+                index_elements=["guild_id"],
+                set_={"last_seq": GuildTaskSequence.last_seq + count, "updated_at": utcnow()},
+            )
+            .returning(GuildTaskSequence.last_seq)
+        )
+        for offset, task in enumerate(guild_tasks):
+            task.guild_seq = last_seq - count + 1 + offset
+
+
+class TaskWriter:
+    """タスクの追加をまとめてDBに書き込むクラス（ライトビハインド）
+
+    短い間隔で続いた追加を1つのトランザクションにまとめて INSERT する。
+    まとめた書き込みが失敗した場合は、1件ずつ書き込み直して失敗したものだけを呼び出し元に返す。
+    """
+
+    def __init__(self) -> None:
+        self._pending: list[tuple[Task, asyncio.Future]] = []
+        self._flush_scheduled: Optional[asyncio.TimerHandle] = None
+        self._flushing: set[asyncio.Task] = set()
+
+    async def add(self, task: Task) -> Task:
+        """タスクを書き込み待ちに加え、コミットされるまで待つ"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((task, future))
+        if len(self._pending) >= settings.TASK_WRITE_BATCH_SIZE:
+            self._start_flush()
+        elif self._flush_scheduled is None:
+            self._flush_scheduled = asyncio.get_running_loop().call_later(
+                settings.TASK_WRITE_BATCH_SECONDS, self._start_flush
+            )
+        return await future
+
+    async def close(self) -> None:
+        """書き込み待ちのタスクをすべて書き込む（終了時）"""
+        self._start_flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _start_flush(self) -> None:
+        if self._flush_scheduled is not None:
+            self._flush_scheduled.cancel()
+            self._flush_scheduled = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        flush = asyncio.create_task(self._flush(batch))
+        self._flushing.add(flush)
+        flush.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: list[tuple[Task, asyncio.Future]]) -> None:
+        try:
+            await self._write([task for task, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch, e)
+                return
+            logger.warning(f"タスク{len(batch)}件のまとめ書きに失敗したため1件ずつ書き込みます: {e}")
+            for task, _ in batch:
+                self._reset(task)
+            for item in batch:
+                await self._flush([item])
+            return
+        self._resolve(batch)
+
+    async def _write(self, tasks: list[Task]) -> None:
+        async with AsyncSessionLocal() as session:
+            await assign_guild_seqs(session, tasks)
+            session.add_all(tasks)
+            await session.flush()
+            for task in tasks:
+                await notify(
+                    session,
+                    TASK_CHANGED,
+                    {"guild_id": task.guild_id, "task_id": task.id, "guild_seq": task.guild_seq},
+                )
+            await session.commit()
+
+    @staticmethod
+    def _reset(task: Task) -> None:
+        """ロールバックされた書き込みで振られたIDと通し番号を消し、新しく書き込み直せるようにする"""
+        task.id = None
+        task.guild_seq = None
+        for reminder in task.reminders:
+            reminder.id = None
+            reminder.task_id = None
+
+    @staticmethod
+    def _resolve(batch: list[tuple[Task, asyncio.Future]], error: Optional[Exception] = None) -> None:
+        for task, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(task)
+            else:
+                future.set_exception(error)
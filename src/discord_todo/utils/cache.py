@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+# 何回の参照ごとにヒット率をログへ出力するか
+CACHE_LOG_EVERY = 1000
+
+
+class GuildCache(Generic[V]):
+    """ギルドごとに無効化できる、件数上限（LRU）と有効期限付きのキャッシュ
+
+    キーは (ギルドID, 任意のキー) の組。書き込み時はギルド単位でまとめて無効化する。
+    DBから読み込んでいる間に無効化された場合に古い結果を入れないよう、
+    読み込み前に version() を取得し、set() に渡す。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, name: str = "キャッシュ") -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[int, Hashable], tuple[float, V]] = OrderedDict()
+        self._keys_by_guild: dict[int, set[Hashable]] = {}
+        self._versions: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, guild_id: int, key: Hashable) -> Optional[V]:
+        """キャッシュされた値を返す（ない・期限切れの場合はNone）"""
+        entry = self._entries.get((guild_id, key))
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(guild_id, key)
+            self.misses += 1
+            self._log_stats_if_due()
+            return None
+        self._entries.move_to_end((guild_id, key))
+        self.hits += 1
+        self._log_stats_if_due()
+        return entry[1]
+
+    def version(self, guild_id: int) -> int:
+        """ギルドの無効化の世代（読み込み開始時に取得してset()に渡す）"""
+        return self._versions.get(guild_id, 0)
+
+    def set(self, guild_id: int, key: Hashable, value: V, version: int) -> None:
+        """値を保存する（読み込み中にギルドが無効化されていたら保存しない）"""
+        if version != self.version(guild_id):
+            return
+        self._entries[(guild_id, key)] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end((guild_id, key))
+        self._keys_by_guild.setdefault(guild_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            (old_guild_id, old_key), _ = next(iter(self._entries.items()))
+            self._remove(old_guild_id, old_key)
+            self.evictions += 1
+
+    def invalidate(self, guild_id: int) -> None:
+        """ギルドのエントリをすべて破棄する（タスクの追加・完了・削除時）"""
+        self._versions[guild_id] = self.version(guild_id) + 1
+        for key in self._keys_by_guild.pop(guild_id, set()):
+            self._entries.pop((guild_id, key), None)
+
+    def clear(self) -> None:
+        """すべてのエントリを破棄する"""
+        for guild_id in list(self._keys_by_guild):
+            self.invalidate(guild_id)
+
+    def _remove(self, guild_id: int, key: Hashable) -> None:
+        self._entries.pop((guild_id, key), None)
+        keys = self._keys_by_guild.get(guild_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_guild[guild_id]
+
+    def _log_stats_if_due(self) -> None:
+        if (self.hits + self.misses) % CACHE_LOG_EVERY:
+            return
+        stats = self.stats()
+        logger.info(
+            f"{self.name}: ヒット率 {stats['hit_rate']:.1%} "
+            f"(ヒット {stats['hits']}回, ミス {stats['misses']}回, 追い出し {stats['evictions']}回, "
+            f"{stats['entries']}件/{stats['guilds']}ギルド)"
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        """ヒット・ミス回数などの指標"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "guilds": len(self._keys_by_guild),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+
+import httpx
+
+from .graph_client import GraphClient
+from .http_client import create_http_client
+from .token_manager import TokenManager
+
+
+@dataclass
+class SharedClients:
+    """BotとAPIで共有する外部通信用のクライアント一式
+
+    同じプロセスで両方を動かす場合は1つだけ作成して渡し、
+    HTTPの接続プール・トークンのキャッシュ・Graphのレート制限を共有する。
+    """
+
+    http_client: httpx.AsyncClient
+    token_manager: TokenManager
+    graph_client: GraphClient
+
+    @classmethod
+    def create(cls) -> "SharedClients":
+        http_client = create_http_client()
+        return cls(
+            http_client=http_client,
+            token_manager=TokenManager(http_client),
+            graph_client=GraphClient(http_client),
+        )
+
+    async def aclose(self) -> None:
+        self.token_manager.stop()
+        await self.http_client.aclose()
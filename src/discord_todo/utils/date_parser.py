@@ -1,12 +1,19 @@
 from datetime import datetime
 
+from ..models.base import JST
+
 
 def parse_datetime(date_str: str) -> datetime:
     """
-    文字列からdatetime型に変換する
-    例: "2024-03-20 15:00" → datetime(2024, 3, 20, 15, 0)
+    日本時間の文字列をタイムゾーン付きのdatetime型に変換する
+    例: "2024-03-20 15:00" → datetime(2024, 3, 20, 15, 0, tzinfo=JST)
     """
     try:
-        return datetime.strptime(date_str, "%Y-%m-%d %H:%M")
+        return datetime.strptime(date_str, "%Y-%m-%d %H:%M").replace(tzinfo=JST)
     except ValueError:
-        raise ValueError("日付の形式は 'YYYY-MM-DD HH:MM' で入力してください") 
\ No newline at end of file
+        raise ValueError("日付の形式は 'YYYY-MM-DD HH:MM' で入力してください")
+
+
+def format_jst(dt: datetime) -> str:
+    """タイムゾーン付きの日時を日本時間の表示用文字列にする"""
+    return dt.astimezone(JST).strftime("%Y-%m-%d %H:%M") 
\ No newline at end of file
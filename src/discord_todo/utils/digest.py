@@ -0,0 +1,95 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import discord
+
+# Discordのメッセージ・Embedの上限
+CONTENT_MAX_CHARS = 2000
+MESSAGE_MAX_EMBEDS = 10
+MESSAGE_MAX_EMBED_CHARS = 6000  # 1メッセージ内の全Embedの文字数の合計
+EMBED_MAX_FIELDS = 25
+EMBED_TITLE_MAX_CHARS = 256
+FIELD_NAME_MAX_CHARS = 256
+FIELD_VALUE_MAX_CHARS = 1024
+
+
+@dataclass
+class DigestEntry:
+    """まとめて送る1件分（Embedのフィールド1つ）"""
+
+    name: str
+    value: str
+    # この件でメンションするユーザー（メッセージの本文で1回だけメンションする）
+    mentions: tuple[int, ...] = ()
+
+
+@dataclass
+class DigestPage:
+    """まとめた結果の1メッセージ分"""
+
+    content: Optional[str]
+    embeds: list[discord.Embed] = field(default_factory=list)
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def pack_digest(
+    title: str,
+    entries: Iterable[DigestEntry],
+    color: discord.Color,
+    header: str = "",
+) -> list[DigestPage]:
+    """項目を、Discordの上限内でできるだけ少ないメッセージに詰める
+
+    1つのEmbedにフィールドを最大25個、1メッセージにEmbedを最大10個まで入れ、
+    Embedの文字数の合計は6000、本文は2000文字以内に収める。
+    メンションはそのユーザーの項目が最初に現れたメッセージの本文で1回だけ行う。
+    """
+    title = truncate(title, EMBED_TITLE_MAX_CHARS)
+    pages: list[DigestPage] = []
+    mentioned: set[int] = set()
+    page_mentions: list[int] = []
+    page_chars = 0
+    page: Optional[DigestPage] = None
+
+    def content_for(mentions: list[int]) -> str:
+        parts = [header] if header else []
+        parts.extend(f"<@{user_id}>" for user_id in mentions)
+        return " ".join(parts)
+
+    for entry in entries:
+        name = truncate(entry.name, FIELD_NAME_MAX_CHARS)
+        value = truncate(entry.value, FIELD_VALUE_MAX_CHARS)
+        new_mentions = [
+            user_id for user_id in dict.fromkeys(entry.mentions) if user_id not in mentioned
+        ]
+        size = len(name) + len(value)
+
+        embed = page.embeds[-1] if page else None
+        needs_embed = embed is None or len(embed.fields) >= EMBED_MAX_FIELDS
+        extra = size + (len(title) if needs_embed else 0)
+        fits = (
+            page is not None
+            and page_chars + extra <= MESSAGE_MAX_EMBED_CHARS
+            and not (needs_embed and len(page.embeds) >= MESSAGE_MAX_EMBEDS)
+            and len(content_for(page_mentions + new_mentions)) <= CONTENT_MAX_CHARS
+        )
+        if not fits:
+            page = DigestPage(content=None)
+            pages.append(page)
+            page_mentions = []
+            page_chars = 0
+            needs_embed = True
+        if needs_embed:
+            page.embeds.append(discord.Embed(title=title, color=color))
+            page_chars += len(title)
+
+        page.embeds[-1].add_field(name=name, value=value, inline=False)
+        page_chars += size
+        page_mentions.extend(new_mentions)
+        mentioned.update(new_mentions)
+        page.content = content_for(page_mentions) or None
+
+    return pages
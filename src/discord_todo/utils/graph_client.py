@@ -0,0 +1,237 @@
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+import httpx
+from fastapi import Request
+
+from ..config import settings
+
+# スロットリングとして扱い、待ってから再試行するステータス
+RETRYABLE_STATUSES = {429, 503, 504}
+# スロットリングを受けた時にテナントの送信レートを下げる倍率と、その下限（基準レート比）
+THROTTLE_RATE_FACTOR = 0.5
+MIN_RATE_RATIO = 0.1
+# 成功した応答1回ごとに基準レートへ戻す割合
+RECOVERY_RATE_RATIO = 0.05
+
+
+class GraphThrottledError(Exception):
+    """再試行してもスロットリングが解けなかったことを表す例外"""
+
+    def __init__(self, retry_after: float, message: str = "") -> None:
+        super().__init__(message or f"Graph APIのスロットリングが続いています（{retry_after:.0f}秒後に再試行）")
+        self.retry_after = retry_after
+
+
+class GraphRequestError(Exception):
+    """Graph APIがエラーを返したことを表す例外（再試行した後の応答）"""
+
+    def __init__(self, status_code: int, body: str) -> None:
+        super().__init__(f"Graph APIがエラーを返しました（{status_code}）: {body[:200]}")
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """送信レートを制限するトークンバケット
+
+    待機は到着順に1つずつ処理する。スロットリングを受けたら一時停止と減速を行い、
+    成功が続くと基準レートまで少しずつ戻す。
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """トークンを1つ取得する（なければ補充されるまで待つ）"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def try_acquire(self) -> float:
+        """待たずにトークンを取得する（取得できたら0、できなければ取得できるまでの秒数）"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def throttle(self, pause_seconds: float) -> None:
+        """スロットリングを受けた時の一時停止と減速"""
+        now = time.monotonic()
+        self._refill(now)
+        self._paused_until = max(self._paused_until, now + pause_seconds)
+        self.rate = max(self.base_rate * MIN_RATE_RATIO, self.rate * THROTTLE_RATE_FACTOR)
+
+    def recover(self) -> None:
+        """成功した応答ごとにレートを基準値へ戻していく"""
+        if self.rate < self.base_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_RATE_RATIO)
+
+
+def tenant_of(access_token: str) -> str:
+    """アクセストークン（JWT）のtidクレームからテナントIDを取り出す
+
+    個人用アカウントのトークンはJWTではないため、その場合は設定のテナントにまとめる。
+    署名は検証しない（レート制限の振り分けにだけ使う）。
+    """
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        tenant_id = json.loads(base64.urlsafe_b64decode(payload)).get("tid")
+    except (IndexError, ValueError, AttributeError):
+        tenant_id = None
+    return tenant_id or settings.MICROSOFT_TENANT_ID or "common"
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Retry-Afterヘッダー（秒数またはHTTP日付）を秒数に変換"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int) -> float:
+    """ジッター付き指数バックオフの待ち時間（Full Jitter）"""
+    ceiling = min(
+        settings.GRAPH_BACKOFF_MAX_SECONDS, settings.GRAPH_BACKOFF_BASE_SECONDS * 2 ** attempt
+    )
+    return random.uniform(0, ceiling)
+
+
+class GraphClient:
+    """Microsoft Graph へのリクエストをレート制限付きで送るクラス
+
+    アプリ全体とテナントごとのトークンバケットで送信レートを抑え、
+    429/503を受けたらRetry-After（なければジッター付き指数バックオフ）だけ待って再試行する。
+    スロットリングを受けたテナントは一時停止・減速するため、大きな同期でも
+    まとめて失敗せずに全体がなめらかに遅くなる。
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        self.http_client = http_client
+        self._app_bucket = TokenBucket(
+            settings.GRAPH_APP_RATE_PER_SECOND, settings.GRAPH_APP_BURST
+        )
+        self._tenant_buckets: dict[str, TokenBucket] = {}
+        # バケットの空きを待っているリクエスト数
+        self.queue_depth = 0
+        self.counters: Counter[str] = Counter()
+
+    def _tenant_bucket(self, tenant_id: str) -> TokenBucket:
+        bucket = self._tenant_buckets.get(tenant_id)
+        if bucket is None:
+            bucket = TokenBucket(
+                settings.GRAPH_TENANT_RATE_PER_SECOND, settings.GRAPH_TENANT_BURST
+            )
+            self._tenant_buckets[tenant_id] = bucket
+        return bucket
+
+    async def request(
+        self, method: str, url: str, access_token: str, **kwargs: Any
+    ) -> httpx.Response:
+        """Graph APIにリクエストを送る（スロットリング時は待って再試行する）
+
+        Retry-Afterが長すぎる、または再試行回数を使い切った場合はGraphThrottledErrorを送出する。
+        それ以外の応答はステータスに関わらずそのまま返す。
+        """
+        headers = {**kwargs.pop("headers", {}), "Authorization": f"Bearer {access_token}"}
+        tenant_bucket = self._tenant_bucket(tenant_of(access_token))
+
+        for attempt in range(settings.GRAPH_MAX_RETRIES + 1):
+            self.queue_depth += 1
+            try:
+                # 制限の厳しいテナント側を先に待ち、アプリ全体の枠を無駄にしない
+                await tenant_bucket.acquire()
+                await self._app_bucket.acquire()
+            finally:
+                self.queue_depth -= 1
+
+            self.counters["requests"] += 1
+            response = await self.http_client.request(method, url, headers=headers, **kwargs)
+            if response.status_code not in RETRYABLE_STATUSES:
+                tenant_bucket.recover()
+                return response
+
+            self.counters["throttled"] += 1
+            retry_after = parse_retry_after(response)
+            delay = backoff_delay(attempt) if retry_after is None else retry_after
+            tenant_bucket.throttle(delay)
+            if delay > settings.GRAPH_MAX_RETRY_AFTER_SECONDS or attempt == settings.GRAPH_MAX_RETRIES:
+                break
+            self.counters["retries"] += 1
+            # 同じテナントの他のリクエストもバケットの一時停止で待たされる
+            await asyncio.sleep(delay * random.uniform(1.0, 1.1))
+
+        self.counters["gave_up"] += 1
+        raise GraphThrottledError(delay)
+
+    async def get(self, url: str, access_token: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, access_token, **kwargs)
+
+    async def post(self, url: str, access_token: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, access_token, **kwargs)
+
+    async def patch(self, url: str, access_token: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, access_token, **kwargs)
+
+    async def delete(self, url: str, access_token: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("DELETE", url, access_token, **kwargs)
+
+    def stats(self) -> dict[str, float]:
+        """キュー長とスロットリング回数などの指標"""
+        throttled_tenants = sum(
+            1 for bucket in self._tenant_buckets.values() if bucket.rate < bucket.base_rate
+        )
+        return {
+            "queue_depth": self.queue_depth,
+            "requests": self.counters["requests"],
+            "throttled": self.counters["throttled"],
+            "retries": self.counters["retries"],
+            "gave_up": self.counters["gave_up"],
+            "throttled_tenants": throttled_tenants,
+        }
+
+
+def get_graph_client(request: Request) -> GraphClient:
+    """FastAPI用のGraphクライアント依存関係"""
+    return request.app.state.graph_client
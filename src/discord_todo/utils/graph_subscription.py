@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from ..config import settings
+from ..models.base import utcnow
+from ..models.mail import MailConnection
+from .graph_client import GraphClient
+
+# 受信トレイへの新着メールを購読する
+SUBSCRIPTION_RESOURCE = "me/mailFolders('Inbox')/messages"
+
+
+class SubscriptionError(Exception):
+    """変更通知の購読の作成・更新に失敗したことを表す例外"""
+
+
+def push_enabled() -> bool:
+    """変更通知（プッシュ）を使う設定になっているか"""
+    return bool(settings.MAIL_WEBHOOK_URL and settings.MAIL_WEBHOOK_CLIENT_STATE)
+
+
+def _expiration() -> datetime:
+    return utcnow() + timedelta(
+        minutes=settings.MAIL_SUBSCRIPTION_LIFETIME_MINUTES
+    )
+
+
+def _parse_expiration(value: str) -> datetime:
+    """GraphのexpirationDateTimeをタイムゾーン付きのdatetimeに変換"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def ensure_subscription(
+    connection: MailConnection, access_token: str, graph: GraphClient
+) -> None:
+    """連携の購読を作成、または期限を延長する（コミットは呼び出し側で行う）"""
+    expiration = _expiration().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    if connection.subscription_id:
+        response = await graph.patch(
+            f"{settings.GRAPH_BASE_URL}/subscriptions/{connection.subscription_id}",
+            access_token,
+            json={"expirationDateTime": expiration},
+        )
+        if response.status_code == 200:
+            connection.subscription_expires_at = _parse_expiration(
+                response.json()["expirationDateTime"]
+            )
+            return
+        if response.status_code != 404:
+            raise SubscriptionError(f"購読の更新に失敗: {response.text}")
+        # 期限切れなどで購読が消えていた場合は作り直す
+
+    response = await graph.post(
+        f"{settings.GRAPH_BASE_URL}/subscriptions",
+        access_token,
+        json={
+            "changeType": "created",
+            "notificationUrl": settings.MAIL_WEBHOOK_URL,
+            "lifecycleNotificationUrl": settings.MAIL_WEBHOOK_URL,
+            "resource": SUBSCRIPTION_RESOURCE,
+            "expirationDateTime": expiration,
+            "clientState": settings.MAIL_WEBHOOK_CLIENT_STATE,
+        },
+    )
+    if response.status_code != 201:
+        raise SubscriptionError(f"購読の作成に失敗: {response.text}")
+
+    data = response.json()
+    connection.subscription_id = data["id"]
+    connection.subscription_expires_at = _parse_expiration(data["expirationDateTime"])
+
+
+async def delete_subscription(
+    connection: MailConnection, access_token: str, graph: GraphClient
+) -> None:
+    """連携の購読を削除する（連携解除時）"""
+    if not connection.subscription_id:
+        return
+    response = await graph.delete(
+        f"{settings.GRAPH_BASE_URL}/subscriptions/{connection.subscription_id}",
+        access_token,
+    )
+    if response.status_code not in (204, 404):
+        raise SubscriptionError(f"購読の削除に失敗: {response.text}")
+    connection.subscription_id = None
+    connection.subscription_expires_at = None
@@ -0,0 +1,32 @@
+import importlib.util
+
+import httpx
+from fastapi import Request
+
+from ..config import settings
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Microsoft Graph / OAuth 通信で共有するHTTPクライアントを作成
+
+    接続をキープアライブで使い回し、リクエストごとのTCP+TLSハンドシェイクを避ける。
+    HTTP/2は h2 パッケージがある場合のみ有効にする。
+    """
+    http2 = settings.HTTP_HTTP2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.HTTP_TIMEOUT_SECONDS,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """FastAPI用の共有HTTPクライアント依存関係"""
+    return request.app.state.http_client
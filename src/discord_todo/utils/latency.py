@@ -0,0 +1,53 @@
+import logging
+import math
+from collections import deque
+
+import discord
+
+from ..models.base import utcnow
+
+logger = logging.getLogger(__name__)
+
+# 直近何件の応答時間から分位数を計算するか
+LATENCY_WINDOW = 1000
+# 何件ごとにログへ出力するか
+LATENCY_LOG_EVERY = 100
+
+
+class LatencyTracker:
+    """スラッシュコマンドに応答（defer含む）するまでの時間を記録するクラス
+
+    インタラクションの作成時刻（DiscordのID）から応答までを測るので、
+    ゲートウェイの遅延も含めてDiscordの3秒の期限と比べられる。
+    """
+
+    def __init__(self, name: str, window: int = LATENCY_WINDOW) -> None:
+        self.name = name
+        self._samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, interaction: discord.Interaction) -> None:
+        """応答した直後に呼ぶ"""
+        elapsed = max(0.0, (utcnow() - interaction.created_at).total_seconds())
+        self._samples.append(elapsed)
+        self.count += 1
+        if self.count % LATENCY_LOG_EVERY == 0:
+            logger.info(
+                f"{self.name}: p50 {self.percentile(50) * 1000:.0f}ms, "
+                f"p99 {self.percentile(99) * 1000:.0f}ms (直近{len(self._samples)}件)"
+            )
+
+    def percentile(self, q: float) -> float:
+        """直近の応答時間の分位数（秒、最近傍法）"""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
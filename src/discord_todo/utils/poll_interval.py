@@ -0,0 +1,65 @@
+import random
+from dataclasses import dataclass
+
+# 到着率（件/時）の指数移動平均の重み
+RATE_SMOOTHING = 0.3
+# 新着がなかった時に間隔を伸ばす倍率
+EMPTY_BACKOFF_FACTOR = 1.5
+# 1回のポーリングで平均何件のメールを拾う間隔にするか
+TARGET_MAILS_PER_POLL = 1.0
+# 失敗した連携の再試行時刻を散らす幅（±10%）
+FAILURE_JITTER = 0.1
+# バックオフの倍率（2のべき乗）の指数の上限（失敗が続いても計算があふれないようにする）
+FAILURE_BACKOFF_MAX_EXPONENT = 32
+
+
+@dataclass
+class PollState:
+    """連携ごとのポーリング状態"""
+
+    interval_minutes: float
+    empty_streak: int
+    arrival_rate: float  # 件/時
+
+
+def next_poll_state(
+    state: PollState,
+    new_mail_count: int,
+    elapsed_minutes: float,
+    min_minutes: float,
+    max_minutes: float,
+) -> PollState:
+    """直近の取得結果から次のポーリング間隔を決める
+
+    新着があれば到着率から「1回で約1件拾える」間隔に縮め、
+    空振りが続くほど間隔を伸ばす。いずれも[min_minutes, max_minutes]に収める。
+    """
+    elapsed_hours = max(elapsed_minutes, min_minutes) / 60
+    observed_rate = new_mail_count / elapsed_hours
+    arrival_rate = RATE_SMOOTHING * observed_rate + (1 - RATE_SMOOTHING) * state.arrival_rate
+
+    if new_mail_count > 0:
+        empty_streak = 0
+        interval = 60 * TARGET_MAILS_PER_POLL / arrival_rate
+    else:
+        empty_streak = state.empty_streak + 1
+        interval = state.interval_minutes * EMPTY_BACKOFF_FACTOR
+        if arrival_rate > 0:
+            # 空振りでも、到着率から見込まれる間隔よりは短くしない
+            interval = max(interval, 60 * TARGET_MAILS_PER_POLL / arrival_rate)
+
+    interval = min(max(interval, min_minutes), max_minutes)
+    return PollState(interval, empty_streak, arrival_rate)
+
+
+def failure_backoff_minutes(
+    consecutive_failures: int, base_minutes: float, max_minutes: float
+) -> float:
+    """連続失敗回数に応じた再試行までの待ち時間（指数バックオフ）
+
+    障害の復旧直後に失敗していた連携が一斉に再試行しないよう、少しずらす。
+    """
+    exponent = min(max(consecutive_failures - 1, 0), FAILURE_BACKOFF_MAX_EXPONENT)
+    backoff = base_minutes * 2 ** exponent
+    backoff *= random.uniform(1 - FAILURE_JITTER, 1 + FAILURE_JITTER)
+    return min(backoff, max_minutes)
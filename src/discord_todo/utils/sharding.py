@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import ColumnElement, func
+
+from ..config import settings
+
+# DiscordのIDのうちタイムスタンプ部分の開始ビット（シャードの割り当てに使う）
+SNOWFLAKE_TIMESTAMP_SHIFT = 22
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    """ギルドを担当するシャード番号（Discordの割り当て規則と同じ）"""
+    return (guild_id >> SNOWFLAKE_TIMESTAMP_SHIFT) % shard_count
+
+
+@dataclass(frozen=True)
+class ShardScope:
+    """このプロセスが担当するシャードの範囲
+
+    スケジューラーは担当シャードのギルドだけを処理する。
+    シャードをプロセスに分けて増やすと、処理量もそれに比例して分散される。
+    """
+
+    shard_ids: tuple[int, ...]
+    shard_count: int
+
+    @classmethod
+    def from_settings(cls) -> Optional["ShardScope"]:
+        """設定からシャードの範囲を作る（シャーディングしない場合はNone）"""
+        if not settings.DISCORD_SHARD_COUNT:
+            return None
+        shard_ids = settings.DISCORD_SHARD_IDS or range(settings.DISCORD_SHARD_COUNT)
+        return cls(tuple(sorted(shard_ids)), settings.DISCORD_SHARD_COUNT)
+
+    @property
+    def key(self) -> str:
+        """範囲を表す文字列（リーダー選出のロック名などに使う）"""
+        return f"{self.shard_count}:{','.join(map(str, self.shard_ids))}"
+
+    def owns(self, guild_id: int) -> bool:
+        return shard_id_for(guild_id, self.shard_count) in self.shard_ids
+
+    def clause(self, guild_id_column) -> ColumnElement[bool]:
+        """ギルドIDの列が担当シャードに含まれる条件"""
+        shard = func.mod(guild_id_column.op(">>")(SNOWFLAKE_TIMESTAMP_SHIFT), self.shard_count)
+        return shard.in_(self.shard_ids)
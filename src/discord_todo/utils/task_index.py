@@ -0,0 +1,222 @@
+import bisect
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from ..db.session import AsyncSessionLocal
+from ..models.task import Task, TaskStatus
+
+# 候補の最大件数（Discordのオートコンプリートは25件まで）
+MAX_CHOICES = 25
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class IndexedTask:
+    """オートコンプリート用に保持するタスクの情報"""
+
+    guild_seq: int
+    title: str
+    status: TaskStatus
+    assigned_to: int
+    deadline: datetime
+
+    @classmethod
+    def from_task(cls, task: Task) -> "IndexedTask":
+        return cls(task.guild_seq, task.title, task.status, task.assigned_to, task.deadline)
+
+
+INDEXED_COLUMNS = (Task.guild_seq, Task.title, Task.status, Task.assigned_to, Task.deadline)
+
+
+async def load_guild_tasks(guild_id: int) -> list[IndexedTask]:
+    """ギルドのタスクをインデックスに必要な列だけ読み込む"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(*INDEXED_COLUMNS).where(Task.guild_id == guild_id))
+        return [IndexedTask(*row) for row in result]
+
+
+def tokens_of(entry: IndexedTask) -> set[str]:
+    """前方一致で引く語（番号と、タイトル全体・タイトル中の単語）"""
+    title = entry.title.lower()
+    return {str(entry.guild_seq), title, *TOKEN_PATTERN.findall(title)}
+
+
+class GuildTaskIndex:
+    """1つのギルドのタスクの前方一致インデックス
+
+    (語, 番号) のソート済みリストを二分探索するので、キー入力ごとにDBを引かずに候補を返せる。
+    日本語のタイトルは単語に分かれないため、前方一致で足りない分はタイトルの部分一致で補う。
+    """
+
+    def __init__(self, tasks: Iterable[IndexedTask] = ()) -> None:
+        self.tasks: dict[int, IndexedTask] = {}
+        self._tokens: list[tuple[str, int]] = []
+        for task in tasks:
+            self.upsert(task)
+
+    def upsert(self, entry: IndexedTask) -> None:
+        self.remove(entry.guild_seq)
+        self.tasks[entry.guild_seq] = entry
+        for token in tokens_of(entry):
+            bisect.insort(self._tokens, (token, entry.guild_seq))
+
+    def remove(self, guild_seq: int) -> None:
+        entry = self.tasks.pop(guild_seq, None)
+        if entry is None:
+            return
+        for token in tokens_of(entry):
+            index = bisect.bisect_left(self._tokens, (token, guild_seq))
+            if index < len(self._tokens) and self._tokens[index] == (token, guild_seq):
+                del self._tokens[index]
+
+    def search(
+        self, query: str, status: Optional[TaskStatus] = None, limit: int = MAX_CHOICES
+    ) -> list[IndexedTask]:
+        """番号・タイトルが入力に一致するタスク（番号の完全一致、前方一致、部分一致の順）"""
+        query = query.strip().lstrip("#").lower()
+
+        def wanted(entry: IndexedTask) -> bool:
+            return status is None or entry.status == status
+
+        if not query:
+            # 未入力なら締切の近い順
+            entries = sorted(filter(wanted, self.tasks.values()), key=lambda e: e.deadline)
+            return entries[:limit]
+
+        found: dict[int, IndexedTask] = {}
+        exact = self.tasks.get(int(query)) if query.isdigit() else None
+        if exact and wanted(exact):
+            found[exact.guild_seq] = exact
+
+        prefixed = []
+        for position in range(bisect.bisect_left(self._tokens, (query, -1)), len(self._tokens)):
+            token, guild_seq = self._tokens[position]
+            if not token.startswith(query):
+                break
+            entry = self.tasks[guild_seq]
+            if guild_seq not in found and wanted(entry):
+                prefixed.append(entry)
+        for entry in sorted(prefixed, key=lambda e: e.deadline):
+            found.setdefault(entry.guild_seq, entry)
+
+        if len(found) < limit:
+            for entry in sorted(self.tasks.values(), key=lambda e: e.deadline):
+                if entry.guild_seq not in found and wanted(entry) and query in entry.title.lower():
+                    found[entry.guild_seq] = entry
+                    if len(found) >= limit:
+                        break
+        return list(found.values())[:limit]
+
+
+class TaskIndex:
+    """ギルドごとのタスクのインデックス（初めて使われた時にDBから読み込む）
+
+    GuildCache と同じく保持するギルド数の上限（LRU）と有効期限を持ち、
+    追い出された・期限切れのギルドは次に使う時に読み込み直す。
+    読み込み中に反映されなかった変更で古い内容を残さないよう、
+    ギルドごとの変更の世代を読み込みの前後で比べ、変わっていれば登録しない。
+    """
+
+    def __init__(self, max_guilds: int, ttl_seconds: float) -> None:
+        self.max_guilds = max_guilds
+        self.ttl_seconds = ttl_seconds
+        self._guilds: OrderedDict[int, tuple[float, GuildTaskIndex]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self.evictions = 0
+
+    def version(self, guild_id: int) -> int:
+        return self._versions.get(guild_id, 0)
+
+    def _changed(self, guild_id: int) -> None:
+        self._versions[guild_id] = self.version(guild_id) + 1
+
+    def _loaded(self, guild_id: int) -> Optional[GuildTaskIndex]:
+        """読み込み済みのインデックス（ない・期限切れの場合はNone）"""
+        entry = self._guilds.get(guild_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._guilds[guild_id]
+            return None
+        return entry[1]
+
+    async def get(self, guild_id: int) -> GuildTaskIndex:
+        index = self._loaded(guild_id)
+        if index is not None:
+            self._guilds.move_to_end(guild_id)
+            return index
+        version = self.version(guild_id)
+        index = GuildTaskIndex(await load_guild_tasks(guild_id))
+        if version != self.version(guild_id):
+            # 読み込み中に変更があった。今回だけ使い、次の呼び出しで読み込み直す
+            return index
+        # 読み込み中に別の呼び出しが先に登録していればそちらを使う
+        loaded = self._loaded(guild_id)
+        if loaded is not None:
+            return loaded
+        self._guilds[guild_id] = (time.monotonic() + self.ttl_seconds, index)
+        while len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+            self.evictions += 1
+        return index
+
+    async def search(
+        self, guild_id: int, query: str, status: Optional[TaskStatus] = None
+    ) -> list[IndexedTask]:
+        return (await self.get(guild_id)).search(query, status)
+
+    def upsert(self, task: Task) -> None:
+        """タスクの追加・更新を反映する（読み込み前のギルドは読み込み時に反映される）"""
+        self._changed(task.guild_id)
+        index = self._loaded(task.guild_id)
+        if index is not None:
+            index.upsert(IndexedTask.from_task(task))
+
+    def remove(self, guild_id: int, guild_seq: int) -> None:
+        self._changed(guild_id)
+        index = self._loaded(guild_id)
+        if index is not None:
+            index.remove(guild_seq)
+
+    async def reload_task(self, guild_id: int, guild_seq: int) -> None:
+        """他のプロセスで変更されたタスクをDBから読み直す"""
+        self._changed(guild_id)
+        if self._loaded(guild_id) is None:
+            return
+        version = self.version(guild_id)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(*INDEXED_COLUMNS).where(
+                    Task.guild_id == guild_id, Task.guild_seq == guild_seq
+                )
+            )
+            row = result.one_or_none()
+        index = self._loaded(guild_id)
+        if index is None:
+            return
+        if version != self.version(guild_id):
+            # 読み直している間に変更が重なった。ギルドごと読み込み直す
+            self.invalidate(guild_id)
+        elif row is None:
+            index.remove(guild_seq)
+        else:
+            index.upsert(IndexedTask(*row))
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def invalidate(self, guild_id: int) -> None:
+        """ギルドのインデックスを捨て、次に使う時に読み込み直す"""
+        self._changed(guild_id)
+        self._guilds.pop(guild_id, None)
+
+    def clear(self) -> None:
+        """すべてのギルドのインデックスを捨て、次に使う時に読み込み直す"""
+        for guild_id in set(self._guilds) | set(self._versions):
+            self.invalidate(guild_id)
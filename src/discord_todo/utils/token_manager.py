@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from fastapi import Request
+from sqlalchemy import select
+
+from ..config import settings
+from ..db.session import AsyncSessionLocal
+from ..models.base import utcnow
+from ..models.mail import MailConnection
+from .sharding import ShardScope
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SCOPE = "openid profile offline_access Mail.Read User.Read"
+# 残り時間がこれを切ったトークンは使わず、その場で更新する
+MIN_TOKEN_LIFETIME = timedelta(minutes=1)
+# 先回り更新を同時に行う連携数
+SWEEP_CONCURRENCY = 4
+
+FailureHandler = Callable[[int, Exception], Awaitable[None]]
+
+
+class TokenRefreshError(Exception):
+    """アクセストークンの更新に失敗したことを表す例外"""
+
+
+@dataclass
+class CachedToken:
+    """キャッシュしたアクセストークン"""
+
+    access_token: str
+    expires_at: datetime  # タイムゾーン付き
+
+    def is_valid(self, margin: timedelta) -> bool:
+        return self.expires_at - utcnow() > margin
+
+
+def token_url() -> str:
+    """OAuthトークンエンドポイントのURL"""
+    tenant_id = settings.MICROSOFT_TENANT_ID or "common"
+    return f"{settings.MICROSOFT_LOGIN_BASE_URL}/{tenant_id}/oauth2/v2.0/token"
+
+
+class TokenManager:
+    """Microsoft Graph のアクセストークンを連携ごとに管理するクラス
+
+    トークンはプロセス内にキャッシュし、更新は連携ごとに同時に1つだけ実行する。
+    バックグラウンドのスイーパーが期限の近いトークンを先回りして更新するため、
+    メール同期の処理がトークンエンドポイントを待つことは通常ない。
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        self.http_client = http_client
+        self._cache: dict[int, CachedToken] = {}
+        self._refreshing: dict[int, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        # スイーパーが担当するシャードの範囲（Noneなら全て）
+        self._scope: Optional[ShardScope] = None
+        # スイーパーでの更新の失敗を記録するハンドラ（同期の失敗と同じく連携を隔離する）
+        self._on_failure: Optional[FailureHandler] = None
+
+    async def get_access_token(self, connection: MailConnection) -> str:
+        """有効なアクセストークンを返す（必要な場合だけ更新する）"""
+        cached = self._cache.get(connection.id)
+        if cached is None:
+            cached = CachedToken(connection.access_token, connection.token_expires_at)
+            self._cache[connection.id] = cached
+        if cached.is_valid(MIN_TOKEN_LIFETIME):
+            return cached.access_token
+        return await self.refresh(connection.id)
+
+    async def refresh(self, connection_id: int) -> str:
+        """トークンを更新する（同じ連携の更新が実行中ならその結果を待つ）"""
+        task = self._refreshing.get(connection_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(connection_id))
+            self._refreshing[connection_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(connection_id, None))
+        # 待っている側がキャンセルされても、更新自体は最後まで実行する
+        return await asyncio.shield(task)
+
+    def invalidate(self, connection_id: int) -> None:
+        """連携のキャッシュを破棄する（再連携・連携解除時）"""
+        self._cache.pop(connection_id, None)
+
+    async def _refresh(self, connection_id: int) -> str:
+        async with AsyncSessionLocal() as session:
+            # 他プロセスとの同時更新を避けるため行ロックを取る
+            connection = await session.get(MailConnection, connection_id, with_for_update=True)
+            if connection is None:
+                self.invalidate(connection_id)
+                raise TokenRefreshError(f"連携 {connection_id} が見つかりません")
+
+            # ロック待ちの間に他プロセスが更新済みなら、それを使う
+            current = CachedToken(connection.access_token, connection.token_expires_at)
+            if current.is_valid(self._refresh_ahead):
+                self._cache[connection_id] = current
+                return current.access_token
+
+            data = {
+                "client_id": settings.MICROSOFT_CLIENT_ID,
+                "client_secret": settings.MICROSOFT_CLIENT_SECRET,
+                "grant_type": "refresh_token",
+                "refresh_token": connection.refresh_token,
+                "redirect_uri": settings.MICROSOFT_REDIRECT_URI,
+                "scope": TOKEN_SCOPE,
+            }
+            response = await self.http_client.post(token_url(), data=data)
+            if response.status_code != 200:
+                raise TokenRefreshError(f"トークンリフレッシュ失敗: {response.text}")
+
+            token_data = response.json()
+            access_token = token_data.get("access_token")
+            refresh_token = token_data.get("refresh_token")
+            expires_in = token_data.get("expires_in")
+            if not access_token or not refresh_token or not expires_in:
+                raise TokenRefreshError("トークン情報の取得に失敗しました")
+
+            expires_at = utcnow() + timedelta(seconds=expires_in)
+            connection.access_token = access_token
+            connection.refresh_token = refresh_token
+            connection.token_expires_at = expires_at
+            await session.commit()
+
+        self._cache[connection_id] = CachedToken(access_token, expires_at)
+        return access_token
+
+    @property
+    def _refresh_ahead(self) -> timedelta:
+        return timedelta(minutes=settings.MAIL_TOKEN_REFRESH_AHEAD_MINUTES)
+
+    def start(
+        self, scope: Optional[ShardScope] = None, on_failure: Optional[FailureHandler] = None
+    ) -> None:
+        """期限の近いトークンを先回りして更新するスイーパーを開始"""
+        self._scope = scope
+        self._on_failure = on_failure
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    def stop(self) -> None:
+        """スイーパーを停止"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"トークンの先回り更新でエラー発生: {e}")
+            await asyncio.sleep(settings.MAIL_TOKEN_SWEEP_INTERVAL_SECONDS)
+
+    async def sweep(self) -> None:
+        """期限が近づいたトークンをまとめて更新する"""
+        now = utcnow()
+        threshold = now + self._refresh_ahead
+        async with AsyncSessionLocal() as session:
+            # 隔離中の連携（リフレッシュトークンの失効など）は更新を試みない
+            query = select(MailConnection.id).where(
+                MailConnection.token_expires_at < threshold,
+                MailConnection.available_at(now),
+            )
+            if self._scope:
+                query = query.where(self._scope.clause(MailConnection.guild_id))
+            result = await session.execute(query)
+            connection_ids = list(result.scalars().all())
+
+        semaphore = asyncio.Semaphore(SWEEP_CONCURRENCY)
+
+        async def refresh_one(connection_id: int) -> None:
+            async with semaphore:
+                try:
+                    await self.refresh(connection_id)
+                except Exception as e:
+                    logger.warning(f"連携 {connection_id} のトークン更新に失敗: {e}")
+                    # 失敗を記録しないと、失効した連携を毎回更新し続けてしまう
+                    if self._on_failure:
+                        await self._on_failure(connection_id, e)
+
+        await asyncio.gather(*(refresh_one(connection_id) for connection_id in connection_ids))
+
+
+def get_token_manager(request: Request) -> TokenManager:
+    """FastAPI用のトークンマネージャー依存関係"""
+    return request.app.state.token_manager
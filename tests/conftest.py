@@ -0,0 +1,12 @@
+"""テスト共通の設定
+
+アプリの設定はDB接続先とJWTの鍵を必須としているため、読み込み前に補っておく。
+DBに接続しないテストでは、エンジンは作成されるだけで接続しない。
+"""
+import os
+
+os.environ.setdefault(
+    "DATABASE_URL",
+    os.environ.get("TEST_DATABASE_URL", "postgresql+asyncpg://localhost/discord_todo_test"),
+)
+os.environ.setdefault("JWT_SECRET_KEY", "test")
@@ -0,0 +1,42 @@
+"""ギルドごとのキャッシュのテスト"""
+import logging
+
+from discord_todo.utils import cache
+from discord_todo.utils.cache import GuildCache
+
+
+def test_load_started_before_invalidation_is_not_stored():
+    guild_cache: GuildCache[str] = GuildCache(10, 60)
+    version = guild_cache.version(1)
+    guild_cache.invalidate(1)
+    guild_cache.set(1, "page", "stale", version)
+
+    assert guild_cache.get(1, "page") is None
+    guild_cache.set(1, "page", "fresh", guild_cache.version(1))
+    assert guild_cache.get(1, "page") == "fresh"
+
+
+def test_evicts_least_recently_used():
+    guild_cache: GuildCache[int] = GuildCache(2, 60)
+    for key in ("a", "b"):
+        guild_cache.set(1, key, 0, guild_cache.version(1))
+    guild_cache.get(1, "a")
+    guild_cache.set(1, "c", 0, guild_cache.version(1))
+
+    assert guild_cache.get(1, "b") is None
+    assert guild_cache.get(1, "a") == 0
+    assert guild_cache.stats()["evictions"] == 1
+
+
+def test_logs_hit_rate_periodically(monkeypatch, caplog):
+    monkeypatch.setattr(cache, "CACHE_LOG_EVERY", 4)
+    guild_cache: GuildCache[int] = GuildCache(10, 60, "テスト")
+    guild_cache.set(1, "a", 0, guild_cache.version(1))
+
+    with caplog.at_level(logging.INFO, logger=cache.__name__):
+        for key in ("a", "a", "a", "b"):
+            guild_cache.get(1, key)
+
+    assert [record.getMessage().split(" (")[0] for record in caplog.records] == [
+        "テスト: ヒット率 75.0%"
+    ]
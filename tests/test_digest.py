@@ -0,0 +1,75 @@
+"""通知のまとめ送信（Discordの上限内への詰め込み）のテスト"""
+import discord
+
+from discord_todo.utils.digest import (
+    CONTENT_MAX_CHARS,
+    EMBED_MAX_FIELDS,
+    FIELD_VALUE_MAX_CHARS,
+    MESSAGE_MAX_EMBED_CHARS,
+    MESSAGE_MAX_EMBEDS,
+    DigestEntry,
+    pack_digest,
+)
+
+
+def assert_within_limits(pages) -> None:
+    for page in pages:
+        assert len(page.embeds) <= MESSAGE_MAX_EMBEDS
+        assert sum(len(embed) for embed in page.embeds) <= MESSAGE_MAX_EMBED_CHARS
+        assert page.content is None or len(page.content) <= CONTENT_MAX_CHARS
+        for embed in page.embeds:
+            assert len(embed.fields) <= EMBED_MAX_FIELDS
+
+
+def fields(pages) -> list[str]:
+    return [field.name for page in pages for embed in page.embeds for field in embed.fields]
+
+
+def test_small_digest_fits_one_embed():
+    entries = [DigestEntry(f"task {n}", "due soon", mentions=(1,)) for n in range(3)]
+    pages = pack_digest("リマインダー", entries, discord.Color.orange(), header="締切が近づいています")
+
+    assert len(pages) == 1
+    assert len(pages[0].embeds) == 1
+    # 同じユーザーは1回だけメンションする
+    assert pages[0].content == "締切が近づいています <@1>"
+
+
+def test_fields_overflow_into_new_embeds():
+    entries = [DigestEntry(f"task {n}", "x") for n in range(EMBED_MAX_FIELDS * 2 + 1)]
+    pages = pack_digest("リマインダー", entries, discord.Color.orange())
+
+    assert_within_limits(pages)
+    assert len(pages) == 1
+    assert [len(embed.fields) for embed in pages[0].embeds] == [25, 25, 1]
+    assert fields(pages) == [entry.name for entry in entries]
+
+
+def test_embed_characters_split_messages():
+    entries = [DigestEntry(f"task {n}", "x" * 2000) for n in range(10)]
+    pages = pack_digest("リマインダー", entries, discord.Color.orange())
+
+    assert_within_limits(pages)
+    assert len(pages) > 1
+    assert fields(pages) == [entry.name for entry in entries]
+    # 長すぎる値は切り詰める
+    value = pages[0].embeds[0].fields[0].value
+    assert len(value) == FIELD_VALUE_MAX_CHARS and value.endswith("…")
+
+
+def test_embed_count_splits_messages():
+    entries = [DigestEntry(f"task {n}", "x") for n in range(EMBED_MAX_FIELDS * 12)]
+    pages = pack_digest("リマインダー", entries, discord.Color.orange())
+
+    assert_within_limits(pages)
+    assert [len(page.embeds) for page in pages] == [10, 2]
+
+
+def test_mentions_split_when_content_is_full():
+    entries = [DigestEntry(f"task {n}", "x", mentions=(10**17 + n,)) for n in range(150)]
+    pages = pack_digest("リマインダー", entries, discord.Color.orange())
+
+    assert_within_limits(pages)
+    assert len(pages) > 1
+    mentioned = " ".join(page.content for page in pages)
+    assert all(f"<@{10**17 + n}>" in mentioned for n in range(150))
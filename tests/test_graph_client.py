@@ -0,0 +1,78 @@
+"""Graph APIクライアントのレート制限・Retry-Afterの解釈のテスト"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from discord_todo.utils import graph_client
+from discord_todo.utils.graph_client import (
+    MIN_RATE_RATIO,
+    THROTTLE_RATE_FACTOR,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(graph_client.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0.0
+
+
+def test_throttle_pauses_and_slows_down_until_recovered(clock):
+    bucket = TokenBucket(rate=10, capacity=10)
+
+    bucket.throttle(5)
+    assert bucket.try_acquire() == pytest.approx(5)
+    assert bucket.rate == pytest.approx(10 * THROTTLE_RATE_FACTOR)
+
+    for _ in range(20):
+        bucket.throttle(0)
+    assert bucket.rate == pytest.approx(10 * MIN_RATE_RATIO)
+
+    clock.now += 5
+    assert bucket.try_acquire() == 0.0
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 10
+
+
+def response(retry_after: str | None) -> httpx.Response:
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    return httpx.Response(429, headers=headers)
+
+
+def test_retry_after_seconds():
+    assert parse_retry_after(response("12")) == 12
+    assert parse_retry_after(response("-3")) == 0
+    assert parse_retry_after(response(None)) is None
+    assert parse_retry_after(response("soon")) is None
+
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = parse_retry_after(response(format_datetime(retry_at, usegmt=True)))
+    assert 28 <= seconds <= 30
+
+    past = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert parse_retry_after(response(format_datetime(past, usegmt=True))) == 0
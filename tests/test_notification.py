@@ -0,0 +1,81 @@
+"""期限を迎えた通知の振り分け（遅れた通知の扱い）のテスト"""
+from datetime import datetime, timedelta, timezone
+
+from discord_todo.models import Task, TaskReminder
+from discord_todo.tasks.notification import (
+    REMINDER_GRACE,
+    build_reminder_message,
+    select_reminders_to_send,
+)
+
+NOW = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def make_task(task_id: int, deadline: datetime) -> Task:
+    return Task(
+        id=task_id,
+        guild_id=1,
+        channel_id=10,
+        guild_seq=task_id,
+        title=f"task {task_id}",
+        assigned_to=100,
+        deadline=deadline,
+    )
+
+
+def make_reminder(reminder_id: int, task: Task, offset_minutes: int) -> TaskReminder:
+    return TaskReminder(
+        id=reminder_id,
+        task_id=task.id,
+        offset_minutes=offset_minutes,
+        due_at=task.deadline - timedelta(minutes=offset_minutes),
+    )
+
+
+def test_on_time_reminders_are_sent_as_is():
+    task = make_task(1, NOW + timedelta(minutes=30))
+    reminder = make_reminder(1, task, 30)
+
+    sendable, skipped = select_reminders_to_send([(reminder, task)], NOW)
+
+    assert sendable == [(reminder, task)]
+    assert skipped == []
+    embed = build_reminder_message(task, reminder, NOW).embeds[0]
+    assert "あと30分" in embed.description
+    assert embed.footer.text is None
+
+
+def test_overdue_reminder_is_sent_late_with_actual_remaining_time():
+    # 停止中に通知時刻を過ぎたが、締切はまだ先
+    task = make_task(1, NOW + timedelta(hours=3))
+    reminder = make_reminder(1, task, 1440)
+    assert reminder.due_at < NOW - REMINDER_GRACE
+
+    sendable, skipped = select_reminders_to_send([(reminder, task)], NOW)
+
+    assert sendable == [(reminder, task)]
+    assert skipped == []
+    embed = build_reminder_message(task, reminder, NOW).embeds[0]
+    assert "あと3時間" in embed.description
+    assert "遅れて送信" in embed.footer.text
+
+
+def test_only_latest_overdue_reminder_per_task_is_sent():
+    task = make_task(1, NOW + timedelta(minutes=30))
+    day = make_reminder(1, task, 1440)
+    hours = make_reminder(2, task, 180)
+
+    sendable, skipped = select_reminders_to_send([(day, task), (hours, task)], NOW)
+
+    assert sendable == [(hours, task)]
+    assert skipped == [(day, task)]
+
+
+def test_overdue_reminders_past_deadline_are_skipped():
+    task = make_task(1, NOW - timedelta(hours=2))
+    reminder = make_reminder(1, task, 60)
+
+    sendable, skipped = select_reminders_to_send([(reminder, task)], NOW)
+
+    assert sendable == []
+    assert skipped == [(reminder, task)]
@@ -0,0 +1,69 @@
+"""LISTEN/NOTIFYの変更通知の送受信（APIとBotを1プロセスで動かす場合を含む）"""
+import asyncio
+
+from discord_todo.db.notify import (
+    MAIL_CONNECTION_CHANGED,
+    MAIL_SYNC_REQUESTED,
+    TASK_CHANGED,
+    PgListener,
+    notify,
+)
+
+
+class RecordingSession:
+    """実行されたNOTIFYを記録するだけのセッション"""
+
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, str]] = []
+
+    async def execute(self, statement) -> None:
+        channel, message = statement.compile().params.values()
+        self.sent.append((channel, message))
+
+
+async def deliver(listener: PgListener, session: RecordingSession) -> None:
+    """記録したNOTIFYを同じプロセスのリスナーに届ける"""
+    for channel, message in session.sent:
+        listener._on_notification(None, 0, channel, message)
+    await asyncio.gather(*listener._pending)
+
+
+async def test_same_process_receives_api_notifications():
+    listener = PgListener()
+    received = []
+
+    async def handler(payload: dict) -> None:
+        received.append(payload)
+
+    listener.subscribe(MAIL_SYNC_REQUESTED, handler)
+    listener.subscribe(MAIL_CONNECTION_CHANGED, handler)
+
+    # APIのWebhook・認証コールバックが送る通知
+    session = RecordingSession()
+    await notify(session, MAIL_SYNC_REQUESTED, {})
+    await notify(session, MAIL_CONNECTION_CHANGED, {"id": 7})
+    await deliver(listener, session)
+
+    assert [payload.get("id") for payload in received] == [None, 7]
+
+
+async def test_own_task_changes_are_ignored():
+    listener = PgListener()
+    received = []
+
+    async def handler(payload: dict) -> None:
+        received.append(payload)
+
+    listener.subscribe(TASK_CHANGED, handler)
+
+    session = RecordingSession()
+    await notify(session, TASK_CHANGED, {"guild_id": 1, "task_id": 2, "guild_seq": 3})
+    await deliver(listener, session)
+    assert received == []
+
+    # 他のプロセスからの通知は受け取る
+    listener._on_notification(
+        None, 0, TASK_CHANGED, '{"guild_id": 1, "task_id": 2, "guild_seq": 3, "origin": "other"}'
+    )
+    await asyncio.gather(*listener._pending)
+    assert received == [{"guild_id": 1, "task_id": 2, "guild_seq": 3, "origin": "other"}]
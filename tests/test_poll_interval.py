@@ -0,0 +1,61 @@
+"""連携ごとのポーリング間隔・失敗時のバックオフのテスト"""
+import pytest
+
+from discord_todo.utils.poll_interval import (
+    EMPTY_BACKOFF_FACTOR,
+    PollState,
+    failure_backoff_minutes,
+    next_poll_state,
+)
+
+MIN_MINUTES = 2.0
+MAX_MINUTES = 120.0
+
+
+def step(state: PollState, new_mail_count: int, elapsed_minutes: float) -> PollState:
+    return next_poll_state(state, new_mail_count, elapsed_minutes, MIN_MINUTES, MAX_MINUTES)
+
+
+def test_empty_polls_back_off_up_to_max():
+    state = PollState(interval_minutes=30, empty_streak=0, arrival_rate=0)
+
+    state = step(state, 0, 30)
+    assert state.interval_minutes == pytest.approx(30 * EMPTY_BACKOFF_FACTOR)
+    assert state.empty_streak == 1
+
+    for _ in range(20):
+        state = step(state, 0, state.interval_minutes)
+    assert state.interval_minutes == MAX_MINUTES
+    assert state.empty_streak == 21
+
+
+def test_busy_mailbox_speeds_up_but_not_below_min():
+    state = PollState(interval_minutes=30, empty_streak=5, arrival_rate=0)
+
+    state = step(state, 3, 30)
+    # 6件/時 × 平滑化0.3 = 1.8件/時 → 約33分に1件（ただし上限・下限に収める）
+    assert state.empty_streak == 0
+    assert state.arrival_rate == pytest.approx(1.8)
+    assert state.interval_minutes == pytest.approx(60 / 1.8)
+
+    for _ in range(20):
+        state = step(state, 50, state.interval_minutes)
+    assert state.interval_minutes == MIN_MINUTES
+
+
+def test_empty_poll_does_not_back_off_past_expected_arrival():
+    state = PollState(interval_minutes=10, empty_streak=0, arrival_rate=2.0)
+
+    state = step(state, 0, 10)
+    # 到着率 1.4件/時 から見込まれる約43分までは伸ばす
+    assert state.arrival_rate == pytest.approx(1.4)
+    assert state.interval_minutes == pytest.approx(60 / 1.4)
+
+
+def test_failure_backoff_doubles_with_jitter_and_caps():
+    for failures, expected in [(1, 5), (2, 10), (3, 20)]:
+        backoff = failure_backoff_minutes(failures, 5, 1440)
+        assert expected * 0.9 <= backoff <= expected * 1.1
+    assert failure_backoff_minutes(30, 5, 1440) == 1440
+    # 長く失敗が続いても桁あふれしない
+    assert failure_backoff_minutes(10_000, 5, 1440) == 1440
@@ -0,0 +1,69 @@
+"""通知予定の優先度付きキューのテスト"""
+from datetime import datetime, timedelta, timezone
+
+from discord_todo.tasks.reminder_queue import ReminderQueue
+
+NOW = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def at(minutes: int) -> datetime:
+    return NOW + timedelta(minutes=minutes)
+
+
+def test_pops_due_entries_in_time_order():
+    queue = ReminderQueue()
+    queue.schedule(1, [(60, at(30)), (1440, at(10))])
+    queue.schedule(2, [(30, at(20))])
+
+    assert queue.next_due() == at(10)
+    due = queue.pop_due(at(25))
+    assert [(entry.task_id, entry.minutes) for entry in due] == [(1, 1440), (2, 30)]
+    assert len(queue) == 1
+    assert queue.next_due() == at(30)
+
+
+def test_skips_reminders_before_not_before():
+    queue = ReminderQueue()
+    queue.schedule(1, [(60, at(-5)), (30, at(5))], not_before=NOW)
+
+    assert len(queue) == 1
+    assert queue.next_due() == at(5)
+
+
+def test_reschedule_invalidates_previous_generation():
+    queue = ReminderQueue()
+    queue.schedule(1, [(60, at(10))])
+    # 締切の変更で予定を置き換える（古いエントリはヒープに残るが無効）
+    queue.schedule(1, [(60, at(40))])
+
+    assert len(queue) == 1
+    assert queue.pop_due(at(30)) == []
+    assert queue.next_due() == at(40)
+    assert [entry.notify_at for entry in queue.pop_due(at(40))] == [at(40)]
+    assert queue.next_due() is None
+
+
+def test_unschedule_drops_all_entries_of_task():
+    queue = ReminderQueue()
+    queue.schedule(1, [(60, at(10)), (30, at(40))])
+    queue.schedule(2, [(30, at(20))])
+    queue.unschedule(1)
+
+    assert len(queue) == 1
+    assert [entry.task_id for entry in queue.pop_due(at(60))] == [2]
+    # 登録のないタスクの取り消しは何もしない
+    queue.unschedule(3)
+    assert len(queue) == 0
+
+
+def test_compacts_heap_when_most_entries_are_stale():
+    queue = ReminderQueue()
+    for task_id in range(100):
+        queue.schedule(task_id, [(60, at(task_id))])
+    for task_id in range(80):
+        queue.unschedule(task_id)
+
+    assert len(queue) == 20
+    # 無効なエントリが半分を超えた時点で作り直される（小さいヒープはそのまま）
+    assert len(queue._heap) <= 50
+    assert queue.next_due() == at(80)
@@ -0,0 +1,163 @@
+"""タスク番号のオートコンプリート用インデックスのテスト"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from discord_todo.models.task import Task, TaskStatus
+from discord_todo.utils import task_index
+from discord_todo.utils.task_index import GuildTaskIndex, IndexedTask, TaskIndex
+
+NOW = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def indexed(guild_seq: int, title: str, status: TaskStatus = TaskStatus.PENDING) -> IndexedTask:
+    return IndexedTask(guild_seq, title, status, 1, NOW + timedelta(hours=guild_seq))
+
+
+def task(guild_seq: int, title: str) -> Task:
+    return Task(
+        guild_id=1,
+        guild_seq=guild_seq,
+        title=title,
+        status=TaskStatus.PENDING,
+        assigned_to=1,
+        deadline=NOW,
+    )
+
+
+def seqs(entries: list[IndexedTask]) -> list[int]:
+    return [entry.guild_seq for entry in entries]
+
+
+def test_search_ranks_exact_number_then_prefix_then_substring():
+    index = GuildTaskIndex(
+        [
+            indexed(1, "Weekly report"),
+            indexed(12, "Review budget"),
+            indexed(120, "会議資料の作成"),
+            indexed(3, "Reply to 12 mails"),
+        ]
+    )
+
+    # 前方一致は番号・タイトルの単語を区別せず締切順
+    assert seqs(index.search("12")) == [12, 3, 120]
+    assert seqs(index.search("#1")) == [1, 3, 12, 120]
+    assert seqs(index.search("rep")) == [1, 3]
+    assert seqs(index.search("REVIEW bud")) == [12]
+    # 単語に分かれない日本語は部分一致で探す
+    assert seqs(index.search("資料")) == [120]
+    assert seqs(index.search("zzz")) == []
+
+
+def test_search_filters_status_and_limits_choices():
+    index = GuildTaskIndex(
+        [indexed(n, f"task {n}", TaskStatus.COMPLETED if n % 2 else TaskStatus.PENDING)
+         for n in range(1, 61)]
+    )
+
+    pending = index.search("task", status=TaskStatus.PENDING)
+    assert len(pending) == 25
+    assert all(entry.status == TaskStatus.PENDING for entry in pending)
+    # 未入力なら締切の近い順
+    assert seqs(index.search("", status=TaskStatus.PENDING, limit=3)) == [2, 4, 6]
+
+
+def test_removed_and_updated_tasks_leave_no_stale_tokens():
+    index = GuildTaskIndex([indexed(1, "deploy api"), indexed(2, "deploy bot")])
+
+    index.remove(1)
+    assert seqs(index.search("deploy")) == [2]
+    assert seqs(index.search("api")) == []
+    assert index.search("1") == []
+
+    index.upsert(indexed(2, "release bot"))
+    assert seqs(index.search("deploy")) == []
+    assert seqs(index.search("rel")) == [2]
+    assert index._tokens == sorted(index._tokens)
+    assert {token for token, _ in index._tokens} == {"2", "release bot", "release", "bot"}
+    # 登録のない番号の削除は何もしない
+    index.remove(99)
+
+
+async def test_changes_during_first_load_are_not_lost(monkeypatch):
+    loading = asyncio.Event()
+    release = asyncio.Event()
+    rows = [[indexed(1, "old")], [indexed(1, "old"), indexed(2, "new")]]
+
+    async def load(guild_id: int) -> list[IndexedTask]:
+        loading.set()
+        await release.wait()
+        return rows.pop(0)
+
+    monkeypatch.setattr(task_index, "load_guild_tasks", load)
+    index = TaskIndex(max_guilds=16, ttl_seconds=60)
+
+    first = asyncio.create_task(index.search(1, ""))
+    await loading.wait()
+    # 読み込み中に追加されたタスク（読み込んだ内容には含まれていない）
+    index.upsert(task(2, "new"))
+    release.set()
+    await first
+
+    # 古い内容は登録されず、次の検索で読み込み直す
+    assert [entry.guild_seq for entry in await index.search(1, "")] == [1, 2]
+    assert [entry.guild_seq for entry in await index.search(1, "new")] == [2]
+
+
+async def test_loaded_guild_applies_changes_in_place(monkeypatch):
+    loads = []
+
+    async def load(guild_id: int) -> list[IndexedTask]:
+        loads.append(guild_id)
+        return [indexed(1, "report")]
+
+    monkeypatch.setattr(task_index, "load_guild_tasks", load)
+    index = TaskIndex(max_guilds=16, ttl_seconds=60)
+
+    await index.search(1, "")
+    index.upsert(task(2, "review"))
+    index.remove(1, 1)
+    assert [entry.guild_seq for entry in await index.search(1, "")] == [2]
+    assert loads == [1]
+
+
+async def test_least_recently_used_guilds_are_evicted_and_reloaded(monkeypatch):
+    loads = []
+
+    async def load(guild_id: int) -> list[IndexedTask]:
+        loads.append(guild_id)
+        return [indexed(guild_id, "report")]
+
+    monkeypatch.setattr(task_index, "load_guild_tasks", load)
+    index = TaskIndex(max_guilds=2, ttl_seconds=60)
+
+    await index.search(1, "")
+    await index.search(2, "")
+    await index.search(1, "")
+    await index.search(3, "")
+    assert len(index) == 2
+    assert index.evictions == 1
+
+    # 最も長く使われていないギルド2が追い出され、次に使う時に読み込み直す
+    await index.search(1, "")
+    await index.search(2, "")
+    assert loads == [1, 2, 3, 2]
+
+
+async def test_expired_guild_is_reloaded(monkeypatch):
+    loads = []
+    now = [1000.0]
+
+    async def load(guild_id: int) -> list[IndexedTask]:
+        loads.append(guild_id)
+        return [indexed(1, "report")]
+
+    monkeypatch.setattr(task_index, "load_guild_tasks", load)
+    monkeypatch.setattr(task_index.time, "monotonic", lambda: now[0])
+    index = TaskIndex(max_guilds=16, ttl_seconds=60)
+
+    await index.search(1, "")
+    now[0] += 30
+    await index.search(1, "")
+    now[0] += 61
+    await index.search(1, "")
+    assert loads == [1, 1]
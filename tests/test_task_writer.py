@@ -0,0 +1,53 @@
+"""タスクのまとめ書きのテスト"""
+import asyncio
+from datetime import datetime, timezone
+
+from discord_todo.models import Task, TaskReminder
+from discord_todo.tasks.task_writer import TaskWriter
+
+DEADLINE = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def make_task(title: str) -> Task:
+    return Task(
+        guild_id=1,
+        channel_id=10,
+        title=title,
+        assigned_to=100,
+        deadline=DEADLINE,
+        reminders=TaskReminder.for_task(DEADLINE, [60]),
+    )
+
+
+class FailingBatchWriter(TaskWriter):
+    """複数件のまとめ書きだけ、IDと通し番号を振ったあとで失敗する"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.written: list[tuple] = []
+        self.next_id = 0
+
+    async def _write(self, tasks: list[Task]) -> None:
+        for task in tasks:
+            # 書き込み前の状態を記録する（ロールバック前のIDが残っていないこと）
+            self.written.append((task.title, task.id, task.guild_seq, task.reminders[0].id))
+            self.next_id += 1
+            task.id = self.next_id
+            task.guild_seq = self.next_id
+            task.reminders[0].id = self.next_id
+        if len(tasks) > 1:
+            raise RuntimeError("batch failed")
+
+
+async def test_retry_after_failed_batch_starts_from_clean_tasks():
+    writer = FailingBatchWriter()
+    first, second = make_task("a"), make_task("b")
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future(), loop.create_future()]
+
+    await writer._flush([(first, futures[0]), (second, futures[1])])
+
+    assert writer.written[2:] == [("a", None, None, None), ("b", None, None, None)]
+    assert (first.id, first.guild_seq) == (3, 3)
+    assert (second.id, second.guild_seq) == (4, 4)
+    assert [future.result() for future in futures] == [first, second]
@@ -0,0 +1,51 @@
+"""アクセストークンの先回り更新のテスト"""
+from discord_todo.utils import token_manager
+from discord_todo.utils.token_manager import TokenManager, TokenRefreshError
+
+
+class FakeResult:
+    def __init__(self, ids: list[int]) -> None:
+        self.ids = ids
+
+    def scalars(self):
+        return self
+
+    def all(self) -> list[int]:
+        return self.ids
+
+
+class FakeSession:
+    """期限の近い連携のIDだけを返すセッション"""
+
+    def __init__(self, ids: list[int]) -> None:
+        self.ids = ids
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    async def execute(self, query) -> FakeResult:
+        return FakeResult(self.ids)
+
+
+async def test_sweep_reports_refresh_failures(monkeypatch):
+    monkeypatch.setattr(token_manager, "AsyncSessionLocal", lambda: FakeSession([1, 2]))
+    failures = []
+
+    async def on_failure(connection_id: int, error: Exception) -> None:
+        failures.append((connection_id, type(error)))
+
+    manager = TokenManager(http_client=None)
+    manager._on_failure = on_failure
+
+    async def refresh(connection_id: int) -> str:
+        if connection_id == 2:
+            raise TokenRefreshError("invalid_grant")
+        return "token"
+
+    monkeypatch.setattr(manager, "refresh", refresh)
+    await manager.sweep()
+
+    assert failures == [(2, TokenRefreshError)]
@@ -0,0 +1,202 @@
+"""Microsoft Graph / OAuth の最小限の偽サーバー（ローカル検証用）
+
+変更通知まわりをローカルで確認するためのもの。以下のように起動する:
+
+    uvicorn tools.fake_graph_server:app --port 9000
+
+Bot / API 側は次の設定で偽サーバーを向ける:
+
+    MICROSOFT_LOGIN_BASE_URL=http://localhost:9000
+    GRAPH_BASE_URL=http://localhost:9000/v1.0
+    MAIL_WEBHOOK_URL=http://localhost:8000/api/mail/notifications
+    MAIL_WEBHOOK_CLIENT_STATE=<任意の秘密値>
+
+`POST /_fake/messages` で新着メールを追加すると、購読先へ変更通知が送られる。
+`POST /_fake/subscriptions/{id}/lifecycle?event=subscriptionRemoved` でライフサイクル通知を送れる。
+`POST /_fake/throttle?count=5&retry_after=2` で以降のGraph呼び出しを指定回数だけ429にできる。
+"""
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+app = FastAPI()
+
+messages: list[dict] = []
+subscriptions: dict[str, dict] = {}
+throttle = {"count": 0, "retry_after": 1}
+
+
+class FakeMessage(BaseModel):
+    subject: str = "テストメール"
+    sender: str = "sender@example.com"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _isoformat(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+@app.middleware("http")
+async def throttle_graph(request: Request, call_next):
+    """指定回数だけGraph呼び出しに429を返す"""
+    if request.url.path.startswith("/v1.0/") and throttle["count"] > 0:
+        throttle["count"] -= 1
+        return JSONResponse(
+            {"error": {"code": "TooManyRequests", "message": "Too many requests"}},
+            status_code=429,
+            headers={"Retry-After": str(throttle["retry_after"])},
+        )
+    return await call_next(request)
+
+
+@app.post("/{tenant}/oauth2/v2.0/token")
+async def token(tenant: str):
+    return {
+        "access_token": f"fake-access-{secrets.token_hex(4)}",
+        "refresh_token": f"fake-refresh-{secrets.token_hex(4)}",
+        "expires_in": 3600,
+    }
+
+
+@app.get("/v1.0/me")
+async def me():
+    return {"mail": "user@example.com", "userPrincipalName": "user@example.com"}
+
+
+@app.get("/v1.0/me/messages")
+async def list_messages(request: Request):
+    params = request.query_params
+    result = list(messages)
+
+    # 差分取得で使う "receivedDateTime ge <日時>" だけを解釈する
+    filter_ = params.get("$filter")
+    if filter_:
+        _, op, value = filter_.split(" ", 2)
+        since = _parse(value)
+        result = [
+            m for m in result
+            if (_parse(m["receivedDateTime"]) >= since if op == "ge"
+                else _parse(m["receivedDateTime"]) > since)
+        ]
+
+    descending = params.get("$orderby", "").endswith("desc")
+    result.sort(key=lambda m: m["receivedDateTime"], reverse=descending)
+
+    top = int(params.get("$top", 10))
+    skip = int(params.get("$skip", 0))
+    page = result[skip:skip + top]
+    body = {"value": page}
+    if skip + top < len(result):
+        next_params = dict(params)
+        next_params["$skip"] = str(skip + top)
+        body["@odata.nextLink"] = str(request.url.replace_query_params(**next_params))
+    return body
+
+
+@app.post("/v1.0/subscriptions", status_code=201)
+async def create_subscription(request: Request):
+    body = await request.json()
+    # 本物と同様に、通知先へ検証トークンを送り、そのまま返ってくることを確認する
+    validation_token = secrets.token_urlsafe(16)
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            body["notificationUrl"], params={"validationToken": validation_token}, timeout=10
+        )
+    if response.status_code != 200 or response.text != validation_token:
+        raise HTTPException(status_code=400, detail="通知先の検証に失敗しました")
+
+    subscription_id = str(uuid.uuid4())
+    subscriptions[subscription_id] = {**body, "id": subscription_id}
+    return subscriptions[subscription_id]
+
+
+@app.patch("/v1.0/subscriptions/{subscription_id}")
+async def renew_subscription(subscription_id: str, request: Request):
+    if subscription_id not in subscriptions:
+        raise HTTPException(status_code=404)
+    body = await request.json()
+    subscriptions[subscription_id]["expirationDateTime"] = body["expirationDateTime"]
+    return subscriptions[subscription_id]
+
+
+@app.delete("/v1.0/subscriptions/{subscription_id}", status_code=204)
+async def delete_subscription(subscription_id: str):
+    if subscriptions.pop(subscription_id, None) is None:
+        raise HTTPException(status_code=404)
+    return Response(status_code=204)
+
+
+@app.post("/_fake/messages")
+async def add_message(message: FakeMessage):
+    """新着メールを追加し、全購読へ変更通知を送る"""
+    mail = {
+        "id": str(uuid.uuid4()),
+        "subject": message.subject,
+        "from": {"emailAddress": {"name": message.sender, "address": message.sender}},
+        "receivedDateTime": _isoformat(_now()),
+    }
+    messages.append(mail)
+
+    async with httpx.AsyncClient() as client:
+        for subscription in subscriptions.values():
+            await client.post(
+                subscription["notificationUrl"],
+                json={
+                    "value": [
+                        {
+                            "subscriptionId": subscription["id"],
+                            "clientState": subscription.get("clientState"),
+                            "changeType": "created",
+                            "resource": f"Users/me/Messages/{mail['id']}",
+                            "resourceData": {"id": mail["id"]},
+                            "subscriptionExpirationDateTime": subscription["expirationDateTime"],
+                        }
+                    ]
+                },
+            )
+    return mail
+
+
+@app.post("/_fake/throttle")
+async def set_throttle(count: int = 5, retry_after: int = 1):
+    """以降のGraph呼び出しをcount回だけ429（Retry-After付き）にする"""
+    throttle.update(count=count, retry_after=retry_after)
+    return throttle
+
+
+@app.post("/_fake/subscriptions/{subscription_id}/lifecycle")
+async def send_lifecycle(subscription_id: str, event: str = "reauthorizationRequired"):
+    """ライフサイクル通知を送る（subscriptionRemovedの場合は購読も消す）"""
+    subscription = subscriptions.get(subscription_id)
+    if subscription is None:
+        raise HTTPException(status_code=404)
+    if event == "subscriptionRemoved":
+        subscriptions.pop(subscription_id)
+
+    async with httpx.AsyncClient() as client:
+        await client.post(
+            subscription.get("lifecycleNotificationUrl") or subscription["notificationUrl"],
+            json={
+                "value": [
+                    {
+                        "subscriptionId": subscription_id,
+                        "clientState": subscription.get("clientState"),
+                        "lifecycleEvent": event,
+                        "subscriptionExpirationDateTime": _isoformat(_now() + timedelta(hours=1)),
+                    }
+                ]
+            },
+        )
+    return {"sent": event}